@@ -228,19 +228,33 @@
 
 
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Header
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Request, Body
 from fastapi.middleware.cors import CORSMiddleware
-import os, tempfile, shutil
+from fastapi.responses import StreamingResponse
+import os, shutil
+import asyncio
 from contextlib import asynccontextmanager
 from typing import List, Optional
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 import logging
 
-from core.file_hasher import hash_file, process_folder_once
-from core.database import find_file_by_hash, upsert_hashes, get_mongo_collection
-from core.interact_certifier import retrieve_record, store_record, get_total_record
+from core.file_hasher import hash_multipart_stream, save_upload_and_hash, process_folder_once
+from core.database import DigestAlreadyStored, init_database, close_database, close_upsert_buffer
+from core.async_database import find_file_by_hash, set_chain_metadata, iter_record_batches, close_database as close_async_database
+from core.async_database import get_admin_collection as get_db_admin_collection
+from core.interact_certifier import close_submitter
+from core.async_interact_certifier import retrieve_record, retrieve_records, store_digest, close_contract
+from core.batch_anchor import batching_enabled, get_batcher, close_batcher
+from core.merkle import verify_proof
+from core.chain_index import find_anchored, start_indexer
+from core.record_cache import cache_stats, invalidate_hashes
+from core.hash_filter import might_be_known, start_hash_filter, stop_hash_filter
+from core.admin_stats import get_admin_stats, start_stats_refresher
+from core.periodic import stop_periodic_tasks
+from core.auth import close_auth_executor, find_admin, invalidate_admin, run_auth
+from core.export import EXPORT_FORMATS, export_chunks
 import uvicorn
 from dotenv import load_dotenv
 
@@ -249,17 +263,37 @@ load_dotenv()
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
+# Most record IDs one /admin/records/bulk request may ask for
+BULK_MAX_RECORDS = int(os.getenv("BULK_MAX_RECORDS", 10000))
+# Documents per database round trip, and per response chunk, of /admin/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Seconds a write gets to commit before /admin/export includes it, clock skew included
+EXPORT_SETTLE = float(os.getenv("EXPORT_SETTLE", 60))
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    init_database()
+    start_hash_filter()
     print("Starting up — scanning for new files...")
     process_folder_once()
     print("Initial sync complete.")
+    start_indexer()
+    start_stats_refresher()
     yield
     print("Shutting down...")
+    stop_periodic_tasks()
+    close_batcher()
+    close_upsert_buffer()
+    # Saved last, so it holds the digests of the writes just flushed.
+    stop_hash_filter()
+    close_submitter()
+    close_auth_executor()
+    await close_contract()
+    await close_async_database()
+    close_database()
 
 
 app = FastAPI(
@@ -343,25 +377,12 @@ def verify_token_from_header(authorization: Optional[str] = None):
         print(f"[DEBUG] Invalid token: {e}")
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
-def get_admin_collection():
+async def get_admin_collection():
     """Get admin collection from MongoDB"""
-    try:
-        col = get_mongo_collection()
-        if col is None:
-            print("[ERROR] get_mongo_collection returned None")
-            return None
-        
-        client = col.client
-        db = client[os.getenv("MONGODB_DB", "file_hashes_db")]
-        admins_col = db["admins"]
-        
-        # Create index on username
-        admins_col.create_index("username", unique=True)
-        
-        return admins_col
-    except Exception as e:
-        print(f"[ERROR] Error getting admin collection: {e}")
-        return None
+    admins_col = await get_db_admin_collection()
+    if admins_col is None:
+        print("[ERROR] Admin collection unavailable")
+    return admins_col
 
 def cleanup_files_folder():
     """Delete all files from backend/files folder"""
@@ -405,24 +426,25 @@ async def register_admin(username: str, password: str, email: str, full_name: st
         if not full_name or len(full_name) < 2:
             raise HTTPException(status_code=400, detail="Full name required")
         
-        admins_col = get_admin_collection()
+        admins_col = await get_admin_collection()
         if admins_col is None:
             raise HTTPException(status_code=500, detail="Database not configured")
         
 
-        existing = admins_col.find_one({"username": username})
+        existing = await admins_col.find_one({"username": username})
         if existing:
             raise HTTPException(status_code=400, detail="Admin already exists")
         admin_doc = {
             "username": username,
-            "password": hash_password(password),
+            "password": await run_auth(hash_password, password),
             "email": email,
             "full_name": full_name,
             "created_at": datetime.utcnow(),
             "is_active": True
         }
         
-        result = admins_col.insert_one(admin_doc)
+        result = await admins_col.insert_one(admin_doc)
+        invalidate_admin(username)
         
         return {
             "status": "success",
@@ -444,18 +466,18 @@ async def login_admin(username: str, password: str):
     try:
         print(f"[DEBUG] Login attempt for username: {username}")
         
-        admins_col = get_admin_collection()
+        admins_col = await get_admin_collection()
         if admins_col is None:
             raise HTTPException(status_code=500, detail="Database not configured")
         
         # Find admin by username
-        admin = admins_col.find_one({"username": username})
+        admin = await find_admin(admins_col, username)
         if admin is None:
             print(f"[DEBUG] Admin not found: {username}")
             raise HTTPException(status_code=401, detail="Invalid username or password")
         
         # Verify password
-        if not verify_password(password, admin["password"]):
+        if not await run_auth(verify_password, password, admin["password"]):
             print(f"[DEBUG] Password verification failed for: {username}")
             raise HTTPException(status_code=401, detail="Invalid username or password")
         
@@ -502,22 +524,49 @@ async def verify_admin_token(authorization: Optional[str] = Header(None)):
 
 # ============= USER ENDPOINTS =============
 
-@app.post("/verify")
-async def verify_uploaded_file(file: UploadFile = File(...)):
-    """Upload a file, hash it, and check DB for match."""
-    try:
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-
-        file_hash = hash_file(tmp_path)
-        os.remove(tmp_path)
+# The body is parsed by hand so the upload can be hashed while it streams in;
+# this schema keeps the file picker in the generated API docs.
+VERIFY_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
 
-        record = find_file_by_hash(file_hash)
+@app.post("/verify", openapi_extra=VERIFY_REQUEST_BODY)
+async def verify_uploaded_file(request: Request):
+    """Upload a file, hash it while it is received, and check DB for match."""
+    try:
+        try:
+            file_hash = await hash_multipart_stream(
+                request.stream(), request.headers.get("content-type", "")
+            )
+        except ValueError as e:
+            # No boundary, or not a multipart body; the parser's errors are ValueErrors too
+            raise HTTPException(status_code=422, detail=f"Invalid multipart body: {e}")
+        if file_hash is None:
+            raise HTTPException(status_code=422, detail="Missing 'file' field")
+
+        # The filter rules out most unknown hashes without a DB query
+        record = await find_file_by_hash(file_hash) if might_be_known(file_hash) else None
         if record:
-            hash_retrieved_hex, block_num, timestamp = retrieve_record(record["recordId"])
-            return {
+            if "chainHash" in record:
+                # Stored once the anchor was mined; records never change on chain
+                hash_retrieved_hex = record["chainHash"]
+                block_num, timestamp = record["blockNumber"], record["timestamp"]
+            else:
+                hash_retrieved_hex, block_num, timestamp = await retrieve_record(record["recordId"])
+                await set_chain_metadata([(record["filename"], block_num, timestamp, hash_retrieved_hex)])
+                invalidate_hashes([file_hash])
+            result = {
                 "status": "original",
                 "matched_file": record["filename"],
                 "hash": record["hash"],
@@ -526,17 +575,69 @@ async def verify_uploaded_file(file: UploadFile = File(...)):
                 "timestamp": timestamp,
                 "hash_verified": hash_retrieved_hex
             }
-        else:
+            if "merkleProof" in record:
+                # Batched anchor: the chain holds the Merkle root, not the file hash
+                merkle_verified = verify_proof(file_hash, record["merkleProof"], hash_retrieved_hex)
+                result["merkle_root"] = hash_retrieved_hex
+                result["merkle_verified"] = merkle_verified
+                if not merkle_verified:
+                    result["status"] = "unverified"
+                    result["message"] = "Merkle proof does not match the on-chain root."
+            return result
+        anchored = find_anchored(file_hash)
+        if anchored:
+            # Anchored on chain, but not by this backend's DB
+            record_id, block_num, timestamp = anchored
             return {
-                "status": "no_match",
-                "message": "No such file in DB.",
+                "status": "original",
+                "matched_file": None,
                 "hash": file_hash,
+                "recordId": record_id,
+                "block_num": block_num,
+                "timestamp": timestamp,
+                "hash_verified": file_hash,
+                "source": "chain_index"
             }
+        return {
+            "status": "no_match",
+            "message": "No such file in DB.",
+            "hash": file_hash,
+        }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
 # ============= ADMIN ENDPOINTS (Protected) =============
 
+def upload_success(file: UploadFile, file_hash: str, new_record_Id, tx_hash, block_num, timestamp) -> dict:
+    """Build the per-file result returned by /admin/upload"""
+    # Convert tx_hash to string
+    tx_hash_str = tx_hash.hex() if hasattr(tx_hash, "hex") else str(tx_hash)
+    return {
+        "filename": file.filename,
+        "hash": file_hash,
+        "recordId": new_record_Id,
+        "status": "success",
+        "tx_hash": tx_hash_str,
+        "block_num": block_num,
+        "timestamp": timestamp,
+        "file_type": file.content_type or "unknown"
+    }
+
+def upload_existing(file: UploadFile, file_hash: str, doc: dict) -> dict:
+    """Per-file result for content that is already certified: its existing record, not re-anchored"""
+    return {
+        "filename": file.filename,
+        "hash": file_hash,
+        "recordId": doc.get("recordId"),
+        "status": "exists",
+        "certified_as": doc.get("filename"),
+        "block_num": doc.get("blockNumber"),
+        "timestamp": doc.get("timestamp"),
+        "file_type": file.content_type or "unknown"
+    }
+
 @app.post("/admin/upload")
 async def admin_upload_files(
     files: List[UploadFile] = File(...),
@@ -556,6 +657,8 @@ async def admin_upload_files(
         print(f"[DEBUG] Upload authorized for admin_id: {admin_id}")
         
         results = []
+        anchoring = []
+        stats = get_admin_stats()
         os.makedirs("files", exist_ok=True)
 
         for file in files:
@@ -566,32 +669,48 @@ async def admin_upload_files(
                 # Create subdirectories if they don't exist
                 os.makedirs(os.path.dirname(file_path) or "files", exist_ok=True)
                 
-                with open(file_path, "wb") as f:
-                    content = await file.read()
-                    f.write(content)
-
-                # Hash the file
-                file_hash = hash_file(file_path)
-
-                # Store on blockchain
-                new_record_Id, digest, tx_hash = store_record(file_path)
-
-                # Save to database
-                upsert_hashes([(file.filename, digest, new_record_Id)])
-
-                # Convert tx_hash to string
-                tx_hash_str = tx_hash.hex() if hasattr(tx_hash, "hex") else str(tx_hash)
+                # Save and hash the file in one pass
+                file_hash = await save_upload_and_hash(file, file_path)
+                stats.record_hashed(os.path.getsize(file_path))
+
+                if batching_enabled():
+                    # Anchored with other uploads under one Merkle root; awaited below
+                    submitted = get_batcher().submit(file.filename, file_hash)
+                    stats.anchor_started()
+                    submitted.add_done_callback(lambda _: stats.anchor_done())
+                    anchoring.append((file, file_hash, asyncio.wrap_future(submitted)))
+                    continue
+
+                # Store on blockchain and save to database
+                stats.anchor_started()
+                try:
+                    new_record_Id, digest, tx_hash, block_num, timestamp = await store_digest(file.filename, file_hash)
+                finally:
+                    stats.anchor_done()
+                stats.record_certified(new_record_Id)
+                results.append(upload_success(file, file_hash, new_record_Id, tx_hash, block_num, timestamp))
+                print(f"✓ Uploaded and verified: {file.filename}")
 
+            except DigestAlreadyStored as e:
+                print(f"= Already certified: {file.filename} ({e})")
+                results.append(upload_existing(file, file_hash, e.doc))
+            except Exception as e:
+                print(f"✗ Error processing {file.filename}: {str(e)}")
                 results.append({
                     "filename": file.filename,
-                    "hash": file_hash,
-                    "recordId": new_record_Id,
-                    "status": "success",
-                    "tx_hash": tx_hash_str,
-                    "file_type": file.content_type or "unknown"
+                    "status": "error",
+                    "error": str(e)
                 })
-                print(f"✓ Uploaded and verified: {file.filename}")
 
+        for file, file_hash, pending in anchoring:
+            try:
+                new_record_Id, digest, tx_hash, block_num, timestamp = await pending
+                stats.record_certified(new_record_Id)
+                results.append(upload_success(file, file_hash, new_record_Id, tx_hash, block_num, timestamp))
+                print(f"✓ Uploaded and verified: {file.filename}")
+            except DigestAlreadyStored as e:
+                print(f"= Already certified: {file.filename} ({e})")
+                results.append(upload_existing(file, file_hash, e.doc))
             except Exception as e:
                 print(f"✗ Error processing {file.filename}: {str(e)}")
                 results.append({
@@ -602,9 +721,10 @@ async def admin_upload_files(
 
         # After successful upload, cleanup files
         successful_count = len([r for r in results if r["status"] == "success"])
+        existing_count = len([r for r in results if r["status"] == "exists"])
         cleanup_status = "pending"
         
-        if successful_count > 0:
+        if successful_count + existing_count > 0:
             print("\nCleaning up files folder...")
             if cleanup_files_folder():
                 cleanup_status = "completed"
@@ -615,6 +735,7 @@ async def admin_upload_files(
             "uploaded_files": results,
             "total": len(results),
             "successful": successful_count,
+            "existing": existing_count,
             "failed": len([r for r in results if r["status"] == "error"]),
             "cleanup_status": cleanup_status
         }
@@ -636,18 +757,11 @@ async def admin_stats(authorization: Optional[str] = Header(None)):
         admin_id = verify_token_from_header(authorization)
         print(f"[DEBUG] Stats authorized for admin_id: {admin_id}")
         
-        total_records = get_total_record()
-        csv_entries = 0
-
-        if os.path.exists("output.csv"):
-            with open("output.csv", "r") as f:
-                lines = f.readlines()
-                csv_entries = len(lines) - 1 if len(lines) > 1 else 0
-
+        # Counters kept up to date on ingest and refreshed from the chain in the background
         return {
-            "total_records": total_records,
-            "csv_entries": csv_entries,
+            **get_admin_stats().snapshot(),
             "upload_folder": "files",
+            "cache": cache_stats(),
             "status": "ok"
         }
     except HTTPException as e:
@@ -662,6 +776,76 @@ async def admin_stats(authorization: Optional[str] = Header(None)):
             "status": "error"
         }
 
+@app.post("/admin/records/bulk")
+async def admin_bulk_records(
+    record_ids: List[int] = Body(..., embed=True),
+    batch_size: Optional[int] = Body(None, embed=True),
+    authorization: Optional[str] = Header(None)
+):
+    """Read many on-chain records in JSON-RPC batches - requires authentication"""
+    verify_token_from_header(authorization)
+
+    if len(record_ids) > BULK_MAX_RECORDS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_RECORDS} record IDs per request")
+    if batch_size is not None and batch_size < 1:
+        raise HTTPException(status_code=422, detail="batch_size must be positive")
+
+    try:
+        records = await retrieve_records(record_ids, batch_size)
+    except Exception as e:
+        print(f"[ERROR] Bulk record error: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+    results = []
+    for record_id, record in zip(record_ids, records):
+        if record is None:
+            results.append({"recordId": record_id, "status": "error"})
+            continue
+        hash_retrieved_hex, block_num, timestamp = record
+        results.append({
+            "recordId": record_id,
+            "status": "ok",
+            "hash": hash_retrieved_hex,
+            "block_num": block_num,
+            "timestamp": timestamp
+        })
+
+    return {
+        "total": len(results),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "records": results
+    }
+
+@app.get("/admin/export")
+async def admin_export(
+    format: str = "ndjson",
+    after: Optional[datetime] = None,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Stream every certified record as NDJSON or CSV - requires authentication
+    Records come in write order, up to EXPORT_SETTLE seconds ago so writes
+    still committing are not passed over. The X-Export-Cursor header holds
+    where this export stops; pass it as `after` once the export completed
+    to get only the records written since.
+    """
+    verify_token_from_header(authorization)
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if after is not None and after.tzinfo is not None:
+        after = after.astimezone(timezone.utc).replace(tzinfo=None)
+    until = datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE)
+
+    return StreamingResponse(
+        export_chunks(iter_record_batches(after, until, EXPORT_BATCH_SIZE), format),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="records.{format}"',
+            "X-Export-Cursor": until.isoformat(),
+        }
+    )
+
 @app.post("/admin/logout")
 async def logout_admin(authorization: Optional[str] = Header(None)):
     """Logout admin - token becomes invalid on frontend"""
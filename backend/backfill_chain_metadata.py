@@ -0,0 +1,9 @@
+from core.interact_certifier import backfill_chain_metadata
+
+def main():
+    # Documents anchored before chain metadata was stored at anchor time
+    # get their block number, timestamp and on-chain hash copied in once.
+    backfill_chain_metadata()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+from core import auth, database
+from core.database import chain_fields
+import argparse
+import asyncio
+import contextlib
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from blake3 import blake3
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Measure /verify latency with and without concurrent admin logins.")
+    parser.add_argument("--workers", type=int, default=auth.AUTH_WORKERS, help="auth pool size; 0 runs bcrypt on the event loop")
+    parser.add_argument("--verifiers", type=int, default=8, help="concurrent /verify clients")
+    parser.add_argument("--logins", type=int, default=4, help="concurrent /admin/login clients")
+    parser.add_argument("--seconds", type=float, default=5)
+    return parser.parse_args(argv)
+
+def percentile(samples, pct):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def report(name, samples, seconds):
+    if not samples:
+        print(f"{name:<18} no requests completed", file=sys.__stdout__)
+        return
+    print(f"{name:<18} {len(samples):>7} req {len(samples) / seconds:>8,.0f} req/s"
+          f"  p50 {statistics.median(samples) * 1e3:8.2f}ms  p99 {percentile(samples, 99) * 1e3:8.2f}ms",
+          file=sys.__stdout__)
+
+def start_server():
+    """Serve the app on a free local port from a background thread; no lifespan, so no chain or folder work."""
+    import uvicorn
+    from app import app
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off",
+                                           log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+async def run(args, url, content):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.verifiers + args.logins)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        await client.post("/admin/register", params={
+            "username": "bench", "password": "bench-password", "email": "bench@example.com", "full_name": "Bench"})
+
+        async def verify(samples, until):
+            while time.perf_counter() < until:
+                t = time.perf_counter()
+                response = await client.post("/verify", files={"file": ("bench.txt", content)})
+                samples.append(time.perf_counter() - t)
+                assert response.json()["status"] == "original", response.text
+
+        async def login(samples, until):
+            while time.perf_counter() < until:
+                t = time.perf_counter()
+                response = await client.post("/admin/login", params={"username": "bench", "password": "bench-password"})
+                samples.append(time.perf_counter() - t)
+                assert response.json()["status"] == "success", response.text
+
+        for with_logins in (False, True):
+            verifies, logins = [], []
+            until = time.perf_counter() + args.seconds
+            tasks = [verify(verifies, until) for _ in range(args.verifiers)]
+            if with_logins:
+                tasks += [login(logins, until) for _ in range(args.logins)]
+            await asyncio.gather(*tasks)
+            report("verify + logins" if with_logins else "verify alone", verifies, args.seconds)
+            if with_logins:
+                report("login", logins, args.seconds)
+
+def main(argv=()):
+    args = parse_args(list(argv))
+    auth.AUTH_WORKERS = args.workers
+    # Self-contained: hashes and admins in a throwaway embedded store.
+    tmp = tempfile.TemporaryDirectory()
+    database.STORAGE_BACKEND = "sqlite"
+    database.SQLITE_STORE_FILE = os.path.join(tmp.name, "bench.db")
+    content = b"auth benchmark file"
+    digest = blake3(content).hexdigest()
+    database.upsert_hashes([("bench.txt", digest, 0, chain_fields(1, 0, digest))])
+    print(f"auth workers: {args.workers or 'inline'}")
+    # The handlers log every request; keep the report readable.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        server, thread, url = start_server()
+        try:
+            asyncio.run(run(args, url, content))
+        finally:
+            server.should_exit = True
+            thread.join()
+            auth.close_auth_executor()
+            database.close_database()
+            tmp.cleanup()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+from core import database, record_cache
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Time bulk upserts and hash lookups against a storage backend.")
+    parser.add_argument("--backend", choices=["sqlite", "mongo"], default="sqlite")
+    parser.add_argument("--records", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=database.MONGODB_WRITE_BATCH_SIZE)
+    return parser.parse_args(argv)
+
+def percentile(samples, pct):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+def report(name, seconds, count, samples=None):
+    line = f"{name:<14} {count:>9} ops {seconds:8.2f}s {count / seconds:>11,.0f} ops/s"
+    if samples:
+        line += (f"  p50 {statistics.median(samples) * 1e6:7.0f}us"
+                 f"  p99 {percentile(samples, 99) * 1e6:7.0f}us")
+    print(line)
+
+def main(argv=()):
+    args = parse_args(list(argv))
+    # Every lookup must reach the backend, not the record cache.
+    record_cache.RECORD_CACHE_TTL = record_cache.RECORD_CACHE_NEGATIVE_TTL = 0
+    database.STORAGE_BACKEND = args.backend
+    tmp = tempfile.TemporaryDirectory()
+    if args.backend == "sqlite":
+        database.SQLITE_STORE_FILE = os.path.join(tmp.name, "bench.db")
+    else:
+        # A throwaway database on the server in MONGODB_URI, dropped afterwards.
+        database.MONGODB_DB = f"storage_bench_{os.getpid()}"
+    if not database.init_database():
+        raise SystemExit(1)
+
+    digests = [os.urandom(32).hex() for _ in range(args.records)]
+    try:
+        started = time.perf_counter()
+        for i in range(0, args.records, args.batch_size):
+            database.upsert_hashes([(f"file_{j}", digests[j], j) for j in range(i, min(i + args.batch_size, args.records))])
+        report("bulk upsert", time.perf_counter() - started, args.records)
+
+        for name, pick in (("lookup hit", lambda: random.choice(digests)), ("lookup miss", lambda: os.urandom(32).hex())):
+            samples = []
+            for _ in range(args.lookups):
+                digest = pick()
+                t = time.perf_counter()
+                database.find_file_by_hash(digest)
+                samples.append(time.perf_counter() - t)
+            report(name, sum(samples), args.lookups, samples)
+
+        started = time.perf_counter()
+        scanned = sum(1 for _ in database.scan_hashes())
+        report("full scan", time.perf_counter() - started, scanned)
+    finally:
+        if args.backend == "mongo":
+            database.get_mongo_client().drop_database(database.MONGODB_DB)
+        database.close_database()
+        tmp.cleanup()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,9 +1,39 @@
 
-from core.interact_certifier import get_total_record, retrieve_record, store_record
+from core.interact_certifier import get_total_record, retrieve_record, retrieve_records, store_record
 # from core.file_hasher import process_folder_test
+import argparse
 import datetime
+import sys
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Inspect records on the certifier contract.")
+    parser.add_argument("--records", type=int, nargs="+", metavar="ID",
+                        help="record IDs to read in JSON-RPC batches")
+    parser.add_argument("--range", type=int, nargs=2, metavar=("START", "END"),
+                        help="read every record ID from START up to, not including, END")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="calls per JSON-RPC batch (default: RPC_BATCH_SIZE)")
+    return parser.parse_args(argv)
+
+def print_records(recordIds, batch_size=None):
+    records = retrieve_records(recordIds, batch_size)
+    failed = 0
+    for recordId, record in zip(recordIds, records):
+        if record is None:
+            failed += 1
+            print(f"{recordId}\tERROR")
+            continue
+        hash_retrieved_hex, block_num, timestamp = record
+        print(f"{recordId}\t{hash_retrieved_hex}\t{block_num}\t{datetime.datetime.fromtimestamp(timestamp)}")
+    print(f"Read {len(recordIds) - failed} of {len(recordIds)} record(s).")
+
+def main(argv=()):
+    args = parse_args(list(argv))
+    if args.records or args.range:
+        recordIds = list(args.records or range(*args.range))
+        print_records(recordIds, args.batch_size)
+        return
 
-def main():
     print(f"  - Total records:       {get_total_record()}") 
     print("------------------------------------\n")
 
@@ -18,7 +48,7 @@ def main():
     # # enable to store a new file. use absolute file path
     # # singleFilePath = "C:\\Users\\gerar\\OneDrive\\Desktop\\temp\\test\\CertRoot\\backend\\files\\frog_modified.png"
     # singleFilePath = "/home/gerard/Software/Blockchain_Web_App/fyp/dev/CertRoot/inputs/test.txt"
-    # new_record_Id, digest, tx_hash = store_record(singleFilePath)
+    # new_record_Id, digest, tx_hash, block_num, timestamp = store_record(singleFilePath)
     # print(f"  - Record ID :         {new_record_Id}")
     # print(f"  - File hash :         {digest}")
     # print(f"  - transaction hash :       {tx_hash}")
@@ -28,4 +58,4 @@ def main():
     # process_folder_test()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
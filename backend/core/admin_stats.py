@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from .interact_certifier import get_total_record
+from .ledger import get_ledger
+from .periodic import PeriodicTask
+
+# Seconds between background reads of the on-chain record count; 0 disables them.
+ADMIN_STATS_REFRESH = float(os.getenv("ADMIN_STATS_REFRESH", 30))
+# Days of per-day certification counts kept.
+ADMIN_STATS_DAYS = int(os.getenv("ADMIN_STATS_DAYS", 30))
+
+_stats = None
+_stats_lock = threading.Lock()
+_refresher = PeriodicTask("admin-stats", "Admin stats refresh", lambda: refresh_admin_stats())
+
+
+class AdminStats:
+    """
+    Counters behind GET /admin/stats.
+
+    Ingest paths update them as files are hashed and anchored; the chain
+    record count and the ledger size are re-read in the background by
+    refresh_admin_stats. Reading a snapshot touches no disk or network.
+    """
+
+    def __init__(self, days: Optional[int] = None, clock=time.time):
+        self.days = ADMIN_STATS_DAYS if days is None else days
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.total_records = None
+        self.ledger_entries = 0
+        self.files_hashed = 0
+        self.bytes_hashed = 0
+        self.pending_anchors = 0
+        self.per_day = OrderedDict()  # "YYYY-MM-DD" (UTC) -> files certified
+        self.refreshed_at = None
+        self.refresh_error = None
+
+    def record_hashed(self, nbytes: int, files: int = 1):
+        with self._lock:
+            self.files_hashed += files
+            self.bytes_hashed += nbytes
+
+    def anchor_started(self, count: int = 1):
+        with self._lock:
+            self.pending_anchors += count
+
+    def anchor_done(self, count: int = 1):
+        with self._lock:
+            self.pending_anchors = max(0, self.pending_anchors - count)
+
+    def record_certified(self, record_id: int, count: int = 1):
+        """Count `count` files anchored under `record_id`; record IDs start at 0."""
+        day = datetime.fromtimestamp(self._clock(), timezone.utc).date().isoformat()
+        with self._lock:
+            if self.total_records is not None:
+                self.total_records = max(self.total_records, record_id + 1)
+            self.per_day[day] = self.per_day.get(day, 0) + count
+            self.per_day.move_to_end(day)
+            while len(self.per_day) > self.days:
+                self.per_day.popitem(last=False)
+
+    def set_ledger_entries(self, count: int):
+        with self._lock:
+            self.ledger_entries = count
+
+    def refreshed(self, total_records: Optional[int] = None, error: Optional[str] = None):
+        """Store the result of a background refresh; a failed one keeps the old count."""
+        with self._lock:
+            if error is None:
+                self.total_records = total_records
+                self.refreshed_at = self._clock()
+            self.refresh_error = error
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            age = None if self.refreshed_at is None else self._clock() - self.refreshed_at
+            return {
+                "total_records": self.total_records or 0,
+                "csv_entries": self.ledger_entries,
+                "files_hashed": self.files_hashed,
+                "bytes_hashed": self.bytes_hashed,
+                "pending_anchors": self.pending_anchors,
+                "records_per_day": dict(self.per_day),
+                "refreshed_at": None if self.refreshed_at is None
+                else datetime.fromtimestamp(self.refreshed_at, timezone.utc).isoformat(),
+                "age_seconds": None if age is None else round(age, 3),
+                # Missed at least one refresh, or never refreshed at all.
+                "stale": age is None or (ADMIN_STATS_REFRESH > 0 and age > 2 * ADMIN_STATS_REFRESH),
+                "refresh_error": self.refresh_error,
+            }
+
+
+def get_admin_stats() -> AdminStats:
+    """Return the process-wide counters, creating them on first use."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = AdminStats()
+        return _stats
+
+
+def refresh_admin_stats(stats: Optional[AdminStats] = None):
+    """Re-read the chain record count and the ledger size into `stats`."""
+    if stats is None:
+        stats = get_admin_stats()
+    stats.set_ledger_entries(len(get_ledger()))
+    try:
+        total = get_total_record()
+    except Exception as e:
+        stats.refreshed(error=str(e))
+        raise
+    stats.refreshed(total)
+
+
+def start_stats_refresher(interval: Optional[float] = None) -> Optional[PeriodicTask]:
+    """Run refresh_admin_stats in the background every `interval` seconds (ADMIN_STATS_REFRESH; 0 disables it)."""
+    return _refresher.start(ADMIN_STATS_REFRESH if interval is None else interval)
+
+
+def stop_stats_refresher():
+    _refresher.stop()
@@ -0,0 +1,137 @@
+import asyncio
+from typing import Optional
+from pymongo import AsyncMongoClient
+from . import database
+from .database import cached_document, write_failure
+from .mongo_store import AsyncMongoStore
+from .sqlite_store import AsyncSQLiteStore, SQLiteStore
+from .storage import AsyncStore
+from .record_cache import get_record_cache, invalidate_hashes
+from .hash_filter import add_known_hashes
+
+_client = None
+_client_loop = None
+_store = None
+_store_loop = None
+_store_source = None  # the database.get_store() instance _store was built for
+
+
+def _get_client():
+    """
+    Return the AsyncMongoClient for the running event loop.
+    The client's connections belong to one loop, so a new loop gets a new
+    client. Pool size and timeouts are the same as the sync client's.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = AsyncMongoClient(
+            database.MONGODB_URI,
+            maxPoolSize=database.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=database.MONGODB_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=database.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=database.MONGODB_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=database.MONGODB_SOCKET_TIMEOUT_MS,
+        )
+        _client_loop = loop
+    return _client
+
+
+async def get_store() -> Optional[AsyncStore]:
+    """
+    Return the async side of database.get_store() for the running event
+    loop, or None without a database. Opening the store (indexes included)
+    runs on a worker thread, normally once at startup.
+    """
+    global _store, _store_loop, _store_source
+    store = database._store
+    if store is None:
+        store = await asyncio.to_thread(database.get_store)
+        if store is None:
+            return None
+    loop = asyncio.get_running_loop()
+    if _store is None or _store_loop is not loop or _store_source is not store:
+        if isinstance(store, SQLiteStore):
+            _store = AsyncSQLiteStore(store)
+        else:
+            db = _get_client()[database.MONGODB_DB]
+            _store = AsyncMongoStore(db[database.MONGODB_COLLECTION], db[database.MONGODB_ADMIN_COLLECTION])
+        _store_loop, _store_source = loop, store
+    return _store
+
+
+async def get_admin_collection():
+    """Return the async admins collection (find_one / insert_one) or None."""
+    store = await get_store()
+    return None if store is None else store.admins
+
+
+async def close_database():
+    """Close the async client; the next call builds a new one."""
+    global _client, _client_loop, _store, _store_loop, _store_source
+    client, _client, _client_loop = _client, None, None
+    _store = _store_loop = _store_source = None
+    if client is not None:
+        await client.close()
+
+
+async def upsert_hashes(data):
+    """Async counterpart of database.upsert_hashes."""
+    store = await get_store()
+    if store is None:
+        return
+    try:
+        if not data:
+            return
+        add_known_hashes(row[1] for row in data)
+        return await store.upsert_hashes(data)
+    except Exception as e:
+        return write_failure(data, e)
+    finally:
+        invalidate_hashes([row[1] for row in data], [row[0] for row in data])
+
+
+async def set_chain_metadata(rows):
+    """Async counterpart of database.set_chain_metadata."""
+    store = await get_store()
+    if store is None or not rows:
+        return
+    try:
+        return await store.set_chain_metadata(rows)
+    except Exception as e:
+        print(f"Error writing to MongoDB: {e}")
+        return None
+
+
+async def find_file_by_hash(file_hash):
+    """Async counterpart of database.find_file_by_hash."""
+    cache = get_record_cache()
+    found, doc = cache.get(file_hash)
+    if found:
+        return cached_document(doc)
+    store = await get_store()
+    if store is None:
+        return None
+    doc = await store.find_file_by_hash(file_hash)
+    cache.put(file_hash, doc)
+    return cached_document(doc)
+
+
+async def iter_record_batches(after=None, until=None, batch_size=1000):
+    """
+    Yield lists of up to `batch_size` anchored documents whose hash was
+    written in (after, until] (naive UTC; either bound may be None), in
+    write order, with `hash` as hex. Batches are read as they are sent,
+    so memory stays flat however many documents match.
+
+    Write order is not commit order: a write stamped before `until` can
+    still be committing, so pass an `until` a settle delay in the past.
+    Exporting (after, until] and then resuming from `until` then skips
+    nothing. recordId would not do as a cursor, since pipelined anchors
+    and batched writes commit out of recordId order.
+    """
+    store = await get_store()
+    if store is None:
+        return
+    async for batch in store.iter_record_batches(after, until, batch_size):
+        yield batch
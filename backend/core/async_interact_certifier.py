@@ -0,0 +1,200 @@
+import asyncio
+import os
+from aiohttp import ClientTimeout
+from web3 import AsyncWeb3
+from .json_utils import get_config
+from .rpc_router import AsyncRoutedHTTPProvider
+from .database import DigestAlreadyStored, chain_fields, get_upsert_buffer
+from .async_database import find_file_by_hash
+from .record_cache import get_chain_cache
+from .interact_certifier import (
+    ANCHOR_TIMEOUT,
+    CONFIG_FILE,
+    RPC_BATCH_SIZE,
+    bytes32_to_hex,
+    contract_generation,
+    decode_record,
+    get_submitter,
+    hex_to_bytes32,
+    predicted_record_id,
+    rebase_record_offset,
+    submit_anchor,
+)
+
+# Upper bound for one contract read, retries included.
+ASYNC_RPC_TIMEOUT = float(os.getenv("ASYNC_RPC_TIMEOUT", os.getenv("RPC_TIMEOUT", 30)))
+
+_contract = None
+_contract_loop = None
+_contract_lock = None
+# interact_certifier.contract_generation() the contract was built for
+_contract_generation = None
+
+
+def _build_contract():
+    rpc_url, wallet_address, abi, contract_address = get_config(CONFIG_FILE)
+    if isinstance(rpc_url, list) and len(rpc_url) > 1:
+        # Split the read budget so every endpoint gets a turn inside one ASYNC_RPC_TIMEOUT.
+        attempt_timeout = ASYNC_RPC_TIMEOUT / len(rpc_url)
+        request_kwargs = {"timeout": ClientTimeout(total=attempt_timeout)}
+        provider = AsyncRoutedHTTPProvider(rpc_url, request_kwargs=request_kwargs, attempt_timeout=attempt_timeout)
+    else:
+        request_kwargs = {"timeout": ClientTimeout(total=ASYNC_RPC_TIMEOUT)}
+        if isinstance(rpc_url, list):
+            rpc_url = rpc_url[0]
+        provider = AsyncWeb3.AsyncHTTPProvider(rpc_url, request_kwargs=request_kwargs)
+    w3 = AsyncWeb3(provider)
+    return w3.eth.contract(address=contract_address, abi=abi)
+
+
+async def connect_contract():
+    """
+    Return the async contract instance for the running event loop.
+    The provider's HTTP session belongs to one loop, so a new loop gets a
+    new contract. So does interact_certifier.reload_contract.
+    """
+    global _contract, _contract_loop, _contract_lock, _contract_generation
+    loop = asyncio.get_running_loop()
+    generation = contract_generation()
+    if _contract is None or _contract_loop is not loop or _contract_generation != generation:
+        if _contract_loop is not loop:
+            _contract_lock = asyncio.Lock()
+            _contract_loop = loop
+            _contract = None
+        async with _contract_lock:
+            if _contract is not None and _contract_generation != generation:
+                stale, _contract = _contract, None
+                await stale.w3.provider.disconnect()
+            if _contract is None:
+                _contract = _build_contract()
+                _contract_generation = generation
+    return _contract
+
+
+async def close_contract():
+    """Close the provider's HTTP session; the next call builds a new one."""
+    global _contract, _contract_loop
+    contract_instance, _contract, _contract_loop = _contract, None, None
+    if contract_instance is not None:
+        await contract_instance.w3.provider.disconnect()
+
+
+async def _call(fn, **kwargs):
+    return await asyncio.wait_for(fn.call(**kwargs), ASYNC_RPC_TIMEOUT)
+
+
+async def retrieve_record(recordId):
+    # Records never change once mined, so repeat reads come from the cache.
+    cache = get_chain_cache()
+    found, record = cache.get(recordId)
+    if found:
+        return record
+    contract_instance = await connect_contract()
+    hash_retrieved_bytes, block_num, timestamp = await _call(contract_instance.functions.retrieve(recordId))
+    record = bytes32_to_hex(hash_retrieved_bytes), block_num, timestamp
+    cache.put(recordId, record)
+    return record
+
+
+async def _retrieve_or_none(contract_instance, recordId):
+    try:
+        return await _call(contract_instance.functions.retrieve(recordId))
+    except Exception as e:
+        print(f"Error reading record {recordId}: {e}")
+        return None
+
+
+async def retrieve_records(recordIds, batch_size=None):
+    """
+    Async counterpart of interact_certifier.retrieve_records: one
+    (hash_hex, block_num, timestamp) or None per ID, read in JSON-RPC
+    batches of `batch_size` calls.
+    """
+    contract_instance = await connect_contract()
+    w3 = contract_instance.w3
+    batch_size = batch_size or RPC_BATCH_SIZE
+    results = []
+    for start in range(0, len(recordIds), batch_size):
+        chunk = recordIds[start:start + batch_size]
+        try:
+            async with w3.batch_requests() as batch:
+                for recordId in chunk:
+                    batch.add(contract_instance.functions.retrieve(recordId))
+                responses = await asyncio.wait_for(batch.async_execute(), ASYNC_RPC_TIMEOUT)
+        except Exception as e:
+            print(f"Batch read of {len(chunk)} record(s) failed, reading one by one: {e}")
+            responses = [await _retrieve_or_none(contract_instance, recordId) for recordId in chunk]
+        results.extend(decode_record(recordId, response) for recordId, response in zip(chunk, responses))
+    return results
+
+
+async def get_total_record():
+    contract_instance = await connect_contract()
+    return await _call(contract_instance.functions.get_total_records())
+
+
+async def _expected_record_id(contract_instance, sender, nonce):
+    new_record_Id = predicted_record_id(nonce)
+    if new_record_Id is None:
+        w3 = contract_instance.w3
+        block = await asyncio.wait_for(w3.eth.block_number, ASYNC_RPC_TIMEOUT)
+        total = await _call(contract_instance.functions.get_total_records(), block_identifier=block)
+        sent = await asyncio.wait_for(w3.eth.get_transaction_count(sender, block), ASYNC_RPC_TIMEOUT)
+        rebase_record_offset(total, sent)
+        new_record_Id = nonce + total - sent
+    return new_record_Id
+
+
+async def _find_record_id(contract_instance, hash_bytes32, block_num):
+    """Scan the records written in block `block_num` for `hash_bytes32`."""
+    functions = contract_instance.functions
+    total = await _call(functions.get_total_records(), block_identifier=block_num)
+    for record_id in range(total - 1, -1, -1):
+        file_hash, timestamp, record_block = await _call(functions.hash_records(record_id), block_identifier=block_num)
+        if record_block < block_num:
+            break
+        if file_hash == hash_bytes32:
+            return record_id, timestamp
+    raise LookupError(f"No record for {hash_bytes32.hex()} in block {block_num}")
+
+
+async def anchor_digest(digest):
+    """
+    Async counterpart of interact_certifier.anchor_digest.
+    Returns (new_record_Id, tx_hash, block_num, timestamp) once mined.
+
+    Sending still goes through the shared TxSubmitter, which owns the
+    nonces, on a worker thread; the receipt and record reads are awaited.
+    """
+    pending = await asyncio.to_thread(submit_anchor, digest)
+    tx_hash, receipt, nonce = await asyncio.wait_for(asyncio.wrap_future(pending), ANCHOR_TIMEOUT)
+    contract_instance = await connect_contract()
+    hash_bytes32 = hex_to_bytes32(digest)
+    block_num = receipt["blockNumber"]
+
+    new_record_Id = await _expected_record_id(contract_instance, get_submitter().sender, nonce)
+    file_hash, timestamp, record_block = await _call(
+        contract_instance.functions.hash_records(new_record_Id), block_identifier=block_num
+    )
+    if file_hash != hash_bytes32 or record_block != block_num:
+        new_record_Id, timestamp = await _find_record_id(contract_instance, hash_bytes32, block_num)
+        rebase_record_offset(new_record_Id, nonce)
+
+    return new_record_Id, tx_hash, block_num, timestamp
+
+
+async def store_digest(filename, digest):
+    """
+    Async counterpart of interact_certifier.store_digest.
+    Returns (new_record_Id, digest, tx_hash, block_num, timestamp).
+    Raises DigestAlreadyStored, without anchoring, for a digest that already
+    has a document, and re-raises a rejected write.
+    """
+    existing = await find_file_by_hash(digest)
+    if existing is not None:
+        raise DigestAlreadyStored(existing)
+    new_record_Id, tx_hash, block_num, timestamp = await anchor_digest(digest)
+    row = (filename, digest, new_record_Id, chain_fields(block_num, timestamp, digest))
+    # Coalesced with concurrent uploads; written before the caller responds.
+    await asyncio.wrap_future(get_upsert_buffer().submit(row))
+    return new_record_Id, digest, tx_hash, block_num, timestamp
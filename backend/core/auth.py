@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .record_cache import TTLCache, get_cache
+
+# Threads for bcrypt hashes and checks, each tens of milliseconds of CPU; 0 runs them on the event loop.
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", 2))
+# Seconds a looked-up admin document, and an unknown username, stay cached.
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", 30))
+ADMIN_CACHE_NEGATIVE_TTL = float(os.getenv("ADMIN_CACHE_NEGATIVE_TTL", 5))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_auth_executor() -> Optional[ThreadPoolExecutor]:
+    """Return the process-wide auth pool, or None when AUTH_WORKERS is 0."""
+    global _executor
+    with _executor_lock:
+        if _executor is None and AUTH_WORKERS > 0:
+            _executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+        return _executor
+
+
+def close_auth_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+async def run_auth(fn: Callable, *args):
+    """
+    Run CPU-bound auth work such as bcrypt on the auth pool. bcrypt
+    releases the GIL, so the event loop keeps serving other requests; at
+    most AUTH_WORKERS run at once and the rest wait their turn.
+    """
+    executor = get_auth_executor()
+    if executor is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+
+def get_admin_cache() -> TTLCache:
+    """username -> admin document (or None) as read by find_admin."""
+    return get_cache("admins", ttl=ADMIN_CACHE_TTL, negative_ttl=ADMIN_CACHE_NEGATIVE_TTL)
+
+
+async def find_admin(admins_col, username: str):
+    """
+    Read-through lookup of an admin document by username. A deactivated
+    or changed admin is seen once the entry expires, or at once after
+    invalidate_admin.
+    """
+    cache = get_admin_cache()
+    found, admin = cache.get(username)
+    if not found:
+        admin = await admins_col.find_one({"username": username})
+        cache.put(username, admin)
+    return None if admin is None else dict(admin)
+
+
+def invalidate_admin(username: str):
+    get_admin_cache().invalidate(username)
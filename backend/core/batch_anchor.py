@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+from .database import DigestAlreadyStored, chain_fields, find_file_by_hash, get_upsert_buffer
+from .interact_certifier import anchor_digest
+from .merkle import build_tree, merkle_proof, tree_root
+
+# "single" anchors one transaction per file, "batch" anchors Merkle roots.
+ANCHOR_MODE = os.getenv("ANCHOR_MODE", "single")
+ANCHOR_BATCH_SIZE = int(os.getenv("ANCHOR_BATCH_SIZE", 256))
+ANCHOR_BATCH_WINDOW = float(os.getenv("ANCHOR_BATCH_WINDOW", 5))
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def batching_enabled() -> bool:
+    return ANCHOR_MODE == "batch"
+
+
+def merkle_fields(root: str, proof: List[dict]) -> dict:
+    """Extra MongoDB fields stored with a file anchored through a Merkle root."""
+    return {"merkleRoot": root, "merkleProof": proof}
+
+
+def anchor_batch(digests: List[str]) -> Tuple[tuple, str, List[List[dict]]]:
+    """
+    Anchor the Merkle root of `digests` in a single store transaction.
+    Returns (anchor, root, proofs): `anchor` is what anchor_digest returned
+    for the root, and there is one proof per digest.
+    """
+    levels = build_tree(digests)
+    root = tree_root(levels)
+    anchor = anchor_digest(root)
+    return anchor, root, [merkle_proof(levels, i) for i in range(len(digests))]
+
+
+class MerkleBatcher:
+    """
+    Collects (filename, digest) submissions and anchors them as one Merkle
+    root once `max_size` are waiting or the oldest has waited `max_wait`
+    seconds. Each submission gets a Future resolving to
+    (new_record_Id, digest, tx_hash, block_num, timestamp), the same shape
+    as store_digest, or failing with DigestAlreadyStored for a digest that
+    already has a document (or was submitted earlier in the same batch), or
+    with the error that rejected its row.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, max_wait: Optional[float] = None):
+        self.max_size = max_size or ANCHOR_BATCH_SIZE
+        self.max_wait = ANCHOR_BATCH_WINDOW if max_wait is None else max_wait
+        self._pending = []
+        self._first_at = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="merkle-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, filename: str, digest: str) -> Future:
+        fut = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Merkle batcher is closed.")
+            self._pending.append((filename, digest, fut))
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+        return fut
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _take(self, limit: int) -> list:
+        batch, self._pending = self._pending[:limit], self._pending[limit:]
+        self._first_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _due(self) -> bool:
+        return bool(self._pending) and (
+            self._closed
+            or len(self._pending) >= self.max_size
+            or time.monotonic() - self._first_at >= self.max_wait
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = self.max_wait - (time.monotonic() - self._first_at)
+                    self._cond.wait(timeout)
+                batch = self._take(self.max_size)
+            self._anchor(batch)
+
+    def _anchor(self, batch: list):
+        # Only digests without a document are anchored; the unique hash index
+        # would reject a second row for the others after paying for the anchor.
+        fresh, repeats, first_filename = [], [], {}
+        try:
+            for filename, digest, fut in batch:
+                existing = find_file_by_hash(digest)
+                if existing is not None:
+                    fut.set_exception(DigestAlreadyStored(existing))
+                elif digest in first_filename:
+                    repeats.append((filename, digest, fut))
+                else:
+                    first_filename[digest] = filename
+                    fresh.append((filename, digest, fut))
+            if not fresh:
+                return
+            anchor, root, proofs = anchor_batch([digest for _, digest, _ in fresh])
+            new_record_Id, tx_hash, block_num, timestamp = anchor
+        except Exception as e:
+            print(f"Error anchoring batch of {len(batch)} file(s): {e}")
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        print(f"Anchored {len(fresh)} file(s) under Merkle root {root} (record {new_record_Id})")
+        buffer = get_upsert_buffer()
+        writes = [
+            buffer.submit((filename, digest, new_record_Id,
+                           {**merkle_fields(root, proof), **chain_fields(block_num, timestamp, root)}))
+            for (filename, digest, _), proof in zip(fresh, proofs)
+        ]
+        for (_, digest, fut), written in zip(fresh, writes):
+            try:
+                written.result()
+            except Exception as e:
+                # Anchored, but without a document the upload must not report success.
+                fut.set_exception(e)
+                continue
+            fut.set_result((new_record_Id, digest, tx_hash, block_num, timestamp))
+        for _, digest, fut in repeats:
+            fut.set_exception(DigestAlreadyStored({
+                "filename": first_filename[digest], "hash": digest, "recordId": new_record_Id,
+                **chain_fields(block_num, timestamp, root),
+            }))
+
+    def flush(self):
+        """Anchor everything pending now, on the calling thread."""
+        while True:
+            with self._cond:
+                batch = self._take(self.max_size)
+            if not batch:
+                return
+            self._anchor(batch)
+
+    def close(self):
+        """Anchor what is pending and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def get_batcher() -> MerkleBatcher:
+    """Return the process-wide batcher, starting it on first use."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MerkleBatcher()
+        return _batcher
+
+
+def close_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is not None:
+            _batcher.close()
+            _batcher = None
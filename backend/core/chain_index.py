@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from .interact_certifier import get_total_record, retrieve_records
+from .periodic import PeriodicTask
+
+CHAIN_INDEX_FILE = os.getenv("CHAIN_INDEX_FILE", "chain_index.db")
+# Seconds between index syncs in the background; 0 disables the indexer.
+CHAIN_INDEX_INTERVAL = float(os.getenv("CHAIN_INDEX_INTERVAL", 30))
+# Record IDs fetched and committed per step; reads inside a step are batched.
+CHAIN_INDEX_CHUNK = int(os.getenv("CHAIN_INDEX_CHUNK", 1000))
+# Syncs a record may fail to read, while later ones read fine, before it is skipped for good.
+CHAIN_INDEX_MAX_FAILURES = int(os.getenv("CHAIN_INDEX_MAX_FAILURES", 3))
+
+_index = None
+_index_lock = threading.Lock()
+_indexer = PeriodicTask("chain-indexer", "Chain index sync", lambda: sync_once(get_chain_index()))
+
+
+class ChainIndex:
+    """
+    Local mirror of every record on the certifier contract.
+
+    One row per record ID with the 32-byte hash, block number and
+    timestamp, plus an index on the hash. Records are only ever appended
+    in ID order, so the checkpoint is simply the highest ID stored.
+    Failed reads are counted per ID in `unreadable`, which also lists
+    the IDs sync_once gave up on.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                " record_id INTEGER PRIMARY KEY,"
+                " hash BLOB NOT NULL,"
+                " block_number INTEGER NOT NULL,"
+                " timestamp INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS records_hash ON records (hash)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS unreadable ("
+                " record_id INTEGER PRIMARY KEY,"
+                " failures INTEGER NOT NULL)"
+            )
+            self._conn.commit()
+
+    def checkpoint(self) -> int:
+        """Return the next record ID to fetch."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(record_id) FROM records").fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def add(self, rows: List[Tuple[int, str, int, int]]):
+        """Store (record_id, hash_hex, block_number, timestamp) rows in one transaction."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (record_id, hash, block_number, timestamp) VALUES (?, ?, ?, ?)",
+                [(rid, bytes.fromhex(h), block, ts) for rid, h, block, ts in rows],
+            )
+            self._conn.commit()
+
+    def record_failure(self, record_id: int) -> int:
+        """Count one more failed read of `record_id`; returns how many there have been."""
+        with self._lock:
+            failures, = self._conn.execute(
+                "INSERT INTO unreadable (record_id, failures) VALUES (?, 1)"
+                " ON CONFLICT (record_id) DO UPDATE SET failures = failures + 1 RETURNING failures",
+                (record_id,),
+            ).fetchone()
+            self._conn.commit()
+        return failures
+
+    def skipped(self) -> List[int]:
+        """Record IDs sync_once gave up reading, so the index has no row for them."""
+        with self._lock:
+            return [rid for rid, in self._conn.execute(
+                "SELECT record_id FROM unreadable WHERE failures >= ? AND record_id NOT IN (SELECT record_id FROM records)"
+                " ORDER BY record_id",
+                (CHAIN_INDEX_MAX_FAILURES,),
+            )]
+
+    def lookup(self, digest: str) -> List[Tuple[int, int, int]]:
+        """Return (record_id, block_number, timestamp) for every record of `digest`, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT record_id, block_number, timestamp FROM records WHERE hash = ? ORDER BY record_id",
+                (bytes.fromhex(digest),),
+            ).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_chain_index() -> ChainIndex:
+    """Return the process-wide index at CHAIN_INDEX_FILE, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ChainIndex(CHAIN_INDEX_FILE)
+        return _index
+
+
+def sync_once(index: Optional[ChainIndex] = None, batch_size: Optional[int] = None) -> int:
+    """
+    Fetch every record past the index checkpoint and store it.
+    Stops at the first record that can't be read, so the index never has
+    gaps; the next sync starts from there. A record that still can't be
+    read after CHAIN_INDEX_MAX_FAILURES syncs, while later records can, is
+    skipped for good instead of stalling the index (see ChainIndex.skipped).
+    Returns the number added.
+    """
+    if index is None:
+        index = get_chain_index()
+    total = get_total_record()
+    added = 0
+    start = index.checkpoint()
+    while start < total:
+        recordIds = list(range(start, min(start + CHAIN_INDEX_CHUNK, total)))
+        records = retrieve_records(recordIds, batch_size)
+        # Failures before a readable record aren't an outage; those count towards skipping.
+        last_read = max((i for i, record in enumerate(records) if record is not None), default=-1)
+        rows = []
+        stalled = False
+        for i, (recordId, record) in enumerate(zip(recordIds, records)):
+            if record is None:
+                if i < last_read and index.record_failure(recordId) >= CHAIN_INDEX_MAX_FAILURES:
+                    print(f"Chain index: skipping record {recordId}, unreadable in {CHAIN_INDEX_MAX_FAILURES} syncs.")
+                    continue
+                stalled = True
+                break
+            hash_hex, block_num, timestamp = record
+            rows.append((recordId, hash_hex, block_num, timestamp))
+        if rows:
+            index.add(rows)
+            added += len(rows)
+        if stalled:
+            break
+        start = recordIds[-1] + 1
+    if added:
+        print(f"Chain index: added {added} record(s), now at {index.checkpoint()}.")
+    return added
+
+
+def find_anchored(digest: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Return (record_id, block_number, timestamp) of the first on-chain
+    record of `digest` from the local index, or None. Never opens an index
+    that has not been created yet.
+    """
+    if _index is None and not os.path.exists(CHAIN_INDEX_FILE):
+        return None
+    matches = get_chain_index().lookup(digest)
+    return matches[0] if matches else None
+
+
+def start_indexer(interval: Optional[float] = None) -> Optional[PeriodicTask]:
+    """Run sync_once in the background every `interval` seconds (CHAIN_INDEX_INTERVAL; 0 disables it)."""
+    return _indexer.start(CHAIN_INDEX_INTERVAL if interval is None else interval)
+
+
+def stop_indexer():
+    _indexer.stop()
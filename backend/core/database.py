@@ -1,5 +1,15 @@
 import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
 from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from .record_cache import get_record_cache, invalidate_hashes
+from .mongo_store import MongoStore
+from .sqlite_store import SQLiteStore
+from .storage import EXPORT_FIELDS, Store, chain_fields, decode_hash, encode_hash, hash_query
+from . import hash_filter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,53 +17,386 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI", "")
 MONGODB_DB = os.getenv("MONGODB_DB", "file_hashes_db")
 MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "hashes")
+MONGODB_ADMIN_COLLECTION = os.getenv("MONGODB_ADMIN_COLLECTION", "admins")
+# Connection pool and timeouts of the process-wide client.
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 100))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", 0))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", 10000))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", 30000))
+# Write-behind upserts: flush when this many are waiting or the oldest is this old.
+MONGODB_WRITE_BATCH_SIZE = int(os.getenv("MONGODB_WRITE_BATCH_SIZE", 500))
+MONGODB_WRITE_WINDOW = float(os.getenv("MONGODB_WRITE_WINDOW", 0.02))
+# "mongo", or "sqlite" for the embedded single-node store at SQLITE_STORE_FILE.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+SQLITE_STORE_FILE = os.getenv("SQLITE_STORE_FILE", "hashes.db")
+
+_client = None
+_client_lock = threading.Lock()
+_buffer = None
+_buffer_lock = threading.Lock()
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_mongo_client():
+    """Return the process-wide MongoClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = MongoClient(
+                MONGODB_URI,
+                maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                minPoolSize=MONGODB_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGODB_CONNECT_TIMEOUT_MS,
+                socketTimeoutMS=MONGODB_SOCKET_TIMEOUT_MS,
+            )
+        return _client
+
+
+def init_database():
+    """
+    Open the STORAGE_BACKEND store once per process, connecting and
+    creating every index. Called at app startup; other callers get it
+    lazily on first use. Returns True when the database is ready.
+    """
+    global _store
+    with _store_lock:
+        if _store is not None:
+            return True
+        if STORAGE_BACKEND == "sqlite":
+            try:
+                _store = SQLiteStore(SQLITE_STORE_FILE)
+                return True
+            except Exception as e:
+                print(f"Embedded store failed to open: {e}")
+                return False
+        if not MONGODB_URI:
+            print(" MONGODB_URI not set. Skipping DB operations. Set STORAGE_BACKEND=sqlite for the embedded store.")
+            return False
+        try:
+            db = get_mongo_client()[MONGODB_DB]
+            db[MONGODB_COLLECTION].create_index("filename", unique=True)
+            db[MONGODB_COLLECTION].create_index("hashUpdatedAt")
+            db[MONGODB_COLLECTION].create_index([("hashUpdatedAt", 1), ("filename", 1)])
+            db[MONGODB_ADMIN_COLLECTION].create_index("username", unique=True)
+            ensure_hash_index(db[MONGODB_COLLECTION])
+            _store = MongoStore(db[MONGODB_COLLECTION], db[MONGODB_ADMIN_COLLECTION])
+            return True
+        except Exception as e:
+            print(f"MongoDB connection failed: {e}")
+            return False
+
+
+def close_database():
+    global _client, _store
+    with _store_lock:
+        store, _store = _store, None
+        if store is not None:
+            store.close()
+        with _client_lock:
+            if _client is not None:
+                _client.close()
+            _client = None
+
+
+def get_store() -> Optional[Store]:
+    """Return the process-wide store, opening it on first use; None without a database."""
+    if _store is None:
+        init_database()
+    return _store
+
+
+def storage_ready():
+    """True when the configured backend can be used, connecting on first call."""
+    return get_store() is not None
 
 
 def get_mongo_collection():
-    """Return MongoDB collection handle or None."""
-    if not MONGODB_URI:
-        print(" MONGODB_URI not set. Skipping DB operations.")
-        return None
+    """Return MongoDB collection handle or None (always None with the embedded store)."""
+    store = get_store()
+    return store.collection if isinstance(store, MongoStore) else None
+
+
+def get_admin_collection():
+    """Return the admins collection handle or None (always None with the embedded store)."""
+    store = get_store()
+    return store.admins if isinstance(store, MongoStore) else None
+
+
+def ensure_hash_index(col):
+    """
+    Create the unique index on `hash`. Failure (duplicate digests, or the
+    older non-unique index) is reported but not fatal; migrate_hashes_to_binary
+    fixes both.
+    """
     try:
-        client = MongoClient(MONGODB_URI)
-        db = client[MONGODB_DB]
-        collection = db[MONGODB_COLLECTION]
-        collection.create_index("filename", unique=True)
-        return collection
+        col.create_index("hash", unique=True)
+        return True
     except Exception as e:
-        print(f"MongoDB connection failed: {e}")
-        return None
+        print(f"Unique hash index not created ({e}). Run migrate_hash_binary.py.")
+        return False
+
+
+class DigestAlreadyStored(Exception):
+    """
+    Raised instead of anchoring a digest that already has a document: the
+    unique hash index would reject the new row after a second transaction
+    had been paid for. `doc` is the existing document.
+    """
+
+    def __init__(self, doc: dict):
+        super().__init__(f"Hash already certified as {doc['filename']} (record {doc['recordId']})")
+        self.doc = doc
+
+
+def write_failure(data, error) -> dict:
+    """
+    upsert_hashes result for a failed write: the rows a BulkWriteError
+    names, or every row for any other error, listed by index under "rejected".
+    """
+    if isinstance(error, BulkWriteError):
+        details = error.details
+        rejected = sorted(err["index"] for err in details.get("writeErrors", []))
+        print(f"Error writing to MongoDB: {len(rejected)} of {len(data)} row(s) rejected")
+        return {"upserted": details.get("nUpserted", 0), "modified": details.get("nModified", 0), "rejected": rejected}
+    print(f"Error writing to MongoDB: {error}")
+    return {"upserted": 0, "modified": 0, "rejected": list(range(len(data)))}
 
 
 def upsert_hashes(data):
-    """Upsert (filename, hash) list into MongoDB."""
-    col = get_mongo_collection()
-    if col is None:  
+    """
+    Upsert (filename, hash, recordId) rows into the configured store.
+    A row may carry a 4th element: a dict of extra fields to set.
+    Returns None without a database; rows the write rejected are listed
+    by index under "rejected" (see write_failure).
+    """
+    store = get_store()
+    if store is None:
         return
     try:
-        ops = [
-            UpdateOne(
-                {"filename": fn},
-                {"$set": {"filename": fn, "hash": digest, "recordId": new_record_Id}},
-                upsert=True
-            )
-            for fn, digest, new_record_Id in data
-        ]
-        if not ops:
+        if not data:
             return
-        result = col.bulk_write(ops, ordered=False)
-        return {
-            "upserted": result.upserted_count,
-            "modified": result.modified_count,
-        }
+        hash_filter.add_known_hashes(row[1] for row in data)
+        return store.upsert_hashes(data)
+    except Exception as e:
+        return write_failure(data, e)
+    finally:
+        invalidate_hashes([row[1] for row in data], [row[0] for row in data])
+
+
+class UpsertBuffer:
+    """
+    Write-behind queue for upsert_hashes rows from many callers.
+
+    Rows wait until `max_size` are pending or the oldest has waited
+    `max_wait` seconds, then go out as one unordered bulk_write. Rows for
+    the same filename are merged into one update, later fields winning.
+    Each submission gets a Future resolving to True once written (None
+    without a database); a row rejected by MongoDB fails only its own
+    Future.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, max_wait: Optional[float] = None):
+        self.max_size = max_size or MONGODB_WRITE_BATCH_SIZE
+        self.max_wait = MONGODB_WRITE_WINDOW if max_wait is None else max_wait
+        self._pending = {}
+        self._first_at = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="mongo-upserts", daemon=True)
+        self._thread.start()
+
+    def submit(self, row) -> Future:
+        """Queue one (filename, hash, recordId[, extra_fields]) row."""
+        fut = Future()
+        fn, digest, new_record_Id, *extra = row
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Upsert buffer is closed.")
+            if fn in self._pending:
+                _, _, _, fields, futures = self._pending[fn]
+                fields = {**fields, **(extra[0] if extra else {})}
+                futures.append(fut)
+            else:
+                fields, futures = dict(extra[0]) if extra else {}, [fut]
+            self._pending[fn] = (fn, digest, new_record_Id, fields, futures)
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+        return fut
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def _take(self) -> list:
+        batch, self._pending = list(self._pending.values()), {}
+        self._first_at = None
+        return batch
+
+    def _due(self) -> bool:
+        return bool(self._pending) and (
+            self._closed
+            or len(self._pending) >= self.max_size
+            or time.monotonic() - self._first_at >= self.max_wait
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = self.max_wait - (time.monotonic() - self._first_at)
+                    self._cond.wait(timeout)
+                batch = self._take()
+            self._write(batch)
+
+    def _write(self, batch: list):
+        failed = {}
+        try:
+            store = get_store()
+            if store is None:
+                result = None
+            else:
+                result = True
+                hash_filter.add_known_hashes(row[1] for row in batch)
+                store.upsert_hashes([row[:4] for row in batch])
+        except BulkWriteError as e:
+            failed = {err["index"]: RuntimeError(err.get("errmsg", "write failed"))
+                      for err in e.details.get("writeErrors", [])}
+            print(f"Error writing to MongoDB: {len(failed)} of {len(batch)} upsert(s) rejected")
+        except Exception as e:
+            print(f"Error writing to MongoDB: {e}")
+            failed = {i: e for i in range(len(batch))}
+        invalidate_hashes([row[1] for row in batch], [row[0] for row in batch])
+        for i, (*_, futures) in enumerate(batch):
+            for fut in futures:
+                if i in failed:
+                    fut.set_exception(failed[i])
+                else:
+                    fut.set_result(result)
+
+    def flush(self):
+        """Write everything pending now, on the calling thread."""
+        with self._cond:
+            batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def close(self):
+        """Write what is pending and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+
+def get_upsert_buffer() -> UpsertBuffer:
+    """Return the process-wide write-behind buffer, starting it on first use."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = UpsertBuffer()
+        return _buffer
+
+
+def close_upsert_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            _buffer = None
+
+
+def set_chain_metadata(rows):
+    """Set chain_fields on existing documents from (filename, block_num, timestamp, chain_hash) rows."""
+    store = get_store()
+    if store is None or not rows:
+        return
+    try:
+        return store.set_chain_metadata(rows)
     except Exception as e:
         print(f"Error writing to MongoDB: {e}")
         return None
 
 
+def find_missing_chain_metadata():
+    """Return (filename, recordId) of documents anchored before chain metadata was stored."""
+    store = get_store()
+    return [] if store is None else store.find_missing_chain_metadata()
+
+
+def cached_document(doc):
+    """Copy of a cached document, so callers can't change the cached one."""
+    return None if doc is None else dict(doc)
+
+
 def find_file_by_hash(file_hash):
-    
+    """Return the document for a hex digest, with `hash` as hex, or None."""
+    cache = get_record_cache()
+    found, doc = cache.get(file_hash)
+    if found:
+        return cached_document(doc)
+    store = get_store()
+    if store is None:
+        return None
+    doc = store.find_file_by_hash(file_hash)
+    cache.put(file_hash, doc)
+    return cached_document(doc)
+
+
+def scan_hashes(since=None):
+    """
+    Yield (hashUpdatedAt, hex digest) for every document, or only those
+    whose hash was written after `since`. hashUpdatedAt is None for
+    documents stored before it was recorded.
+    """
+    store = get_store()
+    if store is not None:
+        yield from store.scan_hashes(since)
+
+
+def count_hashes() -> int:
+    """Number of stored documents; an estimate on MongoDB, 0 without a database."""
+    store = get_store()
+    return 0 if store is None else store.count_hashes()
+
+
+def migrate_hashes_to_binary(batch_size=1000):
+    """
+    Rewrite every hex-string `hash` as 32-byte binary, then replace the
+    hash index with the unique one. Safe to re-run. Returns a dict with
+    the number of documents converted and whether the index is in place.
+    """
     col = get_mongo_collection()
-    if col is None:  
+    if col is None:
         return None
-    return col.find_one({"hash": file_hash})
+    converted = 0
+    ops = []
+    for doc in col.find({"hash": {"$type": "string"}}, {"_id": 1, "hash": 1}):
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"hash": encode_hash(doc["hash"])}}))
+        if len(ops) >= batch_size:
+            converted += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        converted += col.bulk_write(ops, ordered=False).modified_count
+    print(f"Converted {converted} hash(es) to binary.")
+
+    info = col.index_information().get("hash_1")
+    if info is not None and not info.get("unique"):
+        col.drop_index("hash_1")
+    duplicates = list(col.aggregate([
+        {"$group": {"_id": "$hash", "files": {"$push": "$filename"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True))
+    for dup in duplicates:
+        print(f"Duplicate hash {decode_hash(dup['_id'])}: {', '.join(dup['files'])}")
+    if duplicates:
+        print("Remove the duplicate documents above, then re-run to create the unique index.")
+    indexed = not duplicates and ensure_hash_index(col)
+    return {"converted": converted, "unique_index": indexed}
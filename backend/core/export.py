@@ -0,0 +1,39 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+from .database import EXPORT_FIELDS
+
+# format -> media type of the streamed response
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_row(doc: dict) -> dict:
+    """The exported fields of a document; chain metadata is absent until the anchor is mined."""
+    return {field: doc[field] for field in EXPORT_FIELDS if field in doc}
+
+
+def ndjson_chunk(batch: List[dict]) -> str:
+    return "".join(json.dumps(export_row(doc)) + "\n" for doc in batch)
+
+
+def csv_chunk(batch: List[dict], header: bool = False) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(export_row(doc) for doc in batch)
+    return out.getvalue()
+
+
+async def export_chunks(batches: AsyncIterator[List[dict]], fmt: str) -> AsyncIterator[str]:
+    """
+    Turn batches of documents into response chunks, one per batch, so a
+    streamed export holds a single batch in memory. A CSV export always
+    starts with its header, even when nothing matches.
+    """
+    if fmt == "csv":
+        yield csv_chunk([], header=True)
+    async for batch in batches:
+        yield ndjson_chunk(batch) if fmt == "ndjson" else csv_chunk(batch)
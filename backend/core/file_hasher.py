@@ -1,16 +1,53 @@
-import os, csv
+import os
 from blake3 import blake3
-from typing import List, Tuple
-from .database import upsert_hashes
-from .interact_certifier import store_record, retrieve_record, get_total_record
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from python_multipart import MultipartParser
+from python_multipart.multipart import parse_options_header
+from .database import chain_fields, find_file_by_hash, upsert_hashes
+from .hash_filter import might_be_known
+from .hash_cache import HashCache, get_hash_cache, stat_key
+from .ledger import get_ledger
+from .admin_stats import get_admin_stats
+from .interact_certifier import submit_anchor, resolve_anchor
+from .batch_anchor import ANCHOR_BATCH_SIZE, anchor_batch, batching_enabled, merkle_fields
 
 BLOCK_SIZE = 1024 * 1024
 INPUT_DIR = "files"
-OUTPUT_FILE = "output.csv"
 
+# Files at least this big are memory-mapped and hashed on several threads.
+# 0 disables the large-file path.
+MMAP_THRESHOLD = int(os.getenv("HASH_MMAP_THRESHOLD", 128 * 1024 * 1024))
+HASH_MAX_THREADS = int(os.getenv("HASH_MAX_THREADS", blake3.AUTO))
+# Hashing pool size for process_folder_once; 1 hashes inline.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+
+
+def hash_file(filepath: str, mmap_threshold: Optional[int] = None, cache: Optional[HashCache] = None) -> str:
+    """
+    Return BLAKE3 hash of a file.
+
+    Small files are streamed in BLOCK_SIZE chunks on one thread. Files of at
+    least `mmap_threshold` bytes (default MMAP_THRESHOLD, 0 disables) are
+    memory-mapped and hashed across HASH_MAX_THREADS threads; the digest is
+    the same either way. With a `cache`, an unchanged file is answered from
+    its stat alone and fresh digests are written back.
+    """
+    if cache is not None:
+        st = os.stat(filepath)
+        digest = cache.lookup(st)
+        if digest is None:
+            digest = hash_file(filepath, mmap_threshold)
+            _cache_if_unchanged(cache, filepath, st, digest)
+        return digest
+
+    if mmap_threshold is None:
+        mmap_threshold = MMAP_THRESHOLD
+    if mmap_threshold > 0 and os.path.getsize(filepath) >= mmap_threshold:
+        h = blake3(max_threads=HASH_MAX_THREADS)
+        h.update_mmap(filepath)
+        return h.hexdigest()
 
-def hash_file(filepath: str) -> str:
-    """Return BLAKE3 hash of a file (streamed)."""
     h = blake3()
     with open(filepath, "rb") as f:
         while chunk := f.read(BLOCK_SIZE):
@@ -18,56 +55,255 @@ def hash_file(filepath: str) -> str:
     return h.hexdigest()
 
 
-def get_existing_hashes_from_csv() -> dict:
-    """Read CSV and return filename→hash dict."""
-    if not os.path.exists(OUTPUT_FILE):
-        return {}
-    with open(OUTPUT_FILE, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        return {row["Filename"]: row["Hash"] for row in reader}
+def _cache_if_unchanged(cache: HashCache, filepath: str, st: os.stat_result, digest: str):
+    """Cache `digest` unless the file changed while it was being hashed."""
+    try:
+        if stat_key(os.stat(filepath)) == stat_key(st):
+            cache.put(st, digest)
+    except OSError:
+        pass
+
+
+async def save_upload_and_hash(upload, dest_path: str) -> str:
+    """
+    Copy an uploaded file to `dest_path` and return its BLAKE3 hash.
+
+    The hash is computed from the same BLOCK_SIZE chunks that are written,
+    so the upload is read exactly once.
+    """
+    h = blake3()
+    with open(dest_path, "wb") as f:
+        while chunk := await upload.read(BLOCK_SIZE):
+            h.update(chunk)
+            f.write(chunk)
+    return h.hexdigest()
+
+
+async def hash_multipart_stream(
+    stream: AsyncIterator[bytes], content_type: str, field_name: str = "file"
+) -> Optional[str]:
+    """
+    Return BLAKE3 hash of one file part of a multipart/form-data body.
+
+    Chunks are fed to the hasher as they arrive, so nothing is buffered
+    beyond the chunk currently being parsed. Returns None if the body has
+    no part called `field_name`.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Missing boundary in multipart request.")
+
+    h = blake3()
+    state = {"header": b"", "value": b"", "disposition": b"", "target": False, "found": False}
+
+    def on_part_begin():
+        state["disposition"] = b""
+        state["target"] = False
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
 
+    def on_header_end():
+        if state["header"].lower() == b"content-disposition":
+            state["disposition"] = state["value"]
+        state["header"] = b""
+        state["value"] = b""
 
-def write_csv(data: List[Tuple[str, str]]):
-    """Write updated CSV with all known hashes."""
+    def on_headers_finished():
+        _, options = parse_options_header(state["disposition"])
+        is_target = options.get(b"name") == field_name.encode() and not state["found"]
+        state["target"] = is_target
+        state["found"] = state["found"] or is_target
+
+    def on_part_data(data, start, end):
+        if state["target"]:
+            h.update(data[start:end])
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+    })
+    async for chunk in stream:
+        parser.write(chunk)
+    parser.finalize()
+
+    return h.hexdigest() if state["found"] else None
+
+
+def _hash_files_in_order(paths: List[str], mmap_threshold: Optional[int], workers: int) -> Iterator:
+    """
+    Yield (digest, error) for each path, in the order given.
+
+    With more than one worker the files are hashed on a thread pool, so
+    hashing of later files overlaps with whatever the caller does with
+    earlier results.
+    """
+    if workers <= 1:
+        for fpath in paths:
+            try:
+                yield hash_file(fpath, mmap_threshold), None
+            except Exception as e:
+                yield None, e
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(hash_file, fpath, mmap_threshold) for fpath in paths]
+        for fut in futures:
+            try:
+                yield fut.result(), None
+            except Exception as e:
+                yield None, e
+
+
+def _anchor_folder_batch(items: List[Tuple[str, str]], new_data: list, mongo_rows: list):
+    """Anchor (filename, digest) items under one Merkle root and record the rows."""
     try:
-        with open(OUTPUT_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["Filename", "Hash", "Record ID"])
-            writer.writerows(data)
+        anchor, root, proofs = anchor_batch([digest for _, digest in items])
+        new_record_Id, tx_hash, block_num, timestamp = anchor
     except Exception as e:
-        print(f"Error writing CSV: {e}")
+        for fname, _ in items:
+            print(f" Error anchoring {fname}: {e}")
+        return
+    print(f"  - Record ID :         {new_record_Id}")
+    print(f"  - Merkle root :       {root} ({len(items)} file(s))")
+    print(f"  - transaction hash :       {tx_hash}")
+    print("------------------------------------\n")
+    for (fname, digest), proof in zip(items, proofs):
+        new_data.append((fname, digest, new_record_Id))
+        extra = {**merkle_fields(root, proof), **chain_fields(block_num, timestamp, root)}
+        mongo_rows.append((fname, digest, new_record_Id, extra))
+        print(f"🔹 New file hashed: {fname}")
 
 
-def process_folder_once() -> List[Tuple[str, str]]:
+def process_folder_once(
+    mmap_threshold: Optional[int] = None,
+    workers: Optional[int] = None,
+    batch: Optional[bool] = None,
+) -> List[Tuple[str, str]]:
     """
     Process only *new* files from INPUT_DIR.
-    Hash them and update MongoDB and CSV.
+    Hash them and update MongoDB and the local ledger.
+    A file is new when its content digest has not been anchored yet, so
+    renamed files are skipped and files modified in place are picked up.
+    Digests come from the stat-keyed hash cache whenever the file is
+    unchanged. `mmap_threshold` is passed through to hash_file. `workers`
+    (default INGEST_WORKERS) sets the hashing pool size; chain submission
+    stays on the calling thread and results are collected in filename order.
+    Store transactions are all sent before any receipt is awaited, so many
+    anchors are in flight at once.
+    Each file is hashed at most once and all new rows go to MongoDB in a
+    single upsert_hashes call. With `batch` (default: ANCHOR_MODE=batch)
+    up to ANCHOR_BATCH_SIZE digests share one Merkle-root transaction.
     """
+    if workers is None:
+        workers = INGEST_WORKERS
+    if batch is None:
+        batch = batching_enabled()
     os.makedirs(INPUT_DIR, exist_ok=True)
-    existing = get_existing_hashes_from_csv()
+    ledger = get_ledger()
+    # Digests anchored during this run, on top of those in the ledger.
+    known_hashes = set()
+    cache = get_hash_cache()
+    stats = get_admin_stats()
+    # Only a new cache is filled from the ledger, once. After that an inode
+    # the cache has never seen (e.g. a file replaced by rename) is hashed.
+    seeding = cache.seeding()
 
-    new_data = []
-    for fname in os.listdir(INPUT_DIR):
+    def is_known(digest):
+        if digest in known_hashes or ledger.has_hash(digest):
+            return True
+        # Stored through an upload or by another node: anchoring it again would
+        # pay for a transaction whose row the unique hash index then rejects.
+        return might_be_known(digest) and find_file_by_hash(digest) is not None
+
+    # Walk and stat only; bytes are read just for files the cache can't vouch for.
+    pending = []
+    for fname in sorted(os.listdir(INPUT_DIR)):
         fpath = os.path.join(INPUT_DIR, fname)
-        if os.path.isfile(fpath) and fname not in existing:
-            try:
-                digest = hash_file(fpath)
-                # save record on blockchain - START
-                new_record_Id, digest, tx_hash = store_record(fpath)
-                print(f"  - Record ID :         {new_record_Id}")
-                print(f"  - File hash :         {digest}")
-                print(f"  - transaction hash :       {tx_hash}")
-                print("------------------------------------\n")    
-                # save record on blockchain - END
-                new_data.append((fname, digest, new_record_Id))
-                print(f"🔹 New file hashed: {fname}")
-            except Exception as e:
-                print(f" Error hashing {fname}: {e}")
+        if not os.path.isfile(fpath):
+            continue
+        st = os.stat(fpath)
+        digest = cache.lookup(st)
+        if digest is None and seeding:
+            # Recorded before the cache existed: trust the ledger instead of re-reading.
+            digest = ledger.get(fname)
+            if digest is not None and len(digest) == 64:
+                cache.put(st, digest)
+        if digest is not None and is_known(digest):
+            continue
+        pending.append((fname, fpath, st, digest))
+    if seeding:
+        cache.finish_seeding()
 
+    to_hash = [fpath for _, fpath, _, digest in pending if digest is None]
+    hashed = _hash_files_in_order(to_hash, mmap_threshold, workers)
+
+    new_data = []
+    # MongoDB rows also carry chain metadata and Merkle proofs; the ledger does not.
+    mongo_rows = []
+    batch_items = []
+    in_flight = []
+    for fname, fpath, st, digest in pending:
+        try:
+            if digest is None:
+                digest, error = next(hashed)
+                if error is not None:
+                    raise error
+                _cache_if_unchanged(cache, fpath, st, digest)
+                stats.record_hashed(st.st_size)
+                if is_known(digest):
+                    # Renamed or duplicate copy of a file that is already anchored.
+                    continue
+            if batch:
+                batch_items.append((fname, digest))
+                known_hashes.add(digest)
+                if len(batch_items) >= ANCHOR_BATCH_SIZE:
+                    _anchor_folder_batch(batch_items, new_data, mongo_rows)
+                    batch_items = []
+                continue
+            # save record on blockchain: sent now, receipts collected below
+            in_flight.append((fname, digest, submit_anchor(digest)))
+            known_hashes.add(digest)
+        except Exception as e:
+            print(f" Error hashing {fname}: {e}")
+
+    for fname, digest, pending_anchor in in_flight:
+        try:
+            new_record_Id, tx_hash, block_num, timestamp = resolve_anchor(digest, pending_anchor)
+            print(f"  - Record ID :         {new_record_Id}")
+            print(f"  - File hash :         {digest}")
+            print(f"  - transaction hash :       {tx_hash}")
+            print("------------------------------------\n")    
+            new_data.append((fname, digest, new_record_Id))
+            mongo_rows.append((fname, digest, new_record_Id, chain_fields(block_num, timestamp, digest)))
+            print(f"🔹 New file hashed: {fname}")
+        except Exception as e:
+            print(f" Error anchoring {fname}: {e}")
+
+    if batch_items:
+        _anchor_folder_batch(batch_items, new_data, mongo_rows)
+
+    if new_data:
+        # A file modified in place replaces its old row.
+        result = upsert_hashes(mongo_rows)
+        rejected = set(result.get("rejected", ())) if result else set()
+        for i in sorted(rejected):
+            print(f" Error storing {new_data[i][0]}: rejected by the database")
+        # Only rows the database accepted count as certified.
+        new_data = [row for i, row in enumerate(new_data) if i not in rejected]
     if new_data:
-        all_data = list(existing.items()) + new_data
-        write_csv(all_data)
-        upsert_hashes(new_data)
+        ledger.add(new_data)
+        for _, _, new_record_Id in new_data:
+            stats.record_certified(new_record_Id)
+        stats.set_ledger_entries(len(ledger))
         print(f"Added {len(new_data)} new file(s).")
     else:
         print(" No new files found.")
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+HASH_CACHE_FILE = os.getenv("HASH_CACHE_FILE", "hash_cache.db")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def stat_key(st: os.stat_result) -> tuple:
+    """Return the (device, inode, size, mtime_ns) identity of a stat result."""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class HashCache:
+    """
+    Persistent map from file identity to BLAKE3 digest.
+
+    One row per (device, inode) holding the size and mtime_ns the digest was
+    computed for, so a modified file replaces its row instead of adding one.
+    Rows live in a WITHOUT ROWID B-tree with the digest as 32 raw bytes,
+    which keeps lookups O(log n) and storage small at millions of entries.
+
+    A new cache starts out "seeding": until finish_seeding is called,
+    process_folder_once may fill it from the ledger instead of re-reading
+    files that were anchored before the cache existed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            existed = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_hashes'"
+            ).fetchone() is not None
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                " dev INTEGER NOT NULL, ino INTEGER NOT NULL,"
+                " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " digest BLOB NOT NULL,"
+                " PRIMARY KEY (dev, ino)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            # Caches from before this flag were seeded when they were created.
+            self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('seeding', ?)", (0 if existed else 1,))
+            self._conn.commit()
+
+    def _row(self, st: os.stat_result):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT size, mtime_ns, digest FROM file_hashes WHERE dev = ? AND ino = ?",
+                (st.st_dev, st.st_ino),
+            ).fetchone()
+
+    def lookup(self, st: os.stat_result) -> Optional[str]:
+        """Return the cached hex digest if the file is unchanged, else None."""
+        row = self._row(st)
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return None
+        return row[2].hex()
+
+    def put(self, st: os.stat_result, digest: str):
+        """Record the digest of the file as it was when `st` was taken."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_hashes (dev, ino, size, mtime_ns, digest) VALUES (?, ?, ?, ?, ?)",
+                (*stat_key(st), bytes.fromhex(digest)),
+            )
+            self._conn.commit()
+
+    def seeding(self) -> bool:
+        """True until finish_seeding: the cache is new and may be filled from the ledger."""
+        with self._lock:
+            return bool(self._conn.execute("SELECT value FROM meta WHERE name = 'seeding'").fetchone()[0])
+
+    def finish_seeding(self):
+        with self._lock:
+            self._conn.execute("UPDATE meta SET value = 0 WHERE name = 'seeding'")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_hash_cache() -> HashCache:
+    """Return the process-wide cache at HASH_CACHE_FILE, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HashCache(HASH_CACHE_FILE)
+        return _cache
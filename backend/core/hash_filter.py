@@ -0,0 +1,210 @@
+import hashlib
+import math
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from . import database
+from .periodic import PeriodicTask
+
+HASH_FILTER_FILE = os.getenv("HASH_FILTER_FILE", "hash_filter.bin")
+# Target false-positive rate, and digests the filter is sized for before it is rebuilt larger.
+HASH_FILTER_FP_RATE = float(os.getenv("HASH_FILTER_FP_RATE", 0.001))
+HASH_FILTER_CAPACITY = int(os.getenv("HASH_FILTER_CAPACITY", 1_000_000))
+# Seconds between catch-ups with documents written by other processes; 0 disables the filter.
+HASH_FILTER_REFRESH = float(os.getenv("HASH_FILTER_REFRESH", 10))
+# Catch-ups re-read this far behind the newest write seen, for writes still in flight.
+HASH_FILTER_SKEW = 60
+
+_MAGIC = b"HBF1"
+_HEADER = struct.Struct("<4sdQQd")
+
+_filter = None
+_watermark = None
+_building = None  # digests written while a build scans the collection
+_state_lock = threading.Lock()
+# The first tick builds the filter; later ones catch up or rebuild it.
+_refresher = PeriodicTask("hash-filter", "Hash filter refresh", lambda: refresh_hash_filter())
+
+
+class BloomFilter:
+    """
+    Set of hex digests with no false negatives and a false-positive rate
+    of about `fp_rate` while it holds at most `capacity` digests.
+    Bit positions come from double hashing one BLAKE2b of the digest.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = max(capacity, 1)
+        self.fp_rate = fp_rate
+        self.num_bits = math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, digest: str):
+        h = hashlib.blake2b(digest.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(h[:8], "little")
+        h2 = int.from_bytes(h[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, digest: str) -> bool:
+        """
+        Set the digest's bits; returns False if they were all set already.
+        Only new digests are counted, so re-adding rescanned digests does
+        not fill the filter (a false positive is not counted either).
+        """
+        added = False
+        for pos in self._positions(digest):
+            if not self._bits[pos >> 3] & (1 << (pos & 7)):
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, digest: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+    def save(self, path: str, watermark: Optional[datetime] = None):
+        """Write the filter and the newest write time it covers; replaces `path` atomically."""
+        stamp = watermark.replace(tzinfo=timezone.utc).timestamp() if watermark else 0.0
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, self.fp_rate, self.capacity, self.count, stamp))
+            f.write(self._bits)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Return (filter, watermark) saved by `save`, or (None, None) if unreadable."""
+        try:
+            with open(path, "rb") as f:
+                magic, fp_rate, capacity, count, stamp = _HEADER.unpack(f.read(_HEADER.size))
+                bloom = cls(capacity, fp_rate)
+                bits = f.read()
+        except (OSError, struct.error):
+            return None, None
+        if magic != _MAGIC or len(bits) != len(bloom._bits):
+            return None, None
+        bloom._bits[:] = bits
+        bloom.count = count
+        # MongoDB hands back naive UTC datetimes; keep the watermark comparable.
+        watermark = datetime.fromtimestamp(stamp, timezone.utc).replace(tzinfo=None) if stamp else None
+        return bloom, watermark
+
+
+def _catch_up(bloom: BloomFilter, since: Optional[datetime]) -> Optional[datetime]:
+    """Add every digest written after `since`; returns the newest write time seen."""
+    newest = since
+    if since is not None:
+        since -= timedelta(seconds=HASH_FILTER_SKEW)
+    chunk = []
+    for updated_at, digest in database.scan_hashes(since):
+        chunk.append(digest)
+        if updated_at is not None and (newest is None or updated_at > newest):
+            newest = updated_at
+        if len(chunk) >= 1000:
+            _add_all(bloom, chunk)
+            chunk = []
+    _add_all(bloom, chunk)
+    return newest
+
+
+def _add_all(bloom: BloomFilter, digests):
+    # Bit updates are read-modify-write; concurrent adds would lose bits.
+    with _state_lock:
+        for digest in digests:
+            bloom.add(digest)
+
+
+def build_hash_filter(path: Optional[str] = None) -> Optional[BloomFilter]:
+    """
+    Load the saved filter and catch it up with newer documents, or build
+    it from the whole collection. Returns None without a database.
+    """
+    global _filter, _watermark, _building
+    path = HASH_FILTER_FILE if path is None else path
+    if not database.storage_ready():
+        return None
+    with _state_lock:
+        _building = []
+    bloom, watermark = BloomFilter.load(path) if path else (None, None)
+    if bloom is None or bloom.fp_rate != HASH_FILTER_FP_RATE or bloom.full():
+        # Room for twice the stored documents, so a growing collection rebuilds rarely.
+        known = database.count_hashes()
+        bloom, watermark = BloomFilter(max(HASH_FILTER_CAPACITY, 2 * known), HASH_FILTER_FP_RATE), None
+    started = time.perf_counter()
+    try:
+        watermark = _catch_up(bloom, watermark)
+    finally:
+        with _state_lock:
+            written, _building = _building, None
+    with _state_lock:
+        for digest in written:
+            bloom.add(digest)
+        _filter, _watermark = bloom, watermark
+    print(f"Hash filter ready: {bloom.count} digest(s) in {time.perf_counter() - started:.2f}s.")
+    if path:
+        bloom.save(path, watermark)
+    return bloom
+
+
+def refresh_hash_filter():
+    """Add digests written by other processes since the last scan; rebuild when full."""
+    global _watermark
+    with _state_lock:
+        bloom, watermark = _filter, _watermark
+    if bloom is None or bloom.full():
+        build_hash_filter()
+        return
+    newest = _catch_up(bloom, watermark)
+    with _state_lock:
+        _watermark = newest
+
+
+def add_known_hashes(digests: Iterable[str]):
+    """Record digests about to be written, before they become visible to lookups."""
+    with _state_lock:
+        for digest in digests:
+            if _filter is not None:
+                _filter.add(digest)
+            if _building is not None:
+                _building.append(digest)
+
+
+def might_be_known(digest: str) -> bool:
+    """False only when `digest` is certainly not stored; True while no filter is loaded."""
+    bloom = _filter
+    return bloom is None or digest in bloom
+
+
+def save_hash_filter(path: Optional[str] = None):
+    path = HASH_FILTER_FILE if path is None else path
+    with _state_lock:
+        bloom, watermark = _filter, _watermark
+        if bloom is not None and path:
+            bloom.save(path, watermark)
+
+
+def start_hash_filter(interval: Optional[float] = None) -> Optional[PeriodicTask]:
+    """
+    Build the process-wide filter, then keep it refreshed every `interval`
+    seconds (HASH_FILTER_REFRESH; 0 disables the filter), in the background.
+    """
+    return _refresher.start(HASH_FILTER_REFRESH if interval is None else interval)
+
+
+def stop_hash_filter():
+    """Stop refreshing and save the filter for the next warm start."""
+    _refresher.stop()
+    try:
+        save_hash_filter()
+    except OSError as e:
+        print(f"Could not save hash filter: {e}")
@@ -2,11 +2,41 @@
 from web3 import Web3
 from dotenv import load_dotenv
 import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
 from .encrypt_key import KEYSTORE_PATH
 import getpass
 from eth_account import Account
-from .json_utils import get_config
-from .database import upsert_hashes
+from .json_utils import get_config, get_config_path
+from .database import (
+    DigestAlreadyStored, chain_fields, find_file_by_hash, find_missing_chain_metadata, get_upsert_buffer,
+    set_chain_metadata,
+)
+from .record_cache import get_chain_cache
+from .tx_submitter import TxSubmitter
+from .rpc_router import RoutedHTTPProvider
+
+CONFIG_FILE = "file_certifier.json"
+# Keep-alive connections kept open to the RPC node, shared by all threads.
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", 10))
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", 30))
+# Calls packed into one JSON-RPC batch request by retrieve_records.
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", 100))
+# Seconds to wait for an anchor to be mined, replacements included, before giving up on it.
+ANCHOR_TIMEOUT = float(os.getenv("ANCHOR_TIMEOUT", 900))
+
+_contract = None
+_contract_config_mtime = None
+# Bumped by reload_contract; the async contract rebuilds when it moves.
+_contract_generation = 0
+_wallet_address = None
+_contract_lock = threading.Lock()
+_submitter = None
+_submitter_lock = threading.Lock()
+# record ID minus sender nonce; holds while this sender is the only writer
+_record_offset = None
+_record_offset_lock = threading.Lock()
 
 # RPC_URL=os.getenv("RPC_URL")
 # MY_ADDRESS=os.getenv("MY_ADDRESS")
@@ -32,15 +62,84 @@ def bytes32_to_hex(hash_bytes: bytes) -> str:
         raise ValueError("Input must be a 32-byte string.")
     return hash_bytes.hex()
 
-def connect_contract():
-    rpc_url, wallet_address, abi, contract_address = get_config("file_certifier.json")
+def decode_record(recordId, response):
+    """(hash_hex, block_num, timestamp) from a retrieve() result, or None when it isn't a valid record."""
+    if response is None:
+        return None
+    try:
+        hash_retrieved_bytes, block_num, timestamp = response
+        return bytes32_to_hex(hash_retrieved_bytes), block_num, timestamp
+    except Exception as e:
+        print(f"Record {recordId} could not be decoded: {e}")
+        return None
+
+def _build_contract():
+    global _wallet_address
+    rpc_url, wallet_address, abi, contract_address = get_config(CONFIG_FILE)
+    _wallet_address = wallet_address
+
+    # RPC_URL may list several endpoints; reads are then routed by latency.
+    if isinstance(rpc_url, list) and len(rpc_url) > 1:
+        provider = RoutedHTTPProvider(rpc_url, request_kwargs={"timeout": RPC_TIMEOUT}, pool_size=RPC_POOL_SIZE)
+    else:
+        if isinstance(rpc_url, list):
+            rpc_url = rpc_url[0]
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=RPC_POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        provider = Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": RPC_TIMEOUT}, session=session)
 
-    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    w3 = Web3(provider)
 
     contract_instance = w3.eth.contract(address=contract_address, abi=abi)
 
     return contract_instance
 
+def _config_mtime():
+    try:
+        return os.path.getmtime(get_config_path(CONFIG_FILE))
+    except OSError:
+        return None
+
+def connect_contract():
+    """Return the process-wide contract instance, building it on first use."""
+    global _contract, _contract_config_mtime
+    if _contract is None:
+        with _contract_lock:
+            if _contract is None:
+                _contract_config_mtime = _config_mtime()
+                _contract = _build_contract()
+    return _contract
+
+def reload_contract(only_if_changed=False):
+    """
+    Rebuild the cached contract from file_certifier.json.
+    With only_if_changed, nothing happens unless the file's mtime moved.
+    Everything tied to the old contract goes with it: the transaction
+    submitter is closed, the record offset and cached chain records are
+    forgotten, and the async contract is rebuilt on its next use.
+    Returns True if the contract was rebuilt.
+    """
+    global _contract, _contract_config_mtime, _contract_generation, _record_offset
+    with _contract_lock:
+        mtime = _config_mtime()
+        if only_if_changed and _contract is not None and mtime == _contract_config_mtime:
+            return False
+        _contract = _build_contract()
+        _contract_config_mtime = mtime
+        _contract_generation += 1
+    # Outside the contract lock: get_submitter takes its own lock, then builds the contract.
+    close_submitter()
+    with _record_offset_lock:
+        _record_offset = None
+    get_chain_cache().clear()
+    return True
+
+def contract_generation() -> int:
+    """How many times reload_contract has rebuilt the contract."""
+    return _contract_generation
+
 def retrieve_record(recordId):
     contract_instance = connect_contract()
 
@@ -53,28 +152,150 @@ def retrieve_record(recordId):
 
     return hash_retrieved_hex, block_num, timestamp
 
-def store_record(singleFilePath):
+def _retrieve_or_none(contract_instance, recordId):
+    try:
+        return contract_instance.functions.retrieve(recordId).call()
+    except Exception as e:
+        print(f"Error reading record {recordId}: {e}")
+        return None
+
+def retrieve_records(recordIds, batch_size=None):
+    """
+    Read many records using JSON-RPC batch requests of `batch_size` calls
+    (default RPC_BATCH_SIZE). Returns one (hash_hex, block_num, timestamp)
+    per ID in the order given, or None for an ID that could not be read.
+
+    A node fails the whole batch if one call reverts, so a failed batch is
+    retried one call at a time and only the bad IDs come back as None.
+    """
     contract_instance = connect_contract()
+    w3 = contract_instance.w3
+    batch_size = batch_size or RPC_BATCH_SIZE
+    results = []
+    for start in range(0, len(recordIds), batch_size):
+        chunk = recordIds[start:start + batch_size]
+        try:
+            with w3.batch_requests() as batch:
+                for recordId in chunk:
+                    batch.add(contract_instance.functions.retrieve(recordId))
+                responses = batch.execute()
+        except Exception as e:
+            print(f"Batch read of {len(chunk)} record(s) failed, reading one by one: {e}")
+            responses = [_retrieve_or_none(contract_instance, recordId) for recordId in chunk]
+        results.extend(decode_record(recordId, response) for recordId, response in zip(chunk, responses))
+    return results
 
-    # lazy import to avoid circular import between core modules
-    from .file_hasher import hash_file
-    digest = hash_file(singleFilePath)
+def get_submitter():
+    """Return the process-wide transaction submitter, recovering its journal on first use."""
+    global _submitter
+    with _submitter_lock:
+        if _submitter is None:
+            contract_instance = connect_contract()
+            sender = contract_instance.w3.to_checksum_address(_wallet_address)
+            _submitter = TxSubmitter(contract_instance, sender)
+            router = getattr(contract_instance.w3.provider, "router", None)
+            if router is not None:
+                # A new write endpoint has its own view of pending nonces.
+                router.add_writer_listener(_submitter.nonces.resync)
+            _submitter.recover()
+        return _submitter
+
+def close_submitter():
+    global _submitter
+    with _submitter_lock:
+        if _submitter is not None:
+            _submitter.close()
+            _submitter = None
 
-    # Convert hash for contract
+def predicted_record_id(nonce):
+    """Record ID a store sent with `nonce` should get, or None before the offset is known."""
+    with _record_offset_lock:
+        return None if _record_offset is None else nonce + _record_offset
+
+def rebase_record_offset(record_id, nonce):
+    """Remember that the store sent with `nonce` wrote `record_id`."""
+    global _record_offset
+    with _record_offset_lock:
+        _record_offset = record_id - nonce
+
+def _expected_record_id(contract_instance, sender, nonce):
+    global _record_offset
+    with _record_offset_lock:
+        if _record_offset is None:
+            block = contract_instance.w3.eth.block_number
+            total = contract_instance.functions.get_total_records().call(block_identifier=block)
+            sent = contract_instance.w3.eth.get_transaction_count(sender, block)
+            _record_offset = total - sent
+        return nonce + _record_offset
+
+def _find_record_id(contract_instance, hash_bytes32, block_num):
+    """Scan the records written in block `block_num` for `hash_bytes32`."""
+    total = contract_instance.functions.get_total_records().call(block_identifier=block_num)
+    for record_id in range(total - 1, -1, -1):
+        file_hash, timestamp, record_block = contract_instance.functions.hash_records(record_id).call(block_identifier=block_num)
+        if record_block < block_num:
+            break
+        if file_hash == hash_bytes32:
+            return record_id, timestamp
+    raise LookupError(f"No record for {hash_bytes32.hex()} in block {block_num}")
+
+def submit_anchor(digest):
+    """Send the store transaction for a hex digest without waiting for it to be mined."""
+    return get_submitter().submit(hex_to_bytes32(digest))
+
+def resolve_anchor(digest, pending):
+    """
+    Wait for an anchor from submit_anchor and read its record back.
+    Returns (new_record_Id, tx_hash, block_num, timestamp).
+
+    The record ID is predicted from the transaction nonce and confirmed with
+    one hash_records read at the mined block, which also gives the
+    timestamp. If another writer shifted the IDs, the block's records are
+    scanned and the prediction re-based.
+    """
+    tx_hash, receipt, nonce = pending.result(timeout=ANCHOR_TIMEOUT)
+    contract_instance = connect_contract()
     hash_bytes32 = hex_to_bytes32(digest)
+    block_num = receipt["blockNumber"]
+
+    new_record_Id = _expected_record_id(contract_instance, get_submitter().sender, nonce)
+    file_hash, timestamp, record_block = contract_instance.functions.hash_records(new_record_Id).call(block_identifier=block_num)
+    if file_hash != hash_bytes32 or record_block != block_num:
+        new_record_Id, timestamp = _find_record_id(contract_instance, hash_bytes32, block_num)
+        rebase_record_offset(new_record_Id, nonce)
+
+    return new_record_Id, tx_hash, block_num, timestamp
 
-    # --- STORE HASH ---
-    # This executes the state-changing transaction
-    tx_hash = contract_instance.functions.store(hash_bytes32).transact()
-    new_record_Id = contract_instance.functions.get_total_records().call() - 1
+def anchor_digest(digest):
+    """
+    Anchor an already-computed hex digest on chain.
+    Returns (new_record_Id, tx_hash, block_num, timestamp) once mined.
+    """
+    return resolve_anchor(digest, submit_anchor(digest))
+
+def store_digest(filename, digest):
+    """
+    Anchor an already-computed digest and write its MongoDB row once.
+    Returns (new_record_Id, digest, tx_hash, block_num, timestamp).
+    Raises DigestAlreadyStored, without anchoring, for a digest that already
+    has a document, and re-raises a rejected write.
+    """
+    existing = find_file_by_hash(digest)
+    if existing is not None:
+        raise DigestAlreadyStored(existing)
+    new_record_Id, tx_hash, block_num, timestamp = anchor_digest(digest)
 
     # --- Write to MongoDB ---
-    new_data = []
-    file_name_with_ext = os.path.basename(singleFilePath)
-    new_data.append((file_name_with_ext, digest, new_record_Id))
-    upsert_hashes(new_data)
+    get_upsert_buffer().submit((filename, digest, new_record_Id, chain_fields(block_num, timestamp, digest))).result()
+
+    return new_record_Id, digest, tx_hash, block_num, timestamp
+
+def store_record(singleFilePath):
+    # lazy import to avoid circular import between core modules
+    from .file_hasher import hash_file
+    digest = hash_file(singleFilePath)
 
-    return new_record_Id, digest, tx_hash
+    return store_digest(os.path.basename(singleFilePath), digest)
 
 def decrypt_key() -> str:
     with open(KEYSTORE_PATH, "r") as fp:
@@ -90,3 +311,29 @@ def decrypt_key() -> str:
 def get_total_record():
     contract_instance = connect_contract()
     return contract_instance.functions.get_total_records().call()
+
+def backfill_chain_metadata(batch_size=100):
+    """
+    Copy block number, timestamp and on-chain hash into every MongoDB
+    document stored before they were recorded at anchor time.
+    Records are immutable, so each is read from the chain once.
+    Returns the number of documents updated.
+    """
+    rows = []
+    updated = 0
+    for filename, record_id in find_missing_chain_metadata():
+        try:
+            chain_hash, block_num, timestamp = retrieve_record(record_id)
+        except Exception as e:
+            print(f"Error reading record {record_id} for {filename}: {e}")
+            continue
+        rows.append((filename, block_num, timestamp, chain_hash))
+        if len(rows) >= batch_size:
+            set_chain_metadata(rows)
+            updated += len(rows)
+            rows = []
+    if rows:
+        set_chain_metadata(rows)
+        updated += len(rows)
+    print(f"Backfilled chain metadata for {updated} document(s).")
+    return updated
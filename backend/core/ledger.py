@@ -0,0 +1,116 @@
+import csv
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+LEDGER_FILE = os.getenv("LEDGER_FILE", "ledger.db")
+# The CSV the ledger replaced; imported once into an empty ledger.
+LEGACY_CSV_FILE = "output.csv"
+CSV_HEADER = ["Filename", "Hash", "Record ID"]
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+class Ledger:
+    """
+    Local record of every file anchored from INPUT_DIR.
+
+    One row per filename with its 32-byte digest and record ID, keyed by
+    filename in a WITHOUT ROWID B-tree plus an index on the digest, so
+    adds and lookups are O(log n). The row count is kept in a one-row
+    table by triggers and read in O(1). WAL mode makes each add a single
+    crash-safe append to the log.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " filename TEXT PRIMARY KEY,"
+                " hash BLOB NOT NULL,"
+                " record_id INTEGER) WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS files_hash ON files (hash);"
+                "CREATE TABLE IF NOT EXISTS counts (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+                "INSERT OR IGNORE INTO counts VALUES ('files', 0);"
+                "CREATE TRIGGER IF NOT EXISTS files_added AFTER INSERT ON files"
+                " BEGIN UPDATE counts SET value = value + 1 WHERE name = 'files'; END;"
+                "CREATE TRIGGER IF NOT EXISTS files_removed AFTER DELETE ON files"
+                " BEGIN UPDATE counts SET value = value - 1 WHERE name = 'files'; END;"
+            )
+            self._conn.commit()
+
+    def add(self, rows: List[Tuple[str, str, Optional[int]]]):
+        """Store (filename, hash_hex, record_id) rows in one transaction; a filename's new row replaces its old one."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO files (filename, hash, record_id) VALUES (?, ?, ?)"
+                " ON CONFLICT (filename) DO UPDATE SET hash = excluded.hash, record_id = excluded.record_id",
+                [(fn, bytes.fromhex(digest), rid) for fn, digest, rid in rows],
+            )
+            self._conn.commit()
+
+    def get(self, filename: str) -> Optional[str]:
+        """Return the digest recorded for `filename`, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM files WHERE filename = ?", (filename,)).fetchone()
+        return row[0].hex() if row else None
+
+    def has_hash(self, digest: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM files WHERE hash = ? LIMIT 1", (bytes.fromhex(digest),)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT value FROM counts WHERE name = 'files'").fetchone()[0]
+
+    def import_csv(self, path: str) -> int:
+        """Add the rows of a CSV written by export_csv (or the old output.csv). Returns the number added."""
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    bytes.fromhex(row["Hash"])
+                except ValueError:
+                    print(f"Ledger: skipping {row['Filename']}, hash is not hex.")
+                    continue
+                rid = row.get("Record ID")
+                rows.append((row["Filename"], row["Hash"], int(rid) if rid else None))
+        self.add(rows)
+        return len(rows)
+
+    def export_csv(self, path: str) -> int:
+        """Write every row to a CSV in the old output.csv layout. Returns the number written."""
+        with self._lock:
+            rows = self._conn.execute("SELECT filename, hash, record_id FROM files ORDER BY filename").fetchall()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(CSV_HEADER)
+            writer.writerows((fn, digest.hex(), rid) for fn, digest, rid in rows)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def get_ledger() -> Ledger:
+    """
+    Return the process-wide ledger at LEDGER_FILE, opening it on first use.
+    A new, empty ledger takes in LEGACY_CSV_FILE if one is present.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger(LEDGER_FILE)
+            if len(_ledger) == 0 and os.path.exists(LEGACY_CSV_FILE):
+                imported = _ledger.import_csv(LEGACY_CSV_FILE)
+                print(f"Ledger: imported {imported} row(s) from {LEGACY_CSV_FILE}.")
+        return _ledger
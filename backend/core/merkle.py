@@ -0,0 +1,75 @@
+from blake3 import blake3
+from typing import List
+
+# Domain separation keeps a leaf from ever being read as an inner node.
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def _leaf(digest: str) -> bytes:
+    return blake3(LEAF_PREFIX + bytes.fromhex(digest)).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return blake3(NODE_PREFIX + left + right).digest()
+
+
+def build_tree(digests: List[str]) -> List[List[bytes]]:
+    """
+    Build a BLAKE3 Merkle tree over hex file digests.
+
+    Returns every level from the leaves up to the root. An unpaired node at
+    the end of a level is carried up unchanged rather than duplicated.
+    """
+    if not digests:
+        raise ValueError("Cannot build a Merkle tree with no leaves.")
+    levels = [[_leaf(d) for d in digests]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def tree_root(levels: List[List[bytes]]) -> str:
+    """Return the hex root of a tree from build_tree."""
+    return levels[-1][0].hex()
+
+
+def merkle_root(digests: List[str]) -> str:
+    """Return the hex Merkle root of a list of hex digests."""
+    return tree_root(build_tree(digests))
+
+
+def merkle_proof(levels: List[List[bytes]], index: int) -> List[dict]:
+    """
+    Return the inclusion proof for leaf `index` as a list of
+    {"sibling": hex, "position": "left" | "right"} steps, leaf first.
+    """
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({
+                "sibling": level[sibling].hex(),
+                "position": "left" if sibling < index else "right",
+            })
+        index //= 2
+    return proof
+
+
+def verify_proof(digest: str, proof: List[dict], root: str) -> bool:
+    """Return True if `proof` links the hex `digest` to the hex `root`."""
+    try:
+        node = _leaf(digest)
+        for step in proof:
+            sibling = bytes.fromhex(step["sibling"])
+            if step["position"] == "left":
+                node = _node(sibling, node)
+            else:
+                node = _node(node, sibling)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return node.hex() == root
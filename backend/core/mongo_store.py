@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .storage import (
+    EXPORT_FIELDS,
+    EXPORT_SORT,
+    VERIFY_PROJECTION,
+    AsyncStore,
+    Store,
+    chain_metadata_ops,
+    decode_hash,
+    export_query,
+    hash_query,
+    upsert_ops,
+)
+
+
+class MongoStore(Store):
+    """Store over the pymongo files and admins collections; the client is owned by core.database."""
+
+    def __init__(self, collection, admins=None):
+        self.collection = collection
+        self.admins = admins
+
+    def upsert_hashes(self, data) -> dict:
+        result = self.collection.bulk_write(upsert_ops(data), ordered=False)
+        return {"upserted": result.upserted_count, "modified": result.modified_count}
+
+    def set_chain_metadata(self, rows) -> dict:
+        result = self.collection.bulk_write(chain_metadata_ops(rows), ordered=False)
+        return {"modified": result.modified_count}
+
+    def find_missing_chain_metadata(self) -> List[Tuple[str, int]]:
+        cursor = self.collection.find({"chainHash": {"$exists": False}}, {"_id": 0, "filename": 1, "recordId": 1})
+        return [(doc["filename"], doc["recordId"]) for doc in cursor]
+
+    def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        doc = self.collection.find_one(hash_query(file_hash), VERIFY_PROJECTION)
+        if doc is not None:
+            doc["hash"] = decode_hash(doc["hash"])
+        return doc
+
+    def scan_hashes(self, since: Optional[datetime] = None, batch_size: int = 10000):
+        # hashUpdatedAt is None for documents stored before it was recorded.
+        projection = {"_id": 0, "hash": 1, "hashUpdatedAt": 1}
+        if since is None:
+            cursor = self.collection.find({}, projection)
+        else:
+            cursor = self.collection.find({"hashUpdatedAt": {"$gt": since}}, projection).sort("hashUpdatedAt", 1)
+        for doc in cursor.batch_size(batch_size):
+            yield doc.get("hashUpdatedAt"), decode_hash(doc["hash"])
+
+    def count_hashes(self) -> int:
+        # From collection metadata: no scan, but may lag a moment behind writes.
+        return self.collection.estimated_document_count()
+
+
+class AsyncMongoStore(AsyncStore):
+    """AsyncStore over pymongo's async collections; core.async_database owns the per-loop client."""
+
+    def __init__(self, collection, admins=None):
+        self.collection = collection
+        self.admins = admins
+
+    async def upsert_hashes(self, data) -> dict:
+        result = await self.collection.bulk_write(upsert_ops(data), ordered=False)
+        return {"upserted": result.upserted_count, "modified": result.modified_count}
+
+    async def set_chain_metadata(self, rows) -> dict:
+        result = await self.collection.bulk_write(chain_metadata_ops(rows), ordered=False)
+        return {"modified": result.modified_count}
+
+    async def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        doc = await self.collection.find_one(hash_query(file_hash), VERIFY_PROJECTION)
+        if doc is not None:
+            doc["hash"] = decode_hash(doc["hash"])
+        return doc
+
+    async def iter_record_batches(self, after: Optional[datetime], until: Optional[datetime], batch_size: int):
+        # One server-side cursor fetching `batch_size` documents per round trip.
+        projection = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+        cursor = self.collection.find(export_query(after, until), projection).sort(EXPORT_SORT).batch_size(batch_size)
+        batch = []
+        async for doc in cursor:
+            doc["hash"] = decode_hash(doc["hash"])
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,69 @@
+import threading
+from typing import Callable, List, Optional
+
+_running: List["PeriodicTask"] = []
+_running_lock = threading.Lock()
+
+
+class PeriodicTask:
+    """
+    A process-wide background job: `tick` runs at once, then every
+    `interval` seconds on a daemon thread until stop(). A failing tick is
+    logged as "<label> failed: ..." and retried on the next interval.
+    start and stop are idempotent, so module-level start_x/stop_x can
+    simply delegate to them.
+    """
+
+    def __init__(self, name: str, label: str, tick: Callable[[], object]):
+        self.name = name
+        self.label = label
+        self.interval = None
+        self._tick = tick
+        self._lock = threading.Lock()
+        self._stopped = None
+        self._thread = None
+
+    def start(self, interval: float) -> Optional["PeriodicTask"]:
+        """Start the thread unless it runs already; an interval of 0 leaves it off and returns None."""
+        with self._lock:
+            if self._thread is None:
+                if interval <= 0:
+                    return None
+                self.interval = interval
+                self._stopped = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stopped,), name=self.name, daemon=True)
+                self._thread.start()
+                with _running_lock:
+                    _running.append(self)
+            return self
+
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def _run(self, stopped: threading.Event):
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"{self.label} failed: {e}")
+            if stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        """Stop the thread after its current tick, if it runs."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._stopped.set()
+            thread.join()
+        with _running_lock:
+            _running.remove(self)
+
+
+def stop_periodic_tasks():
+    """Stop every running task, newest first."""
+    with _running_lock:
+        tasks = list(reversed(_running))
+    for task in tasks:
+        task.stop()
@@ -0,0 +1,168 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+# Entries and approximate bytes each cache may hold before evicting the least recently used.
+RECORD_CACHE_SIZE = int(os.getenv("RECORD_CACHE_SIZE", 10000))
+RECORD_CACHE_MAX_BYTES = int(os.getenv("RECORD_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Seconds a found record, and a "not found", stay cached. 0 disables caching.
+RECORD_CACHE_TTL = float(os.getenv("RECORD_CACHE_TTL", 300))
+RECORD_CACHE_NEGATIVE_TTL = float(os.getenv("RECORD_CACHE_NEGATIVE_TTL", 5))
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def approx_size(value: Any) -> int:
+    """Rough deep size in bytes of plain dict/list/tuple/str/bytes/int values."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(approx_size(v) for v in value)
+    return size
+
+
+class TTLCache:
+    """
+    Bounded LRU map whose entries expire.
+
+    Eviction starts from the least recently used entry once there are more
+    than `max_entries` or their approximate size passes `max_bytes`. `None`
+    values are "not found" results and use `negative_ttl`. With `index`, a
+    function of a value, entries can also be dropped by that secondary key
+    with invalidate_by.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None,
+                 ttl: Optional[float] = None, negative_ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 index: Optional[Callable[[Any], Hashable]] = None):
+        self.max_entries = RECORD_CACHE_SIZE if max_entries is None else max_entries
+        self.max_bytes = RECORD_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl = RECORD_CACHE_TTL if ttl is None else ttl
+        self.negative_ttl = RECORD_CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._index = index
+        self._indexed = {}  # index(value) -> keys holding such a value
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return (found, value); `found` is False for missing or expired keys."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= self._clock():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        size = approx_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + ttl, size)
+            self._bytes += size
+            if self._index is not None and value is not None:
+                self._indexed.setdefault(self._index(value), set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_by(self, index_key: Hashable):
+        """Drop every entry whose value has `index_key` as its secondary key."""
+        with self._lock:
+            for key in list(self._indexed.get(index_key, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._indexed.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        value, _, size = self._entries.pop(key)
+        self._bytes -= size
+        if self._index is not None and value is not None:
+            index_key = self._index(value)
+            keys = self._indexed[index_key]
+            keys.discard(key)
+            if not keys:
+                del self._indexed[index_key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_cache(name: str, **settings) -> TTLCache:
+    """
+    Return the process-wide cache called `name`, creating it on first use
+    with `settings` (TTLCache keyword arguments) over the defaults.
+    """
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = TTLCache(**settings)
+        return _caches[name]
+
+
+def get_record_cache() -> TTLCache:
+    """
+    hash hex -> MongoDB document (or None) as returned by find_file_by_hash,
+    also indexed by the document's filename.
+    """
+    return get_cache("records", index=lambda doc: doc.get("filename"))
+
+
+def get_chain_cache() -> TTLCache:
+    """record ID -> (hash_hex, block_number, timestamp) read from the contract."""
+    return get_cache("chain")
+
+
+def invalidate_hashes(digests, filenames=()):
+    """
+    Drop cached lookups for digests that were just written, and for
+    whatever digest `filenames` held before: an upsert that replaces a
+    file's hash leaves its old document cached otherwise.
+    """
+    cache = get_record_cache()
+    for digest in digests:
+        cache.invalidate(digest)
+    for filename in filenames:
+        cache.invalidate_by(filename)
+
+
+def cache_stats() -> dict:
+    with _caches_lock:
+        return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,238 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.providers.base import JSONBaseProvider
+from web3.providers.rpc import AsyncHTTPProvider, HTTPProvider
+
+# Weight of the newest sample in each endpoint's latency average.
+RPC_LATENCY_ALPHA = float(os.getenv("RPC_LATENCY_ALPHA", 0.2))
+# Consecutive failures that open an endpoint's circuit, and for how long.
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", 3))
+RPC_BREAKER_COOLDOWN = float(os.getenv("RPC_BREAKER_COOLDOWN", 30))
+
+# Methods that touch an account's nonce sequence; they stay on one endpoint
+# because nodes do not share their pending pools.
+WRITE_METHODS = frozenset({
+    "eth_sendTransaction",
+    "eth_sendRawTransaction",
+    "eth_getTransactionCount",
+    "eth_estimateGas",
+})
+
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+class Endpoint:
+    """Rolling latency and circuit-breaker state for one RPC URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+
+    def available(self, now: float) -> bool:
+        """Closed, or open with its cooldown over and no trial request in flight."""
+        return self.failures < RPC_BREAKER_FAILURES or (now >= self.open_until and not self.trial)
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "latency": self.latency,
+            "failures": self.failures,
+            "open": self.failures >= RPC_BREAKER_FAILURES,
+        }
+
+
+class RpcRouter:
+    """
+    Picks an endpoint for each request.
+
+    Reads go to the available endpoint with the lowest latency average;
+    endpoints with no samples yet are tried first so every one gets
+    measured. After RPC_BREAKER_FAILURES failures in a row an endpoint is
+    skipped for RPC_BREAKER_COOLDOWN seconds, then gets one trial request.
+    Writes stay on one endpoint until it fails, and listeners are told when
+    that endpoint changes so they can resync nonces.
+    """
+
+    def __init__(self, urls: List[str], clock: Callable[[], float] = time.monotonic):
+        if not urls:
+            raise ValueError("At least one RPC endpoint is required.")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_listeners = []
+
+    def _rank(self, now: float) -> List[Endpoint]:
+        available = [ep for ep in self.endpoints if ep.available(now)]
+        if not available:
+            # Everything is open: try whichever recovers first rather than fail outright.
+            return sorted(self.endpoints, key=lambda ep: ep.open_until)
+        return sorted(available, key=lambda ep: -1 if ep.latency is None else ep.latency)
+
+    def read_order(self) -> List[Endpoint]:
+        """Endpoints to try for a read, best first."""
+        with self._lock:
+            order = self._rank(self._clock())
+            if order[0].failures >= RPC_BREAKER_FAILURES:
+                order[0].trial = True
+            return order
+
+    def writer(self) -> Endpoint:
+        """The endpoint all writes go to, chosen once and kept while it works."""
+        with self._lock:
+            if self._writer is None:
+                self._writer = self._rank(self._clock())[0]
+            return self._writer
+
+    def add_writer_listener(self, listener: Callable[[], None]):
+        with self._lock:
+            self._writer_listeners.append(listener)
+
+    def record_success(self, endpoint: Endpoint, elapsed: float):
+        with self._lock:
+            if endpoint.latency is None:
+                endpoint.latency = elapsed
+            else:
+                endpoint.latency += RPC_LATENCY_ALPHA * (elapsed - endpoint.latency)
+            endpoint.failures = 0
+            endpoint.trial = False
+
+    def record_failure(self, endpoint: Endpoint, elapsed: Optional[float] = None):
+        listeners = []
+        with self._lock:
+            # A timed-out attempt took at least `elapsed`; count it only when
+            # that makes the endpoint look slower, so a hung node stops ranking first.
+            if elapsed is not None and (endpoint.latency is None or elapsed > endpoint.latency):
+                if endpoint.latency is None:
+                    endpoint.latency = elapsed
+                else:
+                    endpoint.latency += RPC_LATENCY_ALPHA * (elapsed - endpoint.latency)
+            endpoint.failures += 1
+            endpoint.trial = False
+            if endpoint.failures >= RPC_BREAKER_FAILURES:
+                endpoint.open_until = self._clock() + RPC_BREAKER_COOLDOWN
+                if endpoint is self._writer:
+                    self._writer = None
+                    listeners = list(self._writer_listeners)
+        for listener in listeners:
+            listener()
+
+    def stats(self) -> List[dict]:
+        with self._lock:
+            return [ep.snapshot() for ep in self.endpoints]
+
+
+def get_router(urls: List[str]) -> RpcRouter:
+    """Return the router shared by every client of this endpoint list."""
+    key = tuple(urls)
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = RpcRouter(list(urls))
+        return _routers[key]
+
+
+class RoutedHTTPProvider(JSONBaseProvider):
+    """HTTP provider that spreads requests over several endpoints via an RpcRouter."""
+
+    def __init__(self, urls: List[str], request_kwargs: Optional[dict] = None,
+                 pool_size: int = 10, router: Optional[RpcRouter] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router or get_router(urls)
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(urls), pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # Retries are the router's job: a failed endpoint is left for the next one.
+        self._providers = {
+            url: HTTPProvider(url, request_kwargs=request_kwargs, session=session,
+                              exception_retry_configuration=None)
+            for url in urls
+        }
+
+    def _send(self, endpoints: List[Endpoint], send):
+        error = None
+        for endpoint in endpoints:
+            started = time.perf_counter()
+            try:
+                response = send(self._providers[endpoint.url])
+            except Exception as e:
+                self.router.record_failure(endpoint)
+                error = e
+                continue
+            self.router.record_success(endpoint, time.perf_counter() - started)
+            return response
+        raise error
+
+    def make_request(self, method, params):
+        if method in WRITE_METHODS:
+            return self._send([self.router.writer()], lambda p: p.make_request(method, params))
+        return self._send(self.router.read_order(), lambda p: p.make_request(method, params))
+
+    def make_batch_request(self, requests_info):
+        return self._send(self.router.read_order(), lambda p: p.make_batch_request(requests_info))
+
+
+class AsyncRoutedHTTPProvider(AsyncJSONBaseProvider):
+    """
+    Async counterpart of RoutedHTTPProvider; shares the same router and its stats.
+
+    Each endpoint attempt is bounded by attempt_timeout, so a hung node is
+    abandoned for the next one. Keep it below any timeout the caller wraps
+    the whole request in, or the caller gives up before the failover.
+    """
+
+    def __init__(self, urls: List[str], request_kwargs: Optional[dict] = None,
+                 router: Optional[RpcRouter] = None, attempt_timeout: Optional[float] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router or get_router(urls)
+        self.attempt_timeout = attempt_timeout
+        self._providers = {
+            url: AsyncHTTPProvider(url, request_kwargs=request_kwargs, exception_retry_configuration=None)
+            for url in urls
+        }
+
+    async def _send(self, endpoints: List[Endpoint], send):
+        error = None
+        for endpoint in endpoints:
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(send(self._providers[endpoint.url]), self.attempt_timeout)
+            except asyncio.CancelledError:
+                # The caller gave up mid-attempt: still count it against the
+                # endpoint, which also frees its half-open trial slot.
+                self.router.record_failure(endpoint, time.perf_counter() - started)
+                raise
+            except asyncio.TimeoutError as e:
+                self.router.record_failure(endpoint, time.perf_counter() - started)
+                error = e
+                continue
+            except Exception as e:
+                self.router.record_failure(endpoint)
+                error = e
+                continue
+            self.router.record_success(endpoint, time.perf_counter() - started)
+            return response
+        raise error
+
+    async def make_request(self, method, params):
+        if method in WRITE_METHODS:
+            return await self._send([self.router.writer()], lambda p: p.make_request(method, params))
+        return await self._send(self.router.read_order(), lambda p: p.make_request(method, params))
+
+    async def make_batch_request(self, requests_info):
+        return await self._send(self.router.read_order(), lambda p: p.make_batch_request(requests_info))
+
+    async def disconnect(self):
+        for provider in self._providers.values():
+            await provider.disconnect()
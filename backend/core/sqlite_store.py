@@ -0,0 +1,239 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Iterator, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from .storage import AsyncStore, Store, chain_fields
+
+# Fields kept in their own columns; everything else a row carries lives in `fields`.
+_COLUMNS = ("filename", "hash", "recordId")
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+# Write times are integer microseconds, so they round-trip through datetime exactly.
+def _to_micros(dt: datetime) -> int:
+    return (dt.replace(tzinfo=None) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(us: int) -> datetime:
+    # Naive UTC, as pymongo returns datetimes.
+    return _EPOCH + timedelta(microseconds=us)
+
+
+class SQLiteStore(Store):
+    """
+    Embedded storage backend with the same behaviour as the MongoDB one.
+
+    Files live in a WITHOUT ROWID table keyed by filename with a unique
+    index on the 32-byte hash, so verify lookups are one B-tree seek.
+    Extra fields (chain metadata, Merkle proofs) are one JSON column that
+    upserts merge into, like MongoDB's $set. Upserts of many rows are one
+    transaction; a row that breaks the hash uniqueness is reported like a
+    MongoDB write error without stopping the others.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                " filename TEXT PRIMARY KEY,"
+                " hash BLOB NOT NULL UNIQUE,"
+                " record_id INTEGER,"
+                " fields TEXT NOT NULL DEFAULT '{}',"
+                " updated_at INTEGER NOT NULL) WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS hashes_updated ON hashes (updated_at, filename);"
+                "CREATE TABLE IF NOT EXISTS admins ("
+                " id INTEGER PRIMARY KEY,"
+                " username TEXT NOT NULL UNIQUE,"
+                " doc TEXT NOT NULL);"
+            )
+            self._conn.commit()
+
+    # ------------------------------- file hashes -------------------------------
+    def upsert_hashes(self, data) -> dict:
+        """Same rows and result as Store.upsert_hashes; raises BulkWriteError for rejected rows."""
+        upserted = modified = 0
+        errors = []
+        now = time.time_ns() // 1000
+        with self._lock:
+            for index, (fn, digest, new_record_Id, *extra) in enumerate(data):
+                fields = {k: v for k, v in (extra[0] if extra else {}).items() if k not in _COLUMNS}
+                exists = self._conn.execute("SELECT 1 FROM hashes WHERE filename = ?", (fn,)).fetchone()
+                try:
+                    self._conn.execute(
+                        "INSERT INTO hashes (filename, hash, record_id, fields, updated_at) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (filename) DO UPDATE SET hash = excluded.hash,"
+                        " record_id = excluded.record_id,"
+                        " fields = json_patch(hashes.fields, excluded.fields),"
+                        " updated_at = excluded.updated_at",
+                        (fn, bytes.fromhex(digest), new_record_Id, json.dumps(fields), now),
+                    )
+                except sqlite3.IntegrityError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": f"duplicate key: {e}"})
+                    continue
+                if exists:
+                    modified += 1
+                else:
+                    upserted += 1
+            self._conn.commit()
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nUpserted": upserted, "nModified": modified})
+        return {"upserted": upserted, "modified": modified}
+
+    def set_chain_metadata(self, rows) -> dict:
+        """Merge chain_fields into existing rows from (filename, block_num, timestamp, chain_hash)."""
+        modified = 0
+        with self._lock:
+            for fn, block_num, timestamp, chain_hash in rows:
+                cur = self._conn.execute(
+                    "UPDATE hashes SET fields = json_patch(fields, ?) WHERE filename = ?",
+                    (json.dumps(chain_fields(block_num, timestamp, chain_hash)), fn),
+                )
+                modified += cur.rowcount
+            self._conn.commit()
+        return {"modified": modified}
+
+    def find_missing_chain_metadata(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT filename, record_id FROM hashes WHERE json_extract(fields, '$.chainHash') IS NULL"
+            ).fetchall()
+
+    def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT filename, record_id, fields FROM hashes WHERE hash = ?", (bytes.fromhex(file_hash),)
+            ).fetchone()
+        if row is None:
+            return None
+        filename, record_id, fields = row
+        return {"filename": filename, "hash": file_hash, "recordId": record_id, **json.loads(fields)}
+
+    def export_page(self, after: Optional[datetime], until: Optional[datetime], limit: int,
+                    position: Optional[Tuple[int, str]] = None) -> Tuple[List[dict], Optional[Tuple[int, str]]]:
+        """
+        Up to `limit` anchored documents written in (after, until], in
+        (updated_at, filename) order, and the position to pass for the next page.
+        """
+        if position is None:
+            where, params = ["updated_at > ?"], [-1 if after is None else _to_micros(after)]
+        else:
+            where, params = ["(updated_at, filename) > (?, ?)"], list(position)
+        if until is not None:
+            where.append("updated_at <= ?")
+            params.append(_to_micros(until))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT updated_at, filename, hash, record_id, fields FROM hashes"
+                f" WHERE {' AND '.join(where)} AND record_id > -1"
+                " ORDER BY updated_at, filename LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        docs = [
+            {"filename": filename, "hash": digest.hex(), "recordId": record_id, **json.loads(fields)}
+            for _, filename, digest, record_id, fields in rows
+        ]
+        return docs, (tuple(rows[-1][:2]) if rows else position)
+
+    def scan_hashes(self, since: Optional[datetime] = None) -> Iterator[Tuple[datetime, str]]:
+        """Yield (updated_at, hex digest) like Store.scan_hashes, a page at a time."""
+        where, params = "updated_at > ?", (-1 if since is None else _to_micros(since),)
+        while True:
+            with self._lock:
+                page = self._conn.execute(
+                    f"SELECT updated_at, filename, hash FROM hashes WHERE {where}"
+                    " ORDER BY updated_at, filename LIMIT 10000",
+                    params,
+                ).fetchall()
+            for updated_at, filename, digest in page:
+                yield _from_micros(updated_at), digest.hex()
+            if len(page) < 10000:
+                return
+            # Later pages resume after the last (time, filename) seen; times alone can tie.
+            where, params = "(updated_at, filename) > (?, ?)", page[-1][:2]
+
+    def count_hashes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    # --------------------------------- admins ----------------------------------
+    def find_admin(self, username: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT id, doc FROM admins WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        doc = json.loads(row[1])
+        if "created_at" in doc:
+            doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+        return {**doc, "_id": row[0]}
+
+    def insert_admin(self, doc: dict) -> int:
+        """Store an admin document; raises sqlite3.IntegrityError for a taken username."""
+        stored = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in doc.items() if k != "_id"}
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO admins (username, doc) VALUES (?, ?)", (doc["username"], json.dumps(stored))
+            )
+            self._conn.commit()
+        return cur.lastrowid
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AsyncSQLiteStore(AsyncStore):
+    """
+    AsyncStore over a SQLiteStore. Every call runs on a worker thread: even
+    a one-row seek waits on the store lock, which a bulk upsert can hold.
+    """
+
+    def __init__(self, store: SQLiteStore):
+        self.store = store
+        self.admins = _AsyncAdmins(store)
+
+    async def upsert_hashes(self, data) -> dict:
+        return await asyncio.to_thread(self.store.upsert_hashes, data)
+
+    async def set_chain_metadata(self, rows) -> dict:
+        return await asyncio.to_thread(self.store.set_chain_metadata, rows)
+
+    async def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.find_file_by_hash, file_hash)
+
+    async def iter_record_batches(self, after: Optional[datetime], until: Optional[datetime], batch_size: int):
+        # Keyset pages: each resumes after the last (updated_at, filename) sent.
+        position = None
+        while True:
+            page, position = await asyncio.to_thread(self.store.export_page, after, until, batch_size, position)
+            if page:
+                yield page
+            if len(page) < batch_size:
+                return
+
+
+class _AsyncAdmins:
+    """The part of the async admins collection API the handlers use, over a SQLiteStore."""
+
+    def __init__(self, store: SQLiteStore):
+        self._store = store
+
+    async def find_one(self, filt: dict):
+        return await asyncio.to_thread(self._store.find_admin, filt["username"])
+
+    async def insert_one(self, doc: dict):
+        inserted_id = await asyncio.to_thread(self._store.insert_admin, doc)
+        return SimpleNamespace(inserted_id=inserted_id)
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+
+def encode_hash(digest):
+    """Hex digest -> 32-byte BSON binary as stored in the `hash` field."""
+    return Binary(bytes.fromhex(digest))
+
+
+def decode_hash(value):
+    """Stored `hash` -> hex digest. Documents not migrated yet hold the hex string."""
+    return value if isinstance(value, str) else bytes(value).hex()
+
+
+def chain_fields(block_num, timestamp, chain_hash):
+    """Immutable on-chain metadata stored with a document once its anchor is mined."""
+    return {"blockNumber": block_num, "timestamp": timestamp, "chainHash": chain_hash}
+
+
+def upsert_ops(data):
+    """UpdateOne upserts for (filename, hash, recordId[, extra_fields]) rows."""
+    return [
+        UpdateOne(
+            {"filename": fn},
+            {"$set": {"filename": fn, "hash": encode_hash(digest), "recordId": new_record_Id, **(extra[0] if extra else {})},
+             "$currentDate": {"hashUpdatedAt": True}},
+            upsert=True
+        )
+        for fn, digest, new_record_Id, *extra in data
+    ]
+
+
+def chain_metadata_ops(rows):
+    """UpdateOne ops setting chain_fields from (filename, block_num, timestamp, chain_hash) rows."""
+    return [
+        UpdateOne({"filename": fn}, {"$set": chain_fields(block_num, timestamp, chain_hash)})
+        for fn, block_num, timestamp, chain_hash in rows
+    ]
+
+
+# Everything /verify reads; the lookup is one index seek plus one fetch.
+VERIFY_PROJECTION = {
+    "_id": 0, "filename": 1, "hash": 1, "recordId": 1,
+    "chainHash": 1, "blockNumber": 1, "timestamp": 1, "merkleProof": 1,
+}
+
+
+# Fields of a bulk export, in write order; Merkle proofs are left out.
+EXPORT_FIELDS = ["filename", "hash", "recordId", "blockNumber", "timestamp", "chainHash"]
+EXPORT_SORT = [("hashUpdatedAt", 1), ("filename", 1)]
+
+
+def export_query(after=None, until=None):
+    """
+    Anchored documents written in (after, until]. With `after` None this
+    includes documents stored before hashUpdatedAt was recorded.
+    """
+    query = {"recordId": {"$gt": -1}}
+    if after is not None:
+        query["hashUpdatedAt"] = {"$gt": after}
+        if until is not None:
+            query["hashUpdatedAt"]["$lte"] = until
+    elif until is not None:
+        # $not also matches a missing field.
+        query["hashUpdatedAt"] = {"$not": {"$gt": until}}
+    return query
+
+
+def hash_query(file_hash):
+    """Filter on the indexed `hash`; the hex form matches documents not migrated yet."""
+    return {"hash": {"$in": [encode_hash(file_hash), file_hash]}}
+
+
+class Store:
+    """
+    A storage backend as core.database uses it. database.init_database
+    opens one per process and the module functions there delegate to it,
+    so caching, the hash filter and error reporting are the same for every
+    backend. Documents come back with `hash` as hex.
+    """
+
+    def upsert_hashes(self, data) -> dict:
+        """
+        Upsert (filename, hash, recordId[, extra_fields]) rows as one
+        unordered batch; extra fields merge into the stored ones. Returns
+        {"upserted", "modified"}, or raises BulkWriteError naming the
+        rejected rows by index.
+        """
+        raise NotImplementedError
+
+    def set_chain_metadata(self, rows) -> dict:
+        """Set chain_fields on existing documents from (filename, block_num, timestamp, chain_hash) rows."""
+        raise NotImplementedError
+
+    def find_missing_chain_metadata(self) -> List[Tuple[str, int]]:
+        """(filename, recordId) of documents without chain metadata."""
+        raise NotImplementedError
+
+    def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def scan_hashes(self, since: Optional[datetime] = None) -> Iterator[Tuple[Optional[datetime], str]]:
+        """Yield (write time, hex digest) for every document, or those written after `since`."""
+        raise NotImplementedError
+
+    def count_hashes(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class AsyncStore:
+    """
+    The async side of a Store, one per event loop; core.async_database
+    delegates to it. `admins` is the admins collection: async find_one
+    by {"username": ...} and insert_one(doc) returning `inserted_id`.
+    """
+
+    admins = None
+
+    async def upsert_hashes(self, data) -> dict:
+        raise NotImplementedError
+
+    async def set_chain_metadata(self, rows) -> dict:
+        raise NotImplementedError
+
+    async def find_file_by_hash(self, file_hash: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def iter_record_batches(self, after: Optional[datetime], until: Optional[datetime],
+                            batch_size: int) -> AsyncIterator[List[dict]]:
+        """Yield lists of up to `batch_size` documents matching export_query(after, until), in EXPORT_SORT order."""
+        raise NotImplementedError
@@ -0,0 +1,273 @@
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+from web3.exceptions import TransactionNotFound
+
+TX_JOURNAL_FILE = os.getenv("TX_JOURNAL_FILE", "tx_journal.json")
+# Transactions sent but not yet mined; submit() blocks beyond this.
+TX_MAX_IN_FLIGHT = int(os.getenv("TX_MAX_IN_FLIGHT", 64))
+TX_RECEIPT_POLL = float(os.getenv("TX_RECEIPT_POLL", 1))
+# Unmined transactions older than this are re-sent with higher fees.
+TX_STUCK_AFTER = float(os.getenv("TX_STUCK_AFTER", 180))
+# Nodes only accept a replacement paying at least 10% more than the transaction it replaces.
+TX_GAS_BUMP = 1.125
+
+
+def _hex(tx_hash) -> str:
+    if isinstance(tx_hash, str):
+        return tx_hash
+    return "0x" + bytes(tx_hash).hex()
+
+
+class NonceManager:
+    """
+    Hands out nonces for one sender without asking the node each time.
+
+    Starts from the node's pending transaction count. Nonces whose send
+    failed are handed back with release() and reused first, so a failed
+    send never leaves a gap that would stall every later transaction.
+    """
+
+    def __init__(self, w3, sender: str):
+        self.w3 = w3
+        self.sender = sender
+        self._lock = threading.Lock()
+        self._next = None
+        self._released = []
+
+    def next(self) -> int:
+        with self._lock:
+            if self._released:
+                return heapq.heappop(self._released)
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.sender, "pending")
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def advance_past(self, nonce: int):
+        """Make sure `nonce` is never handed out again."""
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.sender, "pending")
+            self._next = max(self._next, nonce + 1)
+
+    def release(self, nonce: int):
+        with self._lock:
+            heapq.heappush(self._released, nonce)
+
+    def resync(self):
+        """Forget local state and start again from the node's pending count."""
+        with self._lock:
+            self._next = None
+            self._released = []
+
+
+class TxSubmitter:
+    """
+    Sends store() transactions with locally managed nonces and tracks their
+    receipts on a background thread, so many anchors can be in flight at
+    once. submit() returns a Future resolving to (tx_hash, receipt, nonce).
+
+    Every in-flight transaction is written to a journal; recover() replays
+    it after a restart and re-sends any nonce that never got mined.
+    """
+
+    def __init__(self, contract, sender: str, journal_path: Optional[str] = None,
+                 max_in_flight: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.contract = contract
+        self.w3 = contract.w3
+        self.sender = sender
+        self.nonces = NonceManager(self.w3, sender)
+        self.journal_path = journal_path or TX_JOURNAL_FILE
+        self.poll_interval = TX_RECEIPT_POLL if poll_interval is None else poll_interval
+        self._slots = threading.BoundedSemaphore(max_in_flight or TX_MAX_IN_FLIGHT)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._closed = threading.Event()
+        self._tracker = threading.Thread(target=self._track, name="tx-receipts", daemon=True)
+        self._tracker.start()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def _send(self, hash_bytes: bytes, nonce: int, fees: Optional[dict] = None):
+        tx = {"from": self.sender, "nonce": nonce, **(fees or {})}
+        return self.contract.functions.store(hash_bytes).transact(tx)
+
+    def submit(self, hash_bytes: bytes) -> Future:
+        """Send store(hash_bytes) and return a Future for its receipt."""
+        self._slots.acquire()
+        nonce = self.nonces.next()
+        try:
+            tx_hash = self._send(hash_bytes, nonce)
+        except Exception as e:
+            if "nonce too low" in str(e).lower():
+                self.nonces.resync()
+            else:
+                self.nonces.release(nonce)
+            self._slots.release()
+            raise
+
+        fut = Future()
+        with self._lock:
+            self._in_flight[nonce] = {
+                "nonce": nonce,
+                "tx_hashes": [_hex(tx_hash)],
+                "hash": hash_bytes.hex(),
+                "sent_at": time.time(),
+                "attempt": 0,
+                "future": fut,
+            }
+            self._write_journal()
+        return fut
+
+    def _write_journal(self):
+        entries = [
+            {k: v for k, v in entry.items() if k != "future"}
+            for entry in self._in_flight.values()
+        ]
+        tmp = self.journal_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.journal_path)
+
+    def _finish(self, nonce: int, receipt):
+        with self._lock:
+            entry = self._in_flight.pop(nonce, None)
+            self._write_journal()
+        if entry is None:
+            return
+        self._slots.release()
+        fut = entry["future"]
+        if fut is None or fut.done():
+            # Recovered from the journal, or the caller stopped waiting.
+            return
+        if receipt.get("status", 1) == 0:
+            fut.set_exception(RuntimeError(f"Transaction {_hex(receipt['transactionHash'])} reverted"))
+        else:
+            fut.set_result((_hex(receipt["transactionHash"]), receipt, nonce))
+
+    def _last_fees(self, entry: dict) -> dict:
+        """
+        Fees of the last attempt at a nonce: recorded for replacements, read
+        back from the node for the original send (whose fees web3 filled in).
+        A transaction the node no longer knows starts from the network price.
+        """
+        if entry.get("fees"):
+            return entry["fees"]
+        try:
+            tx = self.w3.eth.get_transaction(entry["tx_hashes"][-1])
+        except TransactionNotFound:
+            tx = {}
+        if tx.get("maxFeePerGas") is not None:
+            return {"maxFeePerGas": tx["maxFeePerGas"], "maxPriorityFeePerGas": tx["maxPriorityFeePerGas"]}
+        if tx.get("gasPrice") is not None:
+            return {"gasPrice": tx["gasPrice"]}
+        return {"gasPrice": self.w3.eth.gas_price}
+
+    def _bumped_fees(self, entry: dict) -> dict:
+        """The last attempt's fees raised by TX_GAS_BUMP, in the same (EIP-1559 or legacy) form."""
+        fees = {k: math.ceil(v * TX_GAS_BUMP) for k, v in self._last_fees(entry).items()}
+        if "gasPrice" in fees:
+            fees["gasPrice"] = max(fees["gasPrice"], self.w3.eth.gas_price)
+        else:
+            fees["maxFeePerGas"] = max(fees["maxFeePerGas"], fees["maxPriorityFeePerGas"])
+        return fees
+
+    def _replace(self, entry: dict):
+        """Re-send a stuck nonce with fees at least TX_GAS_BUMP times the last attempt's."""
+        fees = tx_hash = None
+        try:
+            fees = self._bumped_fees(entry)
+            tx_hash = self._send(bytes.fromhex(entry["hash"]), entry["nonce"], fees)
+        finally:
+            with self._lock:
+                # Counted even when the node rejects it, so the next try waits
+                # TX_STUCK_AFTER and bids above this one instead of repeating it.
+                entry["attempt"] += 1
+                entry["sent_at"] = time.time()
+                if fees is not None:
+                    entry["fees"] = fees
+                if tx_hash is not None:
+                    # Keep earlier hashes: whichever attempt gets mined settles the nonce.
+                    entry["tx_hashes"].append(_hex(tx_hash))
+                self._write_journal()
+        print(f"Re-sent stuck nonce {entry['nonce']} with fees {fees}: {_hex(tx_hash)}")
+
+    def _receipt(self, entry: dict):
+        for tx_hash in entry["tx_hashes"]:
+            try:
+                return self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                continue
+        return None
+
+    def poll_once(self):
+        """Check every in-flight transaction for a receipt once."""
+        with self._lock:
+            entries = list(self._in_flight.values())
+        for entry in entries:
+            try:
+                receipt = self._receipt(entry)
+            except Exception as e:
+                print(f"Error fetching receipt for nonce {entry['nonce']}: {e}")
+                continue
+            if receipt is not None:
+                self._finish(entry["nonce"], receipt)
+            elif time.time() - entry["sent_at"] >= TX_STUCK_AFTER:
+                try:
+                    self._replace(entry)
+                except Exception as e:
+                    print(f"Error re-sending nonce {entry['nonce']}: {e}")
+
+    def _track(self):
+        while not self._closed.wait(self.poll_interval):
+            self.poll_once()
+
+    def recover(self) -> int:
+        """
+        Reload the journal from a previous run. Nonces the chain has already
+        passed are dropped; the rest stay tracked and are re-sent if they are
+        not mined within TX_STUCK_AFTER. Returns the number re-tracked.
+        """
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, encoding="utf-8") as f:
+            entries = json.load(f)
+        mined = self.w3.eth.get_transaction_count(self.sender, "latest")
+        recovered = 0
+        with self._lock:
+            for entry in entries:
+                if entry["nonce"] < mined:
+                    continue
+                if not self._slots.acquire(blocking=False):
+                    break
+                # Treat it as stuck straight away: the process that sent it is gone.
+                self._in_flight[entry["nonce"]] = dict(entry, sent_at=0, future=None)
+                self.nonces.advance_past(entry["nonce"])
+                recovered += 1
+            self._write_journal()
+        print(f"Recovered {recovered} unmined transaction(s) from {self.journal_path}")
+        return recovered
+
+    def close(self):
+        """
+        Stop tracking receipts. Unmined transactions stay in the journal for
+        the next submitter's recover(); their futures fail now rather than
+        leave callers waiting on a tracker that is gone.
+        """
+        self._closed.set()
+        self._tracker.join()
+        with self._lock:
+            futures = [entry["future"] for entry in self._in_flight.values() if entry["future"] is not None]
+        for fut in futures:
+            if not fut.done():
+                fut.set_exception(RuntimeError("Transaction submitter closed before the transaction was mined."))
@@ -0,0 +1,20 @@
+from core.ledger import get_ledger
+import argparse
+import sys
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Copy the local file ledger to or from CSV.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="CSV file with Filename, Hash and Record ID columns")
+    return parser.parse_args(argv)
+
+def main(argv=()):
+    args = parse_args(list(argv))
+    ledger = get_ledger()
+    if args.action == "export":
+        print(f"Exported {ledger.export_csv(args.path)} row(s) to {args.path}.")
+    else:
+        print(f"Imported {ledger.import_csv(args.path)} row(s) from {args.path}.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,11 @@
+from core.database import migrate_hashes_to_binary
+
+def main():
+    # Documents stored before hashes were kept as 32-byte binary get
+    # converted once; the unique hash index is created afterwards.
+    result = migrate_hashes_to_binary()
+    if result is None or not result["unique_index"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,11 @@ import sys
 import os
 from pathlib import Path
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch, MagicMock, mock_open
+from unittest.mock import AsyncMock, Mock, patch, MagicMock, mock_open
 from datetime import datetime, timedelta
 import jwt
 import io
+import json
 from bson import ObjectId
 
 # Add backend directory to path
@@ -23,6 +24,12 @@ def client():
     return TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def isolated_caches(monkeypatch):
+    """Start every test with empty lookup caches, including cached admins"""
+    monkeypatch.setattr("core.record_cache._caches", {})
+
+
 @pytest.fixture
 def mock_admin():
     """Mock admin user data"""
@@ -58,11 +65,11 @@ def mock_file():
 
 @pytest.fixture
 def mock_db_collection():
-    """Mock MongoDB collection"""
+    """Mock async MongoDB collection"""
     mock_col = Mock()
-    mock_col.find_one = Mock()
-    mock_col.insert_one = Mock()
-    mock_col.create_index = Mock()
+    mock_col.find_one = AsyncMock()
+    mock_col.insert_one = AsyncMock()
+    mock_col.create_index = AsyncMock()
     return mock_col
 
 
@@ -267,6 +274,26 @@ class TestAdminLogin:
         assert data["token_type"] == "bearer"
         assert data["admin"]["username"] == "testadmin"
     
+    @patch("app.get_admin_collection")
+    def test_repeated_login_reads_admin_once(self, mock_get_col, client, mock_db_collection, mock_admin):
+        """Test the admin document is cached between logins, and bcrypt runs off the event loop"""
+        mock_db_collection.find_one.return_value = mock_admin
+        mock_get_col.return_value = mock_db_collection
+        threads = []
+        
+        def recording_verify(plain, hashed):
+            import threading
+            threads.append(threading.current_thread().name)
+            return verify_password(plain, hashed)
+        
+        with patch("app.verify_password", recording_verify):
+            for _ in range(2):
+                response = client.post("/admin/login", params={"username": "testadmin", "password": "testpass123"})
+                assert response.json()["status"] == "success"
+        
+        assert mock_db_collection.find_one.await_count == 1
+        assert all(name.startswith("auth") for name in threads)
+    
     @patch("app.get_admin_collection")
     def test_login_user_not_found(self, mock_get_col, client, mock_db_collection):
         """Test login with non-existent user"""
@@ -402,6 +429,142 @@ class TestTokenVerification:
         assert "Invalid token" in response.json()["detail"]
 
 
+# ============= VERIFY TESTS =============
+
+
+class TestVerify:
+    """Test public verify endpoint"""
+    
+    @patch("app.find_anchored")
+    @patch("app.find_file_by_hash")
+    def test_verify_no_match_streams_hash(self, mock_find, mock_anchored, client, mock_file):
+        """Test verify hashes the upload and reports no match"""
+        from blake3 import blake3
+        mock_find.return_value = None
+        mock_anchored.return_value = None
+        
+        response = client.post("/verify", files={"file": mock_file})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "no_match"
+        assert data["hash"] == blake3(b"test file content").hexdigest()
+        mock_find.assert_called_once_with(data["hash"])
+    
+    @patch("app.might_be_known", return_value=False)
+    @patch("app.find_anchored")
+    @patch("app.find_file_by_hash")
+    def test_verify_unknown_hash_skips_db(self, mock_find, mock_anchored, mock_known, client, mock_file):
+        """Test verify answers no_match without a DB query when the hash filter rules the hash out"""
+        mock_anchored.return_value = None
+        
+        data = client.post("/verify", files={"file": mock_file}).json()
+        
+        assert data["status"] == "no_match"
+        mock_known.assert_called_once_with(data["hash"])
+        mock_find.assert_not_called()
+    
+    @patch("app.retrieve_record")
+    @patch("app.find_anchored")
+    @patch("app.find_file_by_hash")
+    def test_verify_falls_back_to_chain_index(self, mock_find, mock_anchored, mock_retrieve, client, mock_file):
+        """Test verify finds a hash anchored outside this backend's DB in the chain index"""
+        from blake3 import blake3
+        digest = blake3(b"test file content").hexdigest()
+        mock_find.return_value = None
+        mock_anchored.return_value = (17, 300, 1761904800)
+        
+        data = client.post("/verify", files={"file": mock_file}).json()
+        
+        assert data["status"] == "original"
+        assert data["source"] == "chain_index"
+        assert data["recordId"] == 17
+        assert data["block_num"] == 300
+        assert data["matched_file"] is None
+        mock_anchored.assert_called_once_with(digest)
+        mock_retrieve.assert_not_called()
+    
+    @patch("app.set_chain_metadata")
+    @patch("app.retrieve_record")
+    @patch("app.find_file_by_hash")
+    def test_verify_match(self, mock_find, mock_retrieve, mock_set_meta, client, mock_file):
+        """Test verify reads an older record from the chain and stores its metadata"""
+        mock_find.return_value = {"filename": "test.txt", "hash": "ab" * 32, "recordId": 7}
+        mock_retrieve.return_value = ("ab" * 32, 123, 1761904800)
+        
+        response = client.post("/verify", files={"file": mock_file})
+        
+        data = response.json()
+        assert data["status"] == "original"
+        assert data["recordId"] == 7
+        assert data["block_num"] == 123
+        mock_retrieve.assert_called_once_with(7)
+        mock_set_meta.assert_called_once_with([("test.txt", 123, 1761904800, "ab" * 32)])
+    
+    @patch("app.set_chain_metadata")
+    @patch("app.retrieve_record")
+    @patch("app.find_file_by_hash")
+    def test_verify_match_uses_stored_chain_metadata(self, mock_find, mock_retrieve, mock_set_meta, client, mock_file):
+        """Test verify answers from the stored chain metadata without an RPC call"""
+        mock_find.return_value = {
+            "filename": "test.txt", "hash": "ab" * 32, "recordId": 7,
+            "blockNumber": 123, "timestamp": 1761904800, "chainHash": "ab" * 32,
+        }
+        
+        data = client.post("/verify", files={"file": mock_file}).json()
+        
+        assert data["status"] == "original"
+        assert data["block_num"] == 123
+        assert data["timestamp"] == 1761904800
+        assert data["hash_verified"] == "ab" * 32
+        mock_retrieve.assert_not_called()
+        mock_set_meta.assert_not_called()
+    
+    @patch("app.set_chain_metadata")
+    @patch("app.retrieve_record")
+    @patch("app.find_file_by_hash")
+    def test_verify_match_through_merkle_proof(self, mock_find, mock_retrieve, mock_set_meta, client, mock_file):
+        """Test verify accepts a batched file via its Merkle proof"""
+        from blake3 import blake3
+        from core.merkle import build_tree, merkle_proof, tree_root
+        digest = blake3(b"test file content").hexdigest()
+        levels = build_tree([digest, "cd" * 32, "ef" * 32])
+        root = tree_root(levels)
+        mock_find.return_value = {
+            "filename": "test.txt", "hash": digest, "recordId": 3,
+            "merkleRoot": root, "merkleProof": merkle_proof(levels, 0),
+        }
+        mock_retrieve.return_value = (root, 10, 1761904800)
+        
+        data = client.post("/verify", files={"file": mock_file}).json()
+        assert data["status"] == "original"
+        assert data["merkle_verified"] is True
+        
+        mock_retrieve.return_value = ("00" * 32, 10, 1761904800)
+        data = client.post("/verify", files={"file": mock_file}).json()
+        assert data["status"] == "unverified"
+        assert data["merkle_verified"] is False
+    
+    def test_verify_missing_file_field(self, client):
+        """Test verify without a file part"""
+        response = client.post("/verify", files={"other": ("a.txt", io.BytesIO(b"x"), "text/plain")})
+        
+        assert response.status_code == 422
+    
+    def test_verify_without_multipart_boundary(self, client):
+        """Test verify with a body that is not multipart"""
+        response = client.post("/verify", content=b"raw bytes", headers={"Content-Type": "application/octet-stream"})
+        
+        assert response.status_code == 422
+        assert "boundary" in response.json()["detail"]
+    
+    def test_verify_malformed_multipart_body(self, client):
+        """Test verify with a body that does not match its boundary"""
+        response = client.post("/verify", content=b"garbage\r\n", headers={"Content-Type": "multipart/form-data; boundary=XyZ"})
+        
+        assert response.status_code == 422
+
+
 # ============= ADMIN UPLOAD TESTS =============
 
 
@@ -427,6 +590,101 @@ class TestAdminUpload:
         )
         
         assert response.status_code == 401
+    
+    @patch("app.cleanup_files_folder")
+    @patch("app.store_digest")
+    def test_upload_hashes_once_and_stores_digest(self, mock_store, mock_cleanup, client, valid_token, mock_file, tmp_path, monkeypatch):
+        """Test upload hashes while saving and anchors the digest once"""
+        from blake3 import blake3
+        monkeypatch.chdir(tmp_path)
+        expected = blake3(b"test file content").hexdigest()
+        mock_store.return_value = (5, expected, "0xabc", 40, 1700000000)
+        mock_cleanup.return_value = True
+        
+        response = client.post(
+            "/admin/upload",
+            files={"files": mock_file},
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["successful"] == 1
+        assert data["uploaded_files"][0]["hash"] == expected
+        assert data["uploaded_files"][0]["recordId"] == 5
+        assert data["uploaded_files"][0]["block_num"] == 40
+        assert data["uploaded_files"][0]["timestamp"] == 1700000000
+        mock_store.assert_called_once_with("test.txt", expected)
+        assert (tmp_path / "files" / "test.txt").read_bytes() == b"test file content"
+    
+    @patch("app.cleanup_files_folder")
+    @patch("app.store_digest")
+    @patch("app.batching_enabled")
+    def test_upload_batch_mode_uses_batcher(self, mock_enabled, mock_store, mock_cleanup, client, valid_token, tmp_path, monkeypatch):
+        """Test upload in batch mode waits on the Merkle batcher"""
+        from concurrent.futures import Future
+        monkeypatch.chdir(tmp_path)
+        mock_enabled.return_value = True
+        submitted = []
+        
+        class FakeBatcher:
+            def submit(self, filename, digest):
+                submitted.append(filename)
+                fut = Future()
+                fut.set_result((12, digest, "0xroot", 40, 1700000000))
+                return fut
+        
+        monkeypatch.setattr("app.get_batcher", lambda: FakeBatcher())
+        response = client.post(
+            "/admin/upload",
+            files=[("files", ("a.txt", io.BytesIO(b"a"), "text/plain")), ("files", ("b.txt", io.BytesIO(b"b"), "text/plain"))],
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        data = response.json()
+        assert data["successful"] == 2
+        assert submitted == ["a.txt", "b.txt"]
+        assert {r["recordId"] for r in data["uploaded_files"]} == {12}
+        mock_store.assert_not_called()
+    
+    @patch("app.cleanup_files_folder")
+    @patch("app.store_digest")
+    def test_upload_already_certified_returns_existing_record(self, mock_store, mock_cleanup, client, valid_token, mock_file, tmp_path, monkeypatch):
+        """Test content already certified under another name reports its record instead of re-anchoring"""
+        from core.database import DigestAlreadyStored
+        monkeypatch.chdir(tmp_path)
+        mock_store.side_effect = DigestAlreadyStored({"filename": "old.txt", "recordId": 3, "blockNumber": 9, "timestamp": 1700000000})
+        mock_cleanup.return_value = True
+        
+        response = client.post(
+            "/admin/upload",
+            files={"files": mock_file},
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        data = response.json()
+        assert data["successful"] == 0 and data["existing"] == 1 and data["failed"] == 0
+        result = data["uploaded_files"][0]
+        assert result["status"] == "exists"
+        assert result["recordId"] == 3 and result["certified_as"] == "old.txt"
+    
+    @patch("app.cleanup_files_folder")
+    @patch("app.store_digest")
+    def test_upload_rejected_write_is_an_error(self, mock_store, mock_cleanup, client, valid_token, mock_file, tmp_path, monkeypatch):
+        """Test a row the database rejects is not reported as a success"""
+        monkeypatch.chdir(tmp_path)
+        mock_store.side_effect = RuntimeError("duplicate key")
+        
+        response = client.post(
+            "/admin/upload",
+            files={"files": mock_file},
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        data = response.json()
+        assert data["successful"] == 0 and data["failed"] == 1
+        assert data["uploaded_files"][0]["status"] == "error"
+        mock_cleanup.assert_not_called()
 
 
 # ============= ADMIN STATS TESTS =============
@@ -440,6 +698,135 @@ class TestAdminStats:
         response = client.get("/admin/stats")
         
         assert response.status_code == 401
+    
+    @patch("core.admin_stats.get_total_record")
+    def test_stats_served_from_counters(self, mock_total, client, valid_token, monkeypatch):
+        """Test stats come from the in-memory counters, without reading the chain"""
+        from core.admin_stats import AdminStats
+        stats = AdminStats()
+        stats.refreshed(10)
+        stats.record_hashed(2048)
+        stats.anchor_started()
+        stats.record_certified(11)
+        monkeypatch.setattr("app.get_admin_stats", lambda: stats)
+        
+        response = client.get("/admin/stats", headers={"Authorization": f"Bearer {valid_token}"})
+        
+        data = response.json()
+        assert data["status"] == "ok"
+        assert data["total_records"] == 12
+        assert data["bytes_hashed"] == 2048
+        assert data["pending_anchors"] == 1
+        assert sum(data["records_per_day"].values()) == 1
+        assert data["stale"] is False and data["refreshed_at"] is not None
+        mock_total.assert_not_called()
+
+
+# ============= ADMIN EXPORT TESTS =============
+
+
+class TestAdminExport:
+    """Test streaming export endpoint"""
+    
+    @staticmethod
+    def fake_batches(calls):
+        async def iter_record_batches(after, until, batch_size):
+            calls.append((after, until))
+            yield [{"filename": "a.txt", "hash": "aa" * 32, "recordId": 3, "blockNumber": 10,
+                    "timestamp": 1700000000, "chainHash": "aa" * 32, "merkleProof": []}]
+            yield [{"filename": "b.txt", "hash": "bb" * 32, "recordId": 4}]
+        return iter_record_batches
+    
+    def test_export_without_token(self, client):
+        """Test export without authentication"""
+        response = client.get("/admin/export")
+        
+        assert response.status_code == 401
+    
+    def test_export_unknown_format(self, client, valid_token):
+        """Test export rejects formats other than NDJSON and CSV"""
+        response = client.get("/admin/export", params={"format": "xml"}, headers={"Authorization": f"Bearer {valid_token}"})
+        
+        assert response.status_code == 400
+    
+    def test_export_ndjson_from_watermark(self, client, valid_token, monkeypatch):
+        """Test NDJSON export streams every batch, resumes from `after` and hands out the next cursor"""
+        calls = []
+        monkeypatch.setattr("app.iter_record_batches", self.fake_batches(calls))
+        monkeypatch.setattr("app.EXPORT_SETTLE", 60)
+        
+        response = client.get("/admin/export", params={"after": "2025-01-01T12:00:00+02:00"}, headers={"Authorization": f"Bearer {valid_token}"})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.text.splitlines()
+        assert [json.loads(line)["recordId"] for line in lines] == [3, 4]
+        assert "merkleProof" not in json.loads(lines[0])
+        ((after, until),) = calls
+        assert after == datetime(2025, 1, 1, 10, 0)
+        assert response.headers["x-export-cursor"] == until.isoformat()
+        assert datetime.utcnow() - until >= timedelta(seconds=60)
+    
+    def test_export_csv(self, client, valid_token, monkeypatch):
+        """Test CSV export has a header and one row per record"""
+        monkeypatch.setattr("app.iter_record_batches", self.fake_batches([]))
+        
+        response = client.get("/admin/export", params={"format": "csv"}, headers={"Authorization": f"Bearer {valid_token}"})
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0] == "filename,hash,recordId,blockNumber,timestamp,chainHash"
+        assert lines[2] == f"b.txt,{'bb' * 32},4,,,"
+
+
+# ============= ADMIN BULK RECORDS TESTS =============
+
+
+class TestAdminBulkRecords:
+    """Test bulk on-chain record endpoint"""
+    
+    def test_bulk_without_token(self, client):
+        """Test bulk read without authentication"""
+        response = client.post("/admin/records/bulk", json={"record_ids": [1]})
+        
+        assert response.status_code == 401
+    
+    @patch("app.retrieve_records")
+    def test_bulk_reads_records_in_order(self, mock_retrieve, client, valid_token):
+        """Test bulk read reports each record and the failed ones"""
+        mock_retrieve.return_value = [("ab" * 32, 10, 1761904800), None]
+        
+        response = client.post(
+            "/admin/records/bulk",
+            json={"record_ids": [4, 99], "batch_size": 50},
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 2
+        assert data["failed"] == 1
+        assert data["records"][0] == {
+            "recordId": 4, "status": "ok", "hash": "ab" * 32,
+            "block_num": 10, "timestamp": 1761904800
+        }
+        assert data["records"][1] == {"recordId": 99, "status": "error"}
+        mock_retrieve.assert_called_once_with([4, 99], 50)
+    
+    @patch("app.retrieve_records")
+    def test_bulk_rejects_too_many_ids(self, mock_retrieve, client, valid_token, monkeypatch):
+        """Test bulk read refuses requests above BULK_MAX_RECORDS"""
+        monkeypatch.setattr("app.BULK_MAX_RECORDS", 2)
+        
+        response = client.post(
+            "/admin/records/bulk",
+            json={"record_ids": [1, 2, 3]},
+            headers={"Authorization": f"Bearer {valid_token}"}
+        )
+        
+        assert response.status_code == 413
+        mock_retrieve.assert_not_called()
 
 
 # ============= ADMIN LOGOUT TESTS =============
@@ -29,12 +29,17 @@ def make_fake_core_ic(
     def retrieve_record(record_id: int):
         return record_tuple
 
+    def retrieve_records(record_ids, batch_size=None):
+        calls["batch_size"] = batch_size
+        return [None if i < 0 else record_tuple for i in record_ids]
+
     def store_record(path: str):
         calls["store_called"] += 1
-        return (999, "0xSTORE", "0xTX")
+        return (999, "0xSTORE", "0xTX", 1, 0)
 
     ic_mod.get_total_record = get_total_record
     ic_mod.retrieve_record = retrieve_record
+    ic_mod.retrieve_records = retrieve_records
     ic_mod.store_record = store_record
 
     core_pkg.interact_certifier = ic_mod
@@ -86,13 +91,14 @@ def test_store_record_is_not_called(capsys):
     assert calls["store_called"] == 0
 
 
-def test_running_as_script_executes_main_once(capsys):
+def test_running_as_script_executes_main_once(capsys, monkeypatch):
     test_ts = 1761989400
     _, calls = make_fake_core_ic(
         total_first=3,
         total_second=3,
         record_tuple=("0xBEEF", 999, test_ts),
     )
+    monkeypatch.setattr(sys, "argv", ["certifier_integration.py"])
     runpy.run_module("certifier_integration", run_name="__main__")
     out = capsys.readouterr().out
     
@@ -101,4 +107,19 @@ def test_running_as_script_executes_main_once(capsys):
     assert "999" in out
     
     # FIX: Changed expectation from 2 to 1
-    assert out.count("Total records:") == 1
\ No newline at end of file
+    assert out.count("Total records:") == 1
+
+
+def test_records_flag_reads_in_batches(capsys):
+    test_ts = 1761904800
+    _, calls = make_fake_core_ic(record_tuple=("0xCAFE", 42, test_ts))
+    sys.modules.pop("certifier_integration", None)
+    mod = import_certifier_integration()
+    mod.main(["--records", "3", "-1", "--batch-size", "50"])
+    out = capsys.readouterr().out
+
+    assert calls["batch_size"] == 50
+    assert "3\t0xCAFE\t42" in out
+    assert "-1\tERROR" in out
+    assert "Read 1 of 2 record(s)." in out
+    assert "Total records:" not in out
@@ -1,4 +1,7 @@
+import importlib
 import warnings
+from concurrent.futures import Future
+
 import pytest
 
 # Suppress all deprecation warnings from websockets
@@ -7,4 +10,75 @@ warnings.filterwarnings("ignore", message=".*websockets.*")
 
 # Also add pytest option to not show warnings summary
 def pytest_configure(config):
-    config.option.disable_warnings = True
\ No newline at end of file
+    config.option.disable_warnings = True
+
+
+# Module -> (file settings pointed into the test's tmp_path, state reset for
+# the test). Reset values that are callables are called for a fresh value;
+# state left with a close() afterwards is closed.
+ISOLATED_STATE = {
+    "hash_cache": ({"HASH_CACHE_FILE": "hash_cache.db"}, {"_cache": None}),
+    "chain_index": ({"CHAIN_INDEX_FILE": "chain_index.db"}, {"_index": None}),
+    "record_cache": ({}, {"_caches": dict}),
+    "hash_filter": ({"HASH_FILTER_FILE": "hash_filter.bin"}, {"_filter": None, "_watermark": None}),
+    "ledger": ({"LEDGER_FILE": "ledger.db", "LEGACY_CSV_FILE": "output.csv"}, {"_ledger": None}),
+    # A blank MONGODB_URI keeps tests from ever reaching a real MongoDB.
+    "database": ({"SQLITE_STORE_FILE": "hashes.db"}, {"_store": None, "MONGODB_URI": ""}),
+    "admin_stats": ({}, {"_stats": None}),
+}
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path, monkeypatch):
+    """Give every test its own files and fresh process-wide state in each ISOLATED_STATE module."""
+    modules = {}
+    for name, (files, state) in ISOLATED_STATE.items():
+        module = modules[name] = importlib.import_module(f"backend.core.{name}")
+        for attr, filename in files.items():
+            monkeypatch.setattr(module, attr, str(tmp_path / filename), raising=True)
+        for attr, value in state.items():
+            monkeypatch.setattr(module, attr, value() if callable(value) else value, raising=True)
+    yield
+    for name, (_, state) in ISOLATED_STATE.items():
+        for attr in state:
+            close = getattr(getattr(modules[name], attr), "close", None)
+            if close is not None:
+                close()
+
+
+# ------------------------------ shared fakes ---------------------------------
+class FakeBulkResult:
+    def __init__(self, upserted=0, modified=0):
+        self.upserted_count = upserted
+        self.modified_count = modified
+
+
+class FakeClock:
+    """Clock for code taking `clock=`; tests move `now` by hand."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeUpsertBuffer:
+    """
+    Stands in for the upsert buffer: records submitted rows. Rows fail with
+    `error` if one is given: those whose filename is in `rejected`, or all.
+    """
+
+    def __init__(self, error=None, rejected=None):
+        self.rows = []
+        self.error = error
+        self.rejected = rejected
+
+    def submit(self, row):
+        self.rows.append(row)
+        fut = Future()
+        if self.error is not None and (self.rejected is None or row[0] in self.rejected):
+            fut.set_exception(self.error)
+        else:
+            fut.set_result(True)
+        return fut
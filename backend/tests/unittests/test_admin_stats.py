@@ -0,0 +1,109 @@
+import pytest
+
+from backend.core import admin_stats as st
+from conftest import FakeClock
+
+DAY = 24 * 3600
+NOW = 1_700_000_000.0
+
+
+def test_ingest_counters():
+    stats = st.AdminStats(clock=FakeClock(NOW))
+    stats.record_hashed(100)
+    stats.record_hashed(50, files=2)
+    stats.anchor_started(3)
+    stats.anchor_done()
+
+    snap = stats.snapshot()
+
+    assert snap["files_hashed"] == 3
+    assert snap["bytes_hashed"] == 150
+    assert snap["pending_anchors"] == 2
+
+
+def test_records_per_day_keeps_the_newest_days():
+    clock = FakeClock(NOW)
+    stats = st.AdminStats(days=2, clock=clock)
+    for _ in range(3):
+        stats.record_certified(1)
+        clock.now += DAY
+    stats.record_certified(2, count=5)
+
+    assert stats.snapshot()["records_per_day"] == {"2023-11-16": 1, "2023-11-17": 5}
+
+
+def test_certified_records_raise_the_refreshed_total():
+    stats = st.AdminStats(clock=FakeClock(NOW))
+    stats.record_certified(7)
+    assert stats.snapshot()["total_records"] == 0  # unknown until the first refresh
+
+    stats.refreshed(5)
+    stats.record_certified(7)
+    stats.record_certified(3)
+
+    assert stats.snapshot()["total_records"] == 8
+
+
+def test_staleness(monkeypatch):
+    monkeypatch.setattr(st, "ADMIN_STATS_REFRESH", 10, raising=True)
+    clock = FakeClock(NOW)
+    stats = st.AdminStats(clock=clock)
+    assert stats.snapshot()["stale"] is True
+    assert stats.snapshot()["refreshed_at"] is None
+
+    stats.refreshed(4)
+    clock.now += 15
+    snap = stats.snapshot()
+    assert snap["stale"] is False
+    assert snap["age_seconds"] == 15
+    assert snap["refreshed_at"] == "2023-11-14T22:13:20+00:00"
+
+    clock.now += 10
+    assert stats.snapshot()["stale"] is True
+
+
+def test_refresh_reads_chain_and_ledger(monkeypatch):
+    stats = st.AdminStats(clock=FakeClock(NOW))
+    st.get_ledger().add([("a.txt", "aa" * 32, 0), ("b.txt", "bb" * 32, 1)])
+    monkeypatch.setattr(st, "get_total_record", lambda: 42, raising=True)
+
+    st.refresh_admin_stats(stats)
+
+    snap = stats.snapshot()
+    assert snap["total_records"] == 42
+    assert snap["csv_entries"] == 2
+    assert snap["refresh_error"] is None
+
+
+def test_failed_refresh_keeps_the_last_count(monkeypatch):
+    clock = FakeClock(NOW)
+    stats = st.AdminStats(clock=clock)
+    stats.refreshed(42)
+    clock.now += 5
+
+    def boom():
+        raise ConnectionError("rpc down")
+
+    monkeypatch.setattr(st, "get_total_record", boom, raising=True)
+    with pytest.raises(ConnectionError):
+        st.refresh_admin_stats(stats)
+
+    snap = stats.snapshot()
+    assert snap["total_records"] == 42
+    assert snap["age_seconds"] == 5
+    assert snap["refresh_error"] == "rpc down"
+
+
+def test_refresher_runs_in_background(monkeypatch):
+    calls = []
+    monkeypatch.setattr(st, "refresh_admin_stats", lambda: calls.append(1), raising=True)
+
+    assert st.start_stats_refresher(interval=60) is st.start_stats_refresher(interval=60)
+    st.stop_stats_refresher()
+
+    assert calls == [1]
+
+
+def test_start_is_disabled_by_zero_interval(monkeypatch):
+    monkeypatch.setattr(st, "ADMIN_STATS_REFRESH", 0, raising=True)
+    assert st.start_stats_refresher() is None
@@ -0,0 +1,189 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+from bson.binary import Binary
+
+from backend.core import async_database as adb
+from backend.core import database as db
+from backend.core.mongo_store import AsyncMongoStore
+from backend.core.storage import export_query
+from conftest import FakeBulkResult
+
+
+class FakeAsyncCursor:
+    def __init__(self, docs):
+        self._docs = docs
+        self.sort_spec = None
+        self.batch = None
+
+    def sort(self, spec):
+        self.sort_spec = spec
+        return self
+
+    def batch_size(self, n):
+        self.batch = n
+        return self
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self._docs:
+            yield dict(doc)
+
+
+class FakeAsyncCollection:
+    def __init__(self, find_one_result=None, bulk_raises=False):
+        self._find_one_result = find_one_result
+        self._bulk_raises = bulk_raises
+        self.ops = []
+        self.last_filter = None
+        self.docs = []
+        self.cursor = None
+
+    def find(self, filt, projection=None):
+        self.last_filter = filt
+        self.cursor = FakeAsyncCursor(self.docs)
+        return self.cursor
+
+    async def find_one(self, filt, projection=None):
+        self.last_filter = filt
+        return self._find_one_result
+
+    async def bulk_write(self, ops, ordered=True):
+        if self._bulk_raises:
+            raise RuntimeError("bulk write failed!")
+        self.ops.extend(ops)
+        return FakeBulkResult(upserted=len(ops), modified=0)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    col = FakeAsyncCollection()
+
+    async def fake_get():
+        return AsyncMongoStore(col)
+
+    monkeypatch.setattr(adb, "get_store", fake_get, raising=True)
+    return col
+
+
+def test_no_uri_returns_none(monkeypatch, capsys):
+    monkeypatch.setattr(db, "MONGODB_URI", "", raising=True)
+    assert asyncio.run(adb.find_file_by_hash("ab" * 32)) is None
+    assert "MONGODB_URI not set" in capsys.readouterr().out
+
+
+def test_find_file_by_hash_decodes_binary(collection):
+    digest = "ab" * 32
+    collection._find_one_result = {"filename": "a.txt", "hash": bytes.fromhex(digest), "recordId": 1}
+
+    doc = asyncio.run(adb.find_file_by_hash(digest))
+
+    assert doc == {"filename": "a.txt", "hash": digest, "recordId": 1}
+    assert collection.last_filter == db.hash_query(digest)
+
+
+def test_upsert_hashes_one_unordered_bulk_write(collection):
+    rows = [("a.txt", "aa" * 32, 1), ("b.txt", "bb" * 32, 2, {"merkleRoot": "R"})]
+
+    assert asyncio.run(adb.upsert_hashes(rows)) == {"upserted": 2, "modified": 0}
+    assert [op._doc["$set"]["hash"] for op in collection.ops] == [Binary(b"\xaa" * 32), Binary(b"\xbb" * 32)]
+
+
+def test_upsert_replacing_a_hash_drops_the_old_cached_document(collection):
+    collection._find_one_result = {"filename": "a.txt", "hash": Binary(b"\xaa" * 32), "recordId": 1}
+    assert asyncio.run(adb.find_file_by_hash("aa" * 32))["filename"] == "a.txt"
+
+    asyncio.run(adb.upsert_hashes([("a.txt", "cc" * 32, 2)]))
+    collection._find_one_result = None
+
+    assert asyncio.run(adb.find_file_by_hash("aa" * 32)) is None
+
+
+def test_upsert_hashes_reports_errors(collection, capsys):
+    collection._bulk_raises = True
+    assert asyncio.run(adb.upsert_hashes([("a.txt", "aa" * 32, 1)]))["rejected"] == [0]
+    assert "Error writing to MongoDB" in capsys.readouterr().out
+
+
+def test_set_chain_metadata(collection):
+    assert asyncio.run(adb.set_chain_metadata([("a.txt", 5, 1700000000, "cc" * 32)])) == {"modified": 0}
+    (op,) = collection.ops
+    assert op._doc == {"$set": {"blockNumber": 5, "timestamp": 1700000000, "chainHash": "cc" * 32}}
+
+
+def test_iter_record_batches_reads_one_batched_cursor(collection):
+    collection.docs = [{"filename": f"{i}.txt", "hash": bytes([i]) * 32, "recordId": i} for i in range(5)]
+    after, until = datetime(2025, 1, 1), datetime(2025, 1, 2)
+
+    async def collect():
+        return [batch async for batch in adb.iter_record_batches(after, until, batch_size=2)]
+
+    batches = asyncio.run(collect())
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][1] == {"filename": "1.txt", "hash": "01" * 32, "recordId": 1}
+    assert collection.last_filter == {"recordId": {"$gt": -1}, "hashUpdatedAt": {"$gt": after, "$lte": until}}
+    assert collection.cursor.sort_spec == [("hashUpdatedAt", 1), ("filename", 1)]
+    assert collection.cursor.batch == 2
+
+
+def test_full_export_includes_documents_without_a_write_time():
+    until = datetime(2025, 1, 2)
+    assert export_query() == {"recordId": {"$gt": -1}}
+    assert export_query(None, until) == {"recordId": {"$gt": -1}, "hashUpdatedAt": {"$not": {"$gt": until}}}
+
+
+def test_client_is_per_event_loop(monkeypatch):
+    created = []
+
+    class FakeClient:
+        def __init__(self, uri, **kwargs):
+            self.kwargs = kwargs
+            self.closed = False
+            created.append(self)
+
+        async def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(adb, "AsyncMongoClient", FakeClient, raising=True)
+    monkeypatch.setattr(adb, "_client", None, raising=True)
+    monkeypatch.setattr(db, "MONGODB_MAX_POOL_SIZE", 9, raising=True)
+
+    async def twice():
+        return adb._get_client() is adb._get_client()
+
+    assert asyncio.run(twice()) is True
+    asyncio.run(twice())
+    assert len(created) == 2
+    assert created[0].kwargs["maxPoolSize"] == 9
+
+    asyncio.run(adb.close_database())
+    assert created[1].closed is True
+    assert adb._client is None
+
+
+def test_embedded_store_calls_leave_the_event_loop(monkeypatch):
+    from backend.core.sqlite_store import SQLiteStore
+    monkeypatch.setattr(db, "STORAGE_BACKEND", "sqlite", raising=True)
+    threads = []
+    for name in ("find_file_by_hash", "find_admin"):
+        original = getattr(SQLiteStore, name)
+
+        def record(self, *args, _original=original):
+            threads.append(threading.get_ident())
+            return _original(self, *args)
+
+        monkeypatch.setattr(SQLiteStore, name, record, raising=True)
+
+    async def run():
+        assert await adb.find_file_by_hash("ab" * 32) is None
+        assert await (await adb.get_admin_collection()).find_one({"username": "root"}) is None
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert len(threads) == 2 and loop_thread not in threads
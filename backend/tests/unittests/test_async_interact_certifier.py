@@ -0,0 +1,341 @@
+import asyncio
+import types
+import pytest
+from concurrent.futures import Future
+from backend.core import async_interact_certifier as aic
+from backend.core import interact_certifier as ic
+from conftest import FakeUpsertBuffer
+
+
+class _AsyncCallObj:
+    def __init__(self, value, delay=0):
+        self._value = value
+        self._delay = delay
+
+
+    async def call(self, block_identifier=None):
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        return self._value
+
+
+
+class _AsyncFunctions:
+    def __init__(self, retrieve_value=None, total_records=0, delay=0):
+        self._retrieve_value = retrieve_value
+        self._delay = delay
+        self.records = [(b"\x00" * 32, 0, 0)] * total_records
+
+
+    def retrieve(self, record_id):
+        return _AsyncCallObj(self._retrieve_value, self._delay)
+
+
+    def get_total_records(self):
+        return _AsyncCallObj(len(self.records), self._delay)
+
+
+    def hash_records(self, record_id):
+        return _AsyncCallObj(self.records[record_id])
+
+
+
+class _AsyncEth:
+    def __init__(self):
+        self.tx_count = 0
+        self.latest = 1
+
+
+    @property
+    def block_number(self):
+        async def _get():
+            return self.latest
+        return _get()
+
+
+    async def get_transaction_count(self, sender, block_identifier="latest"):
+        return self.tx_count
+
+
+
+class FakeAsyncContract:
+    def __init__(self, functions):
+        self.functions = functions
+        self.w3 = types.SimpleNamespace(eth=_AsyncEth())
+
+
+    def mine(self, hash_bytes):
+        """Record a store from our sender in a new block; returns (receipt, nonce)."""
+        eth = self.w3.eth
+        nonce = eth.tx_count
+        eth.tx_count += 1
+        eth.latest += 1
+        self.functions.records.append((hash_bytes, 1700000000 + nonce, eth.latest))
+        return {"status": 1, "blockNumber": eth.latest}, nonce
+
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    contract = FakeAsyncContract(_AsyncFunctions(total_records=3))
+
+    async def fake_connect():
+        return contract
+
+    def fake_submit(digest):
+        receipt, nonce = contract.mine(bytes.fromhex(digest))
+        fut = Future()
+        fut.set_result(("0xTX", receipt, nonce))
+        return fut
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+    monkeypatch.setattr(aic, "submit_anchor", fake_submit, raising=True)
+    monkeypatch.setattr(aic, "get_submitter", lambda: types.SimpleNamespace(sender="0xMY"), raising=True)
+    monkeypatch.setattr(aic, "get_upsert_buffer", FakeUpsertBuffer, raising=True)
+    monkeypatch.setattr(ic, "_record_offset", None, raising=True)
+    return contract
+
+
+
+# ------------------------------- connect_contract ----------------------------
+def test_connect_contract_is_per_event_loop(monkeypatch):
+    config = ("http://rpc.test", "0xMY", [], "0x" + "11" * 20)
+    monkeypatch.setattr(aic, "get_config", lambda fname: config, raising=True)
+    monkeypatch.setattr(aic, "_contract", None, raising=True)
+    monkeypatch.setattr(aic, "_contract_loop", None, raising=True)
+    monkeypatch.setattr(aic, "ASYNC_RPC_TIMEOUT", 4, raising=True)
+
+    async def twice():
+        return await aic.connect_contract(), await aic.connect_contract()
+
+    first, again = asyncio.run(twice())
+    assert first is again
+    assert first.w3.provider._request_kwargs["timeout"].total == 4
+
+    second, _ = asyncio.run(twice())
+    assert second is not first
+    asyncio.run(aic.close_contract())
+    assert aic._contract is None
+
+
+
+def test_connect_contract_follows_reload_contract(monkeypatch):
+    built, disconnected = [], []
+
+    class _Provider:
+        async def disconnect(self):
+            disconnected.append(self)
+
+    def fake_build():
+        built.append(types.SimpleNamespace(w3=types.SimpleNamespace(provider=_Provider())))
+        return built[-1]
+
+    monkeypatch.setattr(aic, "_build_contract", fake_build, raising=True)
+    monkeypatch.setattr(aic, "_contract", None, raising=True)
+    monkeypatch.setattr(aic, "_contract_loop", None, raising=True)
+    monkeypatch.setattr(ic, "_build_contract", lambda: object(), raising=True)
+    monkeypatch.setattr(ic, "_contract_generation", 0, raising=True)
+
+    async def run():
+        first = await aic.connect_contract()
+        assert await aic.connect_contract() is first
+        ic.reload_contract()
+        return first, await aic.connect_contract()
+
+    first, reloaded = asyncio.run(run())
+
+    assert reloaded is not first
+    assert disconnected == [first.w3.provider]
+
+
+
+# -------------------------------- reads -------------------------------------
+def test_retrieve_record_converts_bytes_to_hex(monkeypatch):
+    contract = FakeAsyncContract(_AsyncFunctions(retrieve_value=(bytes.fromhex("12" * 32), 123, 456)))
+
+    async def fake_connect():
+        return contract
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+
+    assert asyncio.run(aic.retrieve_record(3)) == ("12" * 32, 123, 456)
+
+
+
+def test_retrieve_record_is_cached(monkeypatch):
+    connects = []
+
+    async def fake_connect():
+        connects.append(True)
+        return FakeAsyncContract(_AsyncFunctions(retrieve_value=(bytes.fromhex("34" * 32), 5, 6)))
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+
+    assert asyncio.run(aic.retrieve_record(8)) == asyncio.run(aic.retrieve_record(8)) == ("34" * 32, 5, 6)
+    assert len(connects) == 1
+
+
+
+def test_get_total_record_times_out(monkeypatch):
+    contract = FakeAsyncContract(_AsyncFunctions(total_records=4, delay=1))
+
+    async def fake_connect():
+        return contract
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+    monkeypatch.setattr(aic, "ASYNC_RPC_TIMEOUT", 0.01, raising=True)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(aic.get_total_record())
+
+
+
+def test_slow_read_does_not_block_other_tasks(monkeypatch):
+    contract = FakeAsyncContract(_AsyncFunctions(total_records=4, delay=0.2))
+
+    async def fake_connect():
+        return contract
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+    order = []
+
+    async def slow():
+        await aic.get_total_record()
+        order.append("slow")
+
+    async def fast():
+        await asyncio.sleep(0.01)
+        order.append("fast")
+
+    async def both():
+        await asyncio.gather(slow(), fast())
+
+    asyncio.run(both())
+    assert order == ["fast", "slow"]
+
+
+
+# -------------------------------- anchoring ---------------------------------
+def test_store_digest_returns_record_from_receipt(chain, monkeypatch):
+    buffer = FakeUpsertBuffer()
+    monkeypatch.setattr(aic, "get_upsert_buffer", lambda: buffer, raising=True)
+
+    result = asyncio.run(aic.store_digest("a.txt", "ef" * 32))
+
+    assert result == (3, "ef" * 32, "0xTX", 2, 1700000000)
+    assert buffer.rows == [("a.txt", "ef" * 32, 3, {"blockNumber": 2, "timestamp": 1700000000, "chainHash": "ef" * 32})]
+    # The offset is shared with the synchronous API.
+    assert ic.predicted_record_id(1) == 4
+
+
+
+def test_store_digest_returns_existing_record_without_anchoring(chain, monkeypatch):
+    existing = {"filename": "old.txt", "hash": "ef" * 32, "recordId": 1}
+
+    async def fake_find(digest):
+        return existing
+
+    monkeypatch.setattr(aic, "find_file_by_hash", fake_find, raising=True)
+
+    with pytest.raises(aic.DigestAlreadyStored) as e:
+        asyncio.run(aic.store_digest("new.txt", "ef" * 32))
+    assert e.value.doc == existing
+    assert len(chain.functions.records) == 3
+
+
+
+def test_store_digest_raises_when_row_is_rejected(chain, monkeypatch):
+    buffer = FakeUpsertBuffer(RuntimeError("duplicate key"))
+    monkeypatch.setattr(aic, "get_upsert_buffer", lambda: buffer, raising=True)
+
+    with pytest.raises(RuntimeError, match="duplicate key"):
+        asyncio.run(aic.store_digest("a.txt", "ef" * 32))
+
+
+
+def test_anchor_digest_rebases_after_foreign_write(chain):
+    assert asyncio.run(aic.anchor_digest("01" * 32))[0] == 3
+    chain.w3.eth.latest += 1
+    chain.functions.records.append((b"\xff" * 32, 0, chain.w3.eth.latest))
+
+    assert asyncio.run(aic.anchor_digest("02" * 32))[0] == 5
+    assert ic.predicted_record_id(2) == 6
+
+
+
+# -------------------------------- retrieve_records ---------------------------
+class _AsyncBatch:
+    def __init__(self, sizes):
+        self._sizes = sizes
+        self._calls = []
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+    def add(self, call_obj):
+        self._calls.append(call_obj)
+
+
+    async def async_execute(self):
+        self._sizes.append(len(self._calls))
+        return [await c.call() for c in self._calls]
+
+
+
+class _AsyncRecordFunctions:
+    def __init__(self, bad=(), short=()):
+        self.bad = set(bad)
+        self.short = set(short)
+
+
+    def retrieve(self, record_id):
+        bad = record_id in self.bad
+        size = 31 if record_id in self.short else 32
+
+        class _Call:
+            async def call(self, block_identifier=None):
+                if bad:
+                    raise RuntimeError("execution reverted")
+                return bytes([record_id]) * size, 100 + record_id, 1000 + record_id
+
+        return _Call()
+
+
+
+def test_retrieve_records_batches_and_isolates_bad_ids(monkeypatch):
+    contract = FakeAsyncContract(_AsyncRecordFunctions(bad={2}))
+    sizes = []
+    contract.w3.batch_requests = lambda: _AsyncBatch(sizes)
+
+    async def fake_connect():
+        return contract
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+
+    got = asyncio.run(aic.retrieve_records([0, 1, 2, 3, 4], batch_size=2))
+
+    assert sizes == [2, 2, 1]
+    assert got[2] is None
+    assert [g[1] for g in got if g] == [100, 101, 103, 104]
+
+
+
+def test_retrieve_records_returns_none_for_undecodable_record(monkeypatch):
+    contract = FakeAsyncContract(_AsyncRecordFunctions(short={1}))
+    contract.w3.batch_requests = lambda: _AsyncBatch([])
+
+    async def fake_connect():
+        return contract
+
+    monkeypatch.setattr(aic, "connect_contract", fake_connect, raising=True)
+
+    got = asyncio.run(aic.retrieve_records([0, 1, 2]))
+
+    assert got[1] is None
+    assert [g[1] for g in got if g] == [100, 102]
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.core import auth
+
+
+@pytest.fixture(autouse=True)
+def fresh_executor(monkeypatch):
+    monkeypatch.setattr(auth, "_executor", None, raising=True)
+    yield
+    auth.close_auth_executor()
+
+
+class FakeAdmins:
+    def __init__(self, doc):
+        self.doc = doc
+        self.reads = 0
+
+    async def find_one(self, filt):
+        self.reads += 1
+        return self.doc
+
+
+def test_run_auth_uses_the_pool():
+    name = asyncio.run(auth.run_auth(lambda: threading.current_thread().name))
+    assert name.startswith("auth")
+
+
+def test_run_auth_inline_when_disabled(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_WORKERS", 0, raising=True)
+    name = asyncio.run(auth.run_auth(lambda: threading.current_thread().name))
+    assert name == threading.current_thread().name
+
+
+def test_run_auth_is_bounded_and_keeps_the_loop_free(monkeypatch):
+    monkeypatch.setattr(auth, "AUTH_WORKERS", 2, raising=True)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    async def run():
+        ticks = 0
+        jobs = asyncio.gather(*(auth.run_auth(work) for _ in range(6)))
+        while not jobs.done():
+            ticks += 1
+            await asyncio.sleep(0.005)
+        return ticks
+
+    assert asyncio.run(run()) > 10  # the loop kept running while the pool worked
+    assert peak[0] == 2
+
+
+def test_find_admin_reads_through_cache():
+    admins = FakeAdmins({"username": "root", "is_active": True})
+
+    first = asyncio.run(auth.find_admin(admins, "root"))
+    first["is_active"] = False
+    second = asyncio.run(auth.find_admin(admins, "root"))
+
+    assert admins.reads == 1
+    assert second["is_active"] is True  # callers get copies
+
+
+def test_unknown_admin_is_cached_until_invalidated():
+    admins = FakeAdmins(None)
+    assert asyncio.run(auth.find_admin(admins, "new")) is None
+    admins.doc = {"username": "new"}
+    assert asyncio.run(auth.find_admin(admins, "new")) is None
+
+    auth.invalidate_admin("new")
+
+    assert asyncio.run(auth.find_admin(admins, "new")) == {"username": "new"}
+    assert admins.reads == 2
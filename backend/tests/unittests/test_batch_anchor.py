@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from backend.core import batch_anchor as ba
+from backend.core.merkle import verify_proof
+from conftest import FakeUpsertBuffer
+
+
+def _install_fakes(monkeypatch, fail=False, stored=None, rejected=()):
+    buffer = FakeUpsertBuffer(RuntimeError("duplicate key"), rejected=rejected)
+    calls = {"anchored": [], "upserts": buffer.rows}
+
+    def fake_anchor_digest(root):
+        if fail:
+            raise RuntimeError("rpc down")
+        calls["anchored"].append(root)
+        return len(calls["anchored"]) - 1, "0xTX", 7, 1700000000
+
+    monkeypatch.setattr(ba, "anchor_digest", fake_anchor_digest, raising=True)
+    monkeypatch.setattr(ba, "get_upsert_buffer", lambda: buffer, raising=True)
+    monkeypatch.setattr(ba, "find_file_by_hash", lambda digest: (stored or {}).get(digest), raising=True)
+    return calls
+
+
+def test_anchor_batch_sends_one_root(monkeypatch):
+    calls = _install_fakes(monkeypatch)
+    digests = [f"{i:064x}" for i in range(5)]
+
+    anchor, root, proofs = ba.anchor_batch(digests)
+
+    assert calls["anchored"] == [root]
+    assert anchor == (0, "0xTX", 7, 1700000000)
+    assert all(verify_proof(d, p, root) for d, p in zip(digests, proofs))
+
+
+def test_batcher_flushes_on_size(monkeypatch):
+    calls = _install_fakes(monkeypatch)
+    batcher = ba.MerkleBatcher(max_size=3, max_wait=60)
+    futures = [batcher.submit(f"f{i}", f"{i:064x}") for i in range(3)]
+
+    results = [f.result(timeout=5) for f in futures]
+    batcher.close()
+
+    assert len(calls["anchored"]) == 1
+    assert [r[0] for r in results] == [0, 0, 0]
+    rows = calls["upserts"]
+    assert [r[0] for r in rows] == ["f0", "f1", "f2"]
+    assert all(r[3]["merkleRoot"] == calls["anchored"][0] for r in rows)
+    assert all(verify_proof(r[1], r[3]["merkleProof"], r[3]["merkleRoot"]) for r in rows)
+
+
+def test_batcher_flushes_on_deadline(monkeypatch):
+    calls = _install_fakes(monkeypatch)
+    batcher = ba.MerkleBatcher(max_size=100, max_wait=0.05)
+
+    fut = batcher.submit("a", "ab" * 32)
+    assert fut.result(timeout=5) == (0, "ab" * 32, "0xTX", 7, 1700000000)
+    batcher.close()
+    assert len(calls["anchored"]) == 1
+
+
+def test_batcher_close_flushes_pending(monkeypatch):
+    calls = _install_fakes(monkeypatch)
+    batcher = ba.MerkleBatcher(max_size=100, max_wait=60)
+    fut = batcher.submit("a", "ab" * 32)
+
+    batcher.close()
+
+    assert fut.done()
+    assert len(calls["anchored"]) == 1
+    with pytest.raises(RuntimeError):
+        batcher.submit("b", "cd" * 32)
+
+
+def test_batcher_failure_propagates_to_futures(monkeypatch):
+    _install_fakes(monkeypatch, fail=True)
+    batcher = ba.MerkleBatcher(max_size=2, max_wait=60)
+    futures = [batcher.submit("a", "ab" * 32), batcher.submit("b", "cd" * 32)]
+
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=5)
+    batcher.close()
+
+
+def test_batcher_does_not_reanchor_stored_digests(monkeypatch):
+    existing = {"filename": "old.txt", "hash": "ab" * 32, "recordId": 4}
+    calls = _install_fakes(monkeypatch, stored={"ab" * 32: existing})
+    batcher = ba.MerkleBatcher(max_size=3, max_wait=60)
+    stored, fresh, repeat = batcher.submit("new.txt", "ab" * 32), batcher.submit("b", "cd" * 32), batcher.submit("c", "cd" * 32)
+
+    with pytest.raises(ba.DigestAlreadyStored) as e:
+        stored.result(timeout=5)
+    assert e.value.doc == existing
+    assert fresh.result(timeout=5)[0] == 0
+    with pytest.raises(ba.DigestAlreadyStored) as e:
+        repeat.result(timeout=5)
+    assert e.value.doc["filename"] == "b"
+    batcher.close()
+
+    assert len(calls["anchored"]) == 1
+    assert [r[0] for r in calls["upserts"]] == ["b"]
+
+
+def test_batcher_rejected_row_fails_its_future(monkeypatch):
+    _install_fakes(monkeypatch, rejected={"a"})
+    batcher = ba.MerkleBatcher(max_size=2, max_wait=60)
+    rejected, ok = batcher.submit("a", "ab" * 32), batcher.submit("b", "cd" * 32)
+
+    with pytest.raises(RuntimeError, match="duplicate key"):
+        rejected.result(timeout=5)
+    assert ok.result(timeout=5)[0] == 0
+    batcher.close()
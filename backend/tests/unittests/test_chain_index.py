@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+
+from backend.core import chain_index as ci
+
+
+def _h(i):
+    return f"{i:064x}"
+
+
+class FakeChain:
+    """Records 0..n-1 with hash _h(i); IDs in `bad` can't be read."""
+    def __init__(self, n, bad=()):
+        self.n = n
+        self.bad = set(bad)
+        self.reads = []
+
+    def total(self):
+        return self.n
+
+    def retrieve_records(self, ids, batch_size=None):
+        self.reads.append(list(ids))
+        return [None if i in self.bad else (_h(i), 100 + i, 1700000000 + i) for i in ids]
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    fake = FakeChain(0)
+    monkeypatch.setattr(ci, "get_total_record", fake.total, raising=True)
+    monkeypatch.setattr(ci, "retrieve_records", fake.retrieve_records, raising=True)
+    return fake
+
+
+def test_index_lookup_and_checkpoint(tmp_path):
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+    assert index.checkpoint() == 0
+    index.add([(0, _h(5), 10, 1), (1, _h(6), 11, 2), (2, _h(5), 12, 3)])
+
+    assert index.checkpoint() == 3
+    assert len(index) == 3
+    assert index.lookup(_h(5)) == [(0, 10, 1), (2, 12, 3)]
+    assert index.lookup(_h(7)) == []
+    index.close()
+
+
+def test_sync_once_reads_in_chunks_and_resumes(chain, monkeypatch, tmp_path):
+    monkeypatch.setattr(ci, "CHAIN_INDEX_CHUNK", 4, raising=True)
+    chain.n = 10
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+
+    assert ci.sync_once(index) == 10
+    assert chain.reads == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    index.close()
+
+    # A restart reopens the file and only fetches what is new.
+    chain.n = 12
+    chain.reads = []
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+    assert ci.sync_once(index) == 2
+    assert chain.reads == [[10, 11]]
+    assert index.lookup(_h(11)) == [(11, 111, 1700000011)]
+    index.close()
+
+
+def test_sync_once_stops_at_unreadable_record(chain, tmp_path):
+    chain.n = 6
+    chain.bad = {3}
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+
+    assert ci.sync_once(index) == 3
+    assert index.checkpoint() == 3
+
+    chain.bad = set()
+    assert ci.sync_once(index) == 3
+    assert len(index) == 6
+    index.close()
+
+
+def test_sync_once_skips_permanently_unreadable_record(chain, monkeypatch, tmp_path):
+    monkeypatch.setattr(ci, "CHAIN_INDEX_MAX_FAILURES", 2, raising=True)
+    chain.n = 6
+    chain.bad = {3}
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+
+    assert ci.sync_once(index) == 3
+    assert ci.sync_once(index) == 2
+
+    assert index.checkpoint() == 6
+    assert index.skipped() == [3]
+    assert index.lookup(_h(3)) == []
+    chain.n = 7
+    assert ci.sync_once(index) == 1
+    index.close()
+
+
+def test_sync_once_outage_does_not_skip(chain, monkeypatch, tmp_path):
+    monkeypatch.setattr(ci, "CHAIN_INDEX_MAX_FAILURES", 1, raising=True)
+    chain.n = 4
+    chain.bad = {0, 1, 2, 3}
+    index = ci.ChainIndex(str(tmp_path / "i.db"))
+
+    for _ in range(3):
+        assert ci.sync_once(index) == 0
+    assert index.checkpoint() == 0 and index.skipped() == []
+    index.close()
+
+
+def test_find_anchored_does_not_create_index(tmp_path):
+    assert ci.find_anchored(_h(1)) is None
+    assert not (tmp_path / "chain_index.db").exists()
+
+    ci.get_chain_index().add([(4, _h(1), 40, 400)])
+    assert ci.find_anchored(_h(1)) == (4, 40, 400)
+
+
+def test_indexer_runs_in_background_and_stops(chain, monkeypatch):
+    chain.n = 3
+    synced = threading.Event()
+    real_sync = ci.sync_once
+
+    def sync_and_signal(index):
+        added = real_sync(index)
+        synced.set()
+        return added
+
+    monkeypatch.setattr(ci, "sync_once", sync_and_signal, raising=True)
+    ci.start_indexer(interval=60)
+    assert synced.wait(5)
+    ci.stop_indexer()
+
+    assert len(ci.get_chain_index()) == 3
+
+
+def test_sync_failure_is_logged(monkeypatch, capsys):
+    def boom():
+        raise RuntimeError("rpc down")
+
+    monkeypatch.setattr(ci, "get_total_record", boom, raising=True)
+    ci.start_indexer(interval=60)
+    ci.stop_indexer()
+
+    assert "Chain index sync failed: rpc down" in capsys.readouterr().out
@@ -1,17 +1,15 @@
 import types
 import pytest
+from bson.binary import Binary
 
 from backend.core import database as db
+from backend.core import storage
+from backend.core.mongo_store import MongoStore
+from conftest import FakeBulkResult
 
 # ----------------------------
 # Fakes for Mongo behavior
 # ----------------------------
-class FakeBulkResult:
-    def __init__(self, upserted=0, modified=0):
-        self.upserted_count = upserted
-        self.modified_count = modified
-
-
 class FakeCollection:
     def __init__(self, find_one_result=None, bulk_result=None, bulk_raises=False):
         self._create_index_called = False
@@ -21,13 +19,15 @@ class FakeCollection:
 
     def create_index(self, *args, **kwargs):
         self._create_index_called = True
+        self.indexes = getattr(self, "indexes", []) + [args[0]]
 
     def bulk_write(self, ops, ordered=False):
         if self._bulk_raises:
             raise RuntimeError("bulk write failed!")
         return self._bulk_result
 
-    def find_one(self, filt):
+    def find_one(self, filt, projection=None):
+        self.last_filter = filt
         return self._find_one_result
 
 
@@ -48,6 +48,9 @@ class FakeClientAny:
     def __getitem__(self, _dbname):
         return self._db
 
+    def close(self):
+        self.closed = True
+
 
 class FakeUpdateOne:
     def __init__(self, filter_doc, update_doc, upsert=False):
@@ -56,6 +59,18 @@ class FakeUpdateOne:
         self.upsert = upsert
 
 
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    """Each test starts without the process-wide client."""
+    monkeypatch.setattr(db, "_client", None, raising=True)
+    monkeypatch.setattr(db, "_store", None, raising=True)
+
+
+def use_collection(monkeypatch, col):
+    """Serve the database functions from a MongoStore over `col` (no database when None)."""
+    monkeypatch.setattr(db, "get_store", lambda: None if col is None else MongoStore(col), raising=True)
+
+
 # ----------------------------
 # get_mongo_collection tests
 # ----------------------------
@@ -72,7 +87,7 @@ def test_get_mongo_collection_no_uri(monkeypatch, capsys):
 def test_get_mongo_collection_success(monkeypatch):
     fake_col = FakeCollection()
     monkeypatch.setattr(db, "MONGODB_URI", "mongodb://fake", raising=True)
-    monkeypatch.setattr(db, "MongoClient", lambda uri: FakeClientAny(fake_col), raising=True)
+    monkeypatch.setattr(db, "MongoClient", lambda uri, **kw: FakeClientAny(fake_col), raising=True)
 
     col = db.get_mongo_collection()
     assert isinstance(col, FakeCollection)
@@ -82,7 +97,7 @@ def test_get_mongo_collection_success(monkeypatch):
 def test_get_mongo_collection_failure(monkeypatch, capsys):
     monkeypatch.setattr(db, "MONGODB_URI", "mongodb://bad", raising=True)
 
-    def _boom(_): 
+    def _boom(_, **kw):
         raise RuntimeError("cannot connect")
 
     monkeypatch.setattr(db, "MongoClient", _boom, raising=True)
@@ -92,19 +107,59 @@ def test_get_mongo_collection_failure(monkeypatch, capsys):
     assert "MongoDB connection failed" in out
 
 
+def test_client_is_created_once_with_pool_settings(monkeypatch):
+    fake_col = FakeCollection()
+    calls = []
+
+    def _client(uri, **kw):
+        calls.append(kw)
+        return FakeClientAny(fake_col)
+
+    monkeypatch.setattr(db, "MONGODB_URI", "mongodb://fake", raising=True)
+    monkeypatch.setattr(db, "MONGODB_MAX_POOL_SIZE", 7, raising=True)
+    monkeypatch.setattr(db, "MongoClient", _client, raising=True)
+
+    assert db.init_database() is True
+    for _ in range(3):
+        db.get_mongo_collection()
+        db.get_admin_collection()
+
+    assert len(calls) == 1
+    assert calls[0]["maxPoolSize"] == 7
+    assert "serverSelectionTimeoutMS" in calls[0]
+    assert fake_col.indexes == ["filename", "hashUpdatedAt", [("hashUpdatedAt", 1), ("filename", 1)], "username", "hash"]  # once, at init
+
+
+def test_failed_init_is_retried_and_close_resets(monkeypatch):
+    fake_col = FakeCollection()
+    client = FakeClientAny(fake_col)
+    monkeypatch.setattr(db, "MONGODB_URI", "mongodb://fake", raising=True)
+    monkeypatch.setattr(db, "MongoClient", lambda uri, **kw: client, raising=True)
+    monkeypatch.setattr(fake_col, "create_index", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("down")))
+
+    assert db.get_mongo_collection() is None
+
+    monkeypatch.setattr(fake_col, "create_index", lambda *a, **k: None)
+    assert db.get_mongo_collection() is fake_col
+
+    db.close_database()
+    assert client.closed is True
+    assert db._client is None
+
+
 # ----------------------------
 # upsert_hashes tests
 # ----------------------------
 def test_upsert_hashes_no_collection(monkeypatch):
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: None, raising=True)
+    use_collection(monkeypatch, None)
     result = db.upsert_hashes([("a.txt", "H1", 3)])
     assert result is None
 
 
 def test_upsert_hashes_empty_data(monkeypatch):
     fake_col = FakeCollection()
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: fake_col, raising=True)
-    monkeypatch.setattr(db, "UpdateOne", FakeUpdateOne, raising=True)
+    use_collection(monkeypatch, fake_col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
     result = db.upsert_hashes([])
     assert result is None
 
@@ -112,22 +167,22 @@ def test_upsert_hashes_empty_data(monkeypatch):
 def test_upsert_hashes_success(monkeypatch):
     fake_result = FakeBulkResult(upserted=2, modified=1)
     fake_col = FakeCollection(bulk_result=fake_result)
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: fake_col, raising=True)
-    monkeypatch.setattr(db, "UpdateOne", FakeUpdateOne, raising=True)
+    use_collection(monkeypatch, fake_col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
 
-    data = [("a.txt", "HASH_A", 10), ("b.txt", "HASH_B", 11)]
+    data = [("a.txt", "aa" * 32, 10), ("b.txt", "bb" * 32, 11)]
     result = db.upsert_hashes(data)
     assert result == {"upserted": 2, "modified": 1}
 
 
 def test_upsert_hashes_bulkwrite_exception(monkeypatch, capsys):
     fake_col = FakeCollection(bulk_raises=True)
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: fake_col, raising=True)
-    monkeypatch.setattr(db, "UpdateOne", FakeUpdateOne, raising=True)
+    use_collection(monkeypatch, fake_col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
 
-    res = db.upsert_hashes([("a.txt", "H", 99)])
+    res = db.upsert_hashes([("a.txt", "ab" * 32, 99)])
     out = capsys.readouterr().out
-    assert res is None
+    assert res == {"upserted": 0, "modified": 0, "rejected": [0]}
     assert "Error writing to MongoDB" in out
 
 
@@ -135,14 +190,252 @@ def test_upsert_hashes_bulkwrite_exception(monkeypatch, capsys):
 # find_file_by_hash tests
 # ----------------------------
 def test_find_file_by_hash_no_collection(monkeypatch):
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: None, raising=True)
+    use_collection(monkeypatch, None)
     assert db.find_file_by_hash("X") is None
 
 
 def test_find_file_by_hash_found(monkeypatch):
-    expected = {"filename": "z.txt", "hash": "Z_HASH", "recordId": 42}
-    fake_col = FakeCollection(find_one_result=expected)
-    monkeypatch.setattr(db, "get_mongo_collection", lambda: fake_col, raising=True)
+    digest = "ab" * 32
+    stored = {"filename": "z.txt", "hash": bytes.fromhex(digest), "recordId": 42}
+    fake_col = FakeCollection(find_one_result=stored)
+    use_collection(monkeypatch, fake_col)
+
+    got = db.find_file_by_hash(digest)
+    assert got == {"filename": "z.txt", "hash": digest, "recordId": 42}
+    assert fake_col.last_filter == {"hash": {"$in": [Binary(bytes.fromhex(digest)), digest]}}
+
+
+def test_find_file_by_hash_unmigrated_document(monkeypatch):
+    digest = "cd" * 32
+    fake_col = FakeCollection(find_one_result={"filename": "y.txt", "hash": digest, "recordId": 1})
+    use_collection(monkeypatch, fake_col)
+
+    assert db.find_file_by_hash(digest)["hash"] == digest
+
+
+def test_upsert_hashes_sets_extra_fields(monkeypatch):
+    fake_col = FakeCollection(bulk_result=FakeBulkResult(upserted=1))
+    captured = {}
+
+    def capture(ops, ordered=False):
+        captured["ops"] = ops
+        return fake_col._bulk_result
+
+    fake_col.bulk_write = capture
+    use_collection(monkeypatch, fake_col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+
+    db.upsert_hashes([("a.txt", "aa" * 32, 4, {"merkleRoot": "R", "merkleProof": []}), ("b.txt", "bb" * 32, 5)])
+
+    first, second = captured["ops"]
+    assert first.update_doc["$set"] == {
+        "filename": "a.txt", "hash": Binary(b"\xaa" * 32), "recordId": 4, "merkleRoot": "R", "merkleProof": []
+    }
+    assert second.update_doc["$set"] == {"filename": "b.txt", "hash": Binary(b"\xbb" * 32), "recordId": 5}
+    assert second.update_doc["$currentDate"] == {"hashUpdatedAt": True}
+
+
+# ----------------------------
+# chain metadata tests
+# ----------------------------
+def test_set_chain_metadata_updates_without_upsert(monkeypatch):
+    fake_col = FakeCollection(bulk_result=FakeBulkResult(modified=1))
+    captured = {}
+
+    def capture(ops, ordered=False):
+        captured["ops"] = ops
+        return fake_col._bulk_result
+
+    fake_col.bulk_write = capture
+    use_collection(monkeypatch, fake_col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+
+    assert db.set_chain_metadata([("a.txt", 12, 1700000000, "H")]) == {"modified": 1}
+    (op,) = captured["ops"]
+    assert op.filter_doc == {"filename": "a.txt"}
+    assert op.update_doc == {"$set": {"blockNumber": 12, "timestamp": 1700000000, "chainHash": "H"}}
+    assert op.upsert is False
+
+
+def test_find_missing_chain_metadata(monkeypatch):
+    fake_col = FakeCollection()
+    seen = {}
+
+    def fake_find(filt, projection):
+        seen["filter"] = filt
+        return iter([{"filename": "a.txt", "recordId": 3}])
+
+    fake_col.find = fake_find
+    use_collection(monkeypatch, fake_col)
+
+    assert db.find_missing_chain_metadata() == [("a.txt", 3)]
+    assert seen["filter"] == {"chainHash": {"$exists": False}}
+
+
+# ----------------------------
+# binary hash migration tests
+# ----------------------------
+class MigratingCollection(FakeCollection):
+    def __init__(self, docs, indexes, duplicates=()):
+        super().__init__()
+        self.docs = docs
+        self.index_info = indexes
+        self.duplicates = list(duplicates)
+        self.dropped = []
+        self.writes = []
+
+    def find(self, filt, projection):
+        return iter([d for d in self.docs if isinstance(d["hash"], str)])
+
+    def bulk_write(self, ops, ordered=False):
+        self.writes.append(ops)
+        return FakeBulkResult(modified=len(ops))
+
+    def index_information(self):
+        return self.index_info
+
+    def drop_index(self, name):
+        self.dropped.append(name)
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        return iter(self.duplicates)
+
+
+def test_migrate_hashes_to_binary_converts_and_indexes(monkeypatch):
+    docs = [{"_id": i, "hash": f"{i:02x}" * 32} for i in range(3)] + [{"_id": 9, "hash": b"\x09" * 32}]
+    col = MigratingCollection(docs, {"hash_1": {"key": [("hash", 1)]}})
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(db, "UpdateOne", FakeUpdateOne, raising=True)
+
+    assert db.migrate_hashes_to_binary(batch_size=2) == {"converted": 3, "unique_index": True}
+    assert [len(ops) for ops in col.writes] == [2, 1]
+    assert col.writes[1][0].update_doc == {"$set": {"hash": Binary(b"\x02" * 32)}}
+    assert col.dropped == ["hash_1"]
+    assert col.indexes == ["hash"]
+
+
+def test_migrate_hashes_reports_duplicates(monkeypatch, capsys):
+    dup = {"_id": b"\x01" * 32, "files": ["a.txt", "b.txt"], "count": 2}
+    col = MigratingCollection([], {"hash_1": {"unique": True}}, duplicates=[dup])
+    use_collection(monkeypatch, col)
+
+    assert db.migrate_hashes_to_binary() == {"converted": 0, "unique_index": False}
+    assert col.dropped == []
+    assert "a.txt, b.txt" in capsys.readouterr().out
+
+
+# ----------------------------
+# write-behind upsert buffer tests
+# ----------------------------
+class RecordingCollection(FakeCollection):
+    def __init__(self, raises=None):
+        super().__init__()
+        self.calls = []
+        self.raises = raises
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls.append((ops, ordered))
+        if self.raises:
+            raise self.raises
+        return FakeBulkResult(upserted=len(ops))
+
+
+def test_upsert_buffer_coalesces_into_one_bulk_write(monkeypatch):
+    col = RecordingCollection()
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+    buf = db.UpsertBuffer(max_size=100, max_wait=60)
+    try:
+        futs = [buf.submit((f"{i}.txt", "aa" * 32, i)) for i in range(3)]
+        futs.append(buf.submit(("0.txt", "aa" * 32, 0, {"blockNumber": 5})))
+        assert buf.pending() == 3
+        buf.flush()
+    finally:
+        buf.close()
+
+    assert [f.result(timeout=1) for f in futs] == [True] * 4
+    ((ops, ordered),) = col.calls
+    assert ordered is False
+    assert [op.filter_doc for op in ops] == [{"filename": "0.txt"}, {"filename": "1.txt"}, {"filename": "2.txt"}]
+    assert ops[0].update_doc["$set"]["blockNumber"] == 5
+
+
+def test_upsert_buffer_flushes_on_size_and_deadline(monkeypatch):
+    col = RecordingCollection()
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+
+    buf = db.UpsertBuffer(max_size=2, max_wait=60)
+    futs = [buf.submit((f"{i}.txt", "aa" * 32, i)) for i in range(2)]
+    assert [f.result(timeout=2) for f in futs] == [True, True]
+    buf.close()
+
+    buf = db.UpsertBuffer(max_size=100, max_wait=0.01)
+    assert buf.submit(("late.txt", "bb" * 32, 9)).result(timeout=2) is True
+    buf.close()
+    assert [len(ops) for ops, _ in col.calls] == [2, 1]
+
+
+def test_upsert_buffer_fails_only_rejected_rows(monkeypatch):
+    error = db.BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "E11000 duplicate key"}]})
+    col = RecordingCollection(raises=error)
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+    buf = db.UpsertBuffer(max_size=100, max_wait=60)
+    ok = buf.submit(("a.txt", "aa" * 32, 1))
+    dup = buf.submit(("b.txt", "aa" * 32, 2))
+    buf.close()
+
+    assert ok.result(timeout=1) is True
+    with pytest.raises(RuntimeError, match="duplicate key"):
+        dup.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        buf.submit(("c.txt", "cc" * 32, 3))
+
+
+def test_close_upsert_buffer_flushes_pending(monkeypatch):
+    col = RecordingCollection()
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+    monkeypatch.setattr(db, "MONGODB_WRITE_WINDOW", 60, raising=True)
+    monkeypatch.setattr(db, "_buffer", None, raising=True)
+
+    fut = db.get_upsert_buffer().submit(("a.txt", "aa" * 32, 1))
+    db.close_upsert_buffer()
+
+    assert fut.result(timeout=1) is True
+    assert db._buffer is None
+
+
+# ----------------------------
+# read-through cache tests
+# ----------------------------
+def test_find_file_by_hash_is_cached_until_upsert(monkeypatch):
+    digest = "ab" * 32
+    col = RecordingCollection()
+    lookups = []
+
+    def find_one(filt, projection=None):
+        lookups.append(filt)
+        return None
+
+    col.find_one = find_one
+    use_collection(monkeypatch, col)
+    monkeypatch.setattr(storage, "UpdateOne", FakeUpdateOne, raising=True)
+
+    assert db.find_file_by_hash(digest) is None
+    assert db.find_file_by_hash(digest) is None
+    assert len(lookups) == 1
+
+    db.upsert_hashes([("a.txt", digest, 1)])
+    db.find_file_by_hash(digest)
+    assert len(lookups) == 2
+
+
+def test_cached_document_is_a_copy(monkeypatch):
+    digest = "cd" * 32
+    fake_col = FakeCollection(find_one_result={"filename": "a.txt", "hash": bytes.fromhex(digest), "recordId": 1})
+    use_collection(monkeypatch, fake_col)
 
-    got = db.find_file_by_hash("Z_HASH")
-    assert got == expected
+    db.find_file_by_hash(digest)["recordId"] = 99
+    assert db.find_file_by_hash(digest)["recordId"] == 1
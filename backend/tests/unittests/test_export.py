@@ -0,0 +1,48 @@
+import asyncio
+import csv
+import io
+import json
+
+from backend.core import export as ex
+
+A = "aa" * 32
+DOCS = [
+    {"filename": "a.txt", "hash": A, "recordId": 1, "blockNumber": 10, "timestamp": 1700000000,
+     "chainHash": A, "merkleProof": [{"left": "bb" * 32}]},
+    {"filename": "b.txt", "hash": "cc" * 32, "recordId": 2},
+]
+
+
+async def _batches(batches):
+    for batch in batches:
+        yield batch
+
+
+def _collect(batches, fmt):
+    async def run():
+        return [chunk async for chunk in ex.export_chunks(_batches(batches), fmt)]
+    return asyncio.run(run())
+
+
+def test_ndjson_one_chunk_per_batch_without_proofs():
+    chunks = _collect([DOCS[:1], DOCS[1:]], "ndjson")
+
+    assert len(chunks) == 2
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert rows[0] == {"filename": "a.txt", "hash": A, "recordId": 1, "blockNumber": 10,
+                       "timestamp": 1700000000, "chainHash": A}
+    assert rows[1] == {"filename": "b.txt", "hash": "cc" * 32, "recordId": 2}
+
+
+def test_csv_header_then_rows():
+    chunks = _collect([DOCS], "csv")
+
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == ex.EXPORT_FIELDS
+    assert rows[1] == ["a.txt", A, "1", "10", "1700000000", A]
+    assert rows[2] == ["b.txt", "cc" * 32, "2", "", "", ""]
+
+
+def test_empty_csv_export_still_has_header():
+    assert _collect([], "csv") == [",".join(ex.EXPORT_FIELDS) + "\n"]
+    assert _collect([], "ndjson") == []
@@ -1,9 +1,10 @@
 import types
 import pathlib
-import csv
 import pytest
 import warnings
 from backend.core import file_hasher as fh
+from backend.core.ledger import get_ledger
+from backend.core.admin_stats import get_admin_stats
 
 # Suppress websockets deprecation warning
 warnings.filterwarnings("ignore", category=DeprecationWarning, module="websockets")
@@ -95,75 +96,40 @@ def test_hash_file_empty(tmp_path, monkeypatch):
 
 
 
-# -------------------------
-# get_existing_hashes_from_csv tests
-# -------------------------
-def test_get_existing_hashes_from_csv_missing(tmp_path, monkeypatch):
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(tmp_path / "no.csv"), raising=True)
-    d = fh.get_existing_hashes_from_csv()
-    assert d == {}
-
-
-
-def test_get_existing_hashes_from_csv_reads(tmp_path, monkeypatch):
-    out = tmp_path / "out.csv"
-    out.write_text(
-        "Filename,Hash,Record ID\n"
-        "a.txt,H1,1\n"
-        "b.pdf,H2,2\n",
-        encoding="utf-8",
-    )
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(out), raising=True)
-    d = fh.get_existing_hashes_from_csv()
-    assert d == {"a.txt": "H1", "b.pdf": "H2"}
+def test_hash_file_mmap_matches_streamed_digest(tmp_path, monkeypatch):
+    from blake3 import blake3 as real_blake3
+    monkeypatch.setattr(fh, "blake3", real_blake3, raising=True)
+    filep = tmp_path / "big.bin"
+    filep.write_bytes(bytes(range(256)) * 4096)  # 1 MiB
 
+    streamed = fh.hash_file(str(filep), mmap_threshold=0)
+    mapped = fh.hash_file(str(filep), mmap_threshold=1024)
+    assert mapped == streamed == real_blake3(filep.read_bytes()).hexdigest()
 
 
-# -------------------------
-# write_csv tests
-# -------------------------
-def test_write_csv_happy(tmp_path, monkeypatch):
-    out = tmp_path / "out.csv"
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(out), raising=True)
-
-
-    rows = [
-        ("a.txt", "H1", 1),
-        ("b.pdf", "H2", 2),
-    ]
-    fh.write_csv(rows)
-    assert out.exists()
-
-
-    with out.open("r", encoding="utf-8") as f:
-        rdr = list(csv.reader(f))
-    # write_csv writes 3 columns: Filename, Hash, Record ID
-    assert rdr[0] == ["Filename", "Hash", "Record ID"]
-    assert rdr[1] == ["a.txt", "H1", "1"]
-    assert rdr[2] == ["b.pdf", "H2", "2"]
-
-
-
-def test_write_csv_prints_on_error(tmp_path, monkeypatch, capsys):
-    out = tmp_path / "x.csv"
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(out), raising=True)
-
-
-    import builtins
-    real_open = builtins.open
 
+def test_hash_file_uses_mmap_above_threshold(tmp_path, monkeypatch):
+    calls = {}
 
-    def boom_open(file, *args, **kwargs):
-        if file == str(out):
-            raise OSError("disk full")
-        return real_open(file, *args, **kwargs)
+    class _FakeBlake3Ctx:
+        def __init__(self, max_threads=1):
+            calls["max_threads"] = max_threads
 
+        def update_mmap(self, path):
+            calls["mmap"] = path
 
-    monkeypatch.setattr(builtins, "open", boom_open, raising=True)
+        def hexdigest(self):
+            return "MMAP"
 
+    _FakeBlake3Ctx.AUTO = -1
+    monkeypatch.setattr(fh, "blake3", _FakeBlake3Ctx, raising=True)
+    monkeypatch.setattr(fh, "MMAP_THRESHOLD", 4, raising=True)
+    monkeypatch.setattr(fh, "HASH_MAX_THREADS", 8, raising=True)
+    filep = tmp_path / "large.bin"
+    filep.write_bytes(b"0123456789")
 
-    fh.write_csv([("a.txt", "H1", 1)])
-    assert "Error writing CSV: disk full" in capsys.readouterr().out
+    assert fh.hash_file(str(filep)) == "MMAP"
+    assert calls == {"max_threads": 8, "mmap": str(filep)}
 
 
 
@@ -180,14 +146,18 @@ def _setup_input_dir(tmp_path, files):
     return d
 
 
+def _patch_single_anchor(monkeypatch, fake):
+    """Route single-mode anchoring through fake(digest) -> (record_id, tx_hash), called at submit time."""
+    monkeypatch.setattr(fh, "submit_anchor", fake, raising=True)
+    monkeypatch.setattr(fh, "resolve_anchor", lambda digest, pending: (*pending, 1, 0), raising=True)
+
 
-def test_process_folder_once_no_new_files(tmp_path, monkeypatch, capsys):
-    monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(tmp_path / "out.csv"), raising=True)
 
 
-    out = pathlib.Path(fh.OUTPUT_FILE)
-    out.write_text("Filename,Hash,Record ID\nold.txt,HX,1\n", encoding="utf-8")
+def test_process_folder_once_no_new_files(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
+    monkeypatch.setattr(fh, "hash_file", lambda path, *args: "ab" * 32, raising=True)
+    get_ledger().add([("old.txt", "ab" * 32, 1)])
 
 
     _setup_input_dir(tmp_path, {"old.txt": b"data"})
@@ -199,102 +169,377 @@ def test_process_folder_once_no_new_files(tmp_path, monkeypatch, capsys):
 
 
 
-def test_process_folder_once_adds_new_files_and_updates_db_csv(tmp_path, monkeypatch, capsys):
+def test_process_folder_once_adds_new_files_and_updates_db_ledger(tmp_path, monkeypatch, capsys):
     monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(tmp_path / "out.csv"), raising=True)
-
-
-    out = pathlib.Path(fh.OUTPUT_FILE)
-    out.write_text("Filename,Hash,Record ID\na.txt,H1,1\n", encoding="utf-8")
 
 
     input_dir = _setup_input_dir(tmp_path, {"a.txt": b"A", "b.txt": b"B"})
+    a_digest = fh.hash_file(str(pathlib.Path(input_dir) / "a.txt"))
+    b_digest = fh.hash_file(str(pathlib.Path(input_dir) / "b.txt"))
+    get_ledger().add([("a.txt", a_digest, 1)])
 
 
-    calls = {"upsert": None, "write_csv": None, "store": []}
+    calls = {"upsert": [], "anchor": [], "hash": []}
+    real_hash_file = fh.hash_file
 
 
-    def fake_store_record(fpath):
-        rid = 99
-        digest = "ON_CHAIN_DIGEST"
-        tx = "0xDEADBEEF"
-        calls["store"].append((fpath, rid, digest, tx))
-        return (rid, digest, tx)
+    def counting_hash_file(path, *args):
+        calls["hash"].append(path)
+        return real_hash_file(path, *args)
 
 
-    def fake_upsert_hashes(data):
-        calls["upsert"] = list(data)
+    def fake_anchor_digest(digest):
+        calls["anchor"].append(digest)
+        return (99, "0xDEADBEEF")
 
 
-    def fake_write_csv(data):
-        calls["write_csv"] = list(data)
+    def fake_upsert_hashes(data):
+        calls["upsert"].append(list(data))
 
 
-    monkeypatch.setattr(fh, "store_record", fake_store_record, raising=True)
+    monkeypatch.setattr(fh, "hash_file", counting_hash_file, raising=True)
+    _patch_single_anchor(monkeypatch, fake_anchor_digest)
     monkeypatch.setattr(fh, "upsert_hashes", fake_upsert_hashes, raising=True)
-    monkeypatch.setattr(fh, "write_csv", fake_write_csv, raising=True)
 
 
     new = fh.process_folder_once()
 
 
-    assert new == [("b.txt", "ON_CHAIN_DIGEST", 99)]
+    assert new == [("b.txt", b_digest, 99)]
     out_text = capsys.readouterr().out
     assert "New file hashed: b.txt" in out_text
     assert "Added 1 new file(s)." in out_text
 
 
-    full_b = str(pathlib.Path(input_dir) / "b.txt")
-    assert calls["store"][0][0] == full_b
-    assert calls["upsert"] == [("b.txt", "ON_CHAIN_DIGEST", 99)]
-    # get_existing_hashes_from_csv returns dict {filename: hash}, so when combined with new_data
-    # the all_data will contain 2-tuples for existing and 3-tuples for new entries
-    assert calls["write_csv"][0] == ("a.txt", "H1")
-    assert calls["write_csv"][1] == ("b.txt", "ON_CHAIN_DIGEST", 99)
+    # hashed once, anchored by digest, one Mongo write for the batch
+    assert calls["hash"] == [str(pathlib.Path(input_dir) / "b.txt")]
+    assert calls["anchor"] == [b_digest]
+    assert calls["upsert"] == [[("b.txt", b_digest, 99, {"blockNumber": 1, "timestamp": 0, "chainHash": b_digest})]]
+    ledger = get_ledger()
+    assert len(ledger) == 2
+    assert ledger.get("a.txt") == a_digest
+    assert ledger.get("b.txt") == b_digest
+    stats = get_admin_stats().snapshot()
+    assert stats["files_hashed"] == 1 and stats["bytes_hashed"] == 1
+    assert sum(stats["records_per_day"].values()) == 1
+    assert stats["csv_entries"] == 2
+
+
+
+def test_process_folder_once_skips_content_stored_under_another_name(tmp_path, monkeypatch, capsys):
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    _setup_input_dir(tmp_path, {"copy.txt": b"uploaded earlier"})
+    digest = fh.hash_file(str(tmp_path / "files" / "copy.txt"))
+    monkeypatch.setattr(fh, "find_file_by_hash", lambda d: {"filename": "upload.txt"} if d == digest else None, raising=True)
+
+    assert fh.process_folder_once() == []
+    assert stored == []
+    assert len(get_ledger()) == 0
+
+
+
+def test_process_folder_once_keeps_rejected_rows_out_of_ledger_and_stats(tmp_path, monkeypatch, capsys):
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    _setup_input_dir(tmp_path, {"a.txt": b"A", "b.txt": b"B"})
+    monkeypatch.setattr(fh, "upsert_hashes", lambda data: {"upserted": 1, "modified": 0, "rejected": [0]}, raising=True)
+
+    new = fh.process_folder_once()
+
+    assert [row[0] for row in new] == ["b.txt"]
+    assert len(stored) == 2
+    assert get_ledger().get("a.txt") is None and get_ledger().get("b.txt") == new[0][1]
+    assert sum(get_admin_stats().snapshot()["records_per_day"].values()) == 1
+    out = capsys.readouterr().out
+    assert "Error storing a.txt" in out and "Added 1 new file(s)." in out
 
 
 
 def test_process_folder_once_ignores_dirs(tmp_path, monkeypatch, capsys):
     monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(tmp_path / "out.csv"), raising=True)
-    pathlib.Path(fh.OUTPUT_FILE).write_text("Filename,Hash,Record ID\n", encoding="utf-8")
 
 
     d = _setup_input_dir(tmp_path, {"keep.txt": "ok"})
     (d / "subdir").mkdir()
 
 
-    monkeypatch.setattr(fh, "store_record", lambda f: (1, "D", "0x"), raising=True)
+    monkeypatch.setattr(fh, "hash_file", lambda f, *args: "D" * 64, raising=True)
+    _patch_single_anchor(monkeypatch, lambda d: (1, "0x"))
     monkeypatch.setattr(fh, "upsert_hashes", lambda data: None, raising=True)
-    monkeypatch.setattr(fh, "write_csv", lambda data: None, raising=True)
 
 
     new = fh.process_folder_once()
-    assert new == [("keep.txt", "D", 1)]
+    assert new == [("keep.txt", "D" * 64, 1)]
     assert "New file hashed: keep.txt" in capsys.readouterr().out
 
 
 
 def test_process_folder_once_prints_error_when_hash_raises(tmp_path, monkeypatch, capsys):
     monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
-    monkeypatch.setattr(fh, "OUTPUT_FILE", str(tmp_path / "out.csv"), raising=True)
-    pathlib.Path(fh.OUTPUT_FILE).write_text("Filename,Hash,Record ID\n", encoding="utf-8")
 
 
     _setup_input_dir(tmp_path, {"bad.txt": "boom"})
 
 
-    def boom(_p):
+    def boom(_p, *args):
         raise RuntimeError("explode!")
 
 
     monkeypatch.setattr(fh, "hash_file", boom, raising=True)
-    monkeypatch.setattr(fh, "store_record", lambda f: (0, "", ""), raising=True)
+    _patch_single_anchor(monkeypatch, lambda d: (0, ""))
     monkeypatch.setattr(fh, "upsert_hashes", lambda data: None, raising=True)
-    monkeypatch.setattr(fh, "write_csv", lambda data: None, raising=True)
 
 
     new = fh.process_folder_once()
     assert new == []
     out = capsys.readouterr().out
-    assert "Error hashing bad.txt: explode!" in out
\ No newline at end of file
+    assert "Error hashing bad.txt: explode!" in out
+
+
+# -------------------------
+# save_upload_and_hash tests
+# -------------------------
+class _FakeUpload:
+    def __init__(self, data):
+        self._data = data
+        self.reads = 0
+
+    async def read(self, size=-1):
+        self.reads += 1
+        chunk, self._data = self._data[:size], self._data[size:]
+        return chunk
+
+
+
+def test_save_upload_and_hash_writes_and_hashes_once(tmp_path, monkeypatch):
+    import asyncio
+    from blake3 import blake3 as real_blake3
+    monkeypatch.setattr(fh, "blake3", real_blake3, raising=True)
+    monkeypatch.setattr(fh, "BLOCK_SIZE", 4, raising=True)
+    upload = _FakeUpload(b"abcdefghij")
+    dest = tmp_path / "out.bin"
+
+    digest = asyncio.run(fh.save_upload_and_hash(upload, str(dest)))
+
+    assert dest.read_bytes() == b"abcdefghij"
+    assert digest == real_blake3(b"abcdefghij").hexdigest()
+    assert upload.reads == 4  # 3 data chunks + EOF
+
+
+
+# -------------------------
+# hash_multipart_stream tests
+# -------------------------
+def _multipart_body(boundary, parts):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        body += f"--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n".encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+async def _chunked(data, size):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_hash_multipart_stream_hashes_only_file_part(monkeypatch):
+    import asyncio
+
+    class _FakeBlake3Ctx:
+        def __init__(self):
+            self._buf = bytearray()
+
+        def update(self, b: bytes):
+            self._buf.extend(b)
+
+        def hexdigest(self):
+            return "HEX(" + self._buf.decode("utf-8", errors="ignore") + ")"
+
+    monkeypatch.setattr(fh, "blake3", lambda: _FakeBlake3Ctx(), raising=True)
+    body = _multipart_body("XyZ", [("note", None, b"ignored"), ("file", "a.txt", b"abcdefghij")])
+
+    # 3-byte chunks split boundaries and headers across reads
+    digest = asyncio.run(fh.hash_multipart_stream(_chunked(body, 3), "multipart/form-data; boundary=XyZ"))
+    assert digest == "HEX(abcdefghij)"
+
+
+
+def test_hash_multipart_stream_missing_part_returns_none():
+    import asyncio
+
+    body = _multipart_body("XyZ", [("other", "a.txt", b"abc")])
+    digest = asyncio.run(fh.hash_multipart_stream(_chunked(body, 64), "multipart/form-data; boundary=XyZ"))
+    assert digest is None
+
+
+
+def test_hash_multipart_stream_missing_boundary_raises():
+    import asyncio
+
+    with pytest.raises(ValueError):
+        asyncio.run(fh.hash_multipart_stream(_chunked(b"", 1), "multipart/form-data"))
+
+
+
+def test_process_folder_once_parallel_keeps_filename_order(tmp_path, monkeypatch):
+    import threading
+    import time
+    monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
+    names = [f"f{i:02d}.txt" for i in range(12)]
+    _setup_input_dir(tmp_path, {n: n for n in names})
+
+    threads = set()
+
+    def slow_hash(path, *args):
+        threads.add(threading.get_ident())
+        # later files finish first, so completion order != filename order
+        time.sleep(0.001 * (20 - int(pathlib.Path(path).stem[1:])))
+        return pathlib.Path(path).name.encode().hex().ljust(64, "0")
+
+    stored = []
+
+    def fake_anchor_digest(digest):
+        stored.append(bytes.fromhex(digest).rstrip(b"\0").decode())
+        return (len(stored), "0x")
+
+    calls = {}
+    monkeypatch.setattr(fh, "hash_file", slow_hash, raising=True)
+    _patch_single_anchor(monkeypatch, fake_anchor_digest)
+    monkeypatch.setattr(fh, "upsert_hashes", lambda data: calls.update(upsert=list(data)), raising=True)
+
+    new = fh.process_folder_once(workers=4)
+
+    assert stored == names
+    assert [row[0] for row in new] == names
+    assert [row[:3] for row in calls["upsert"]] == new
+    assert all(row[3]["chainHash"] == row[1] for row in calls["upsert"])
+    assert len(get_ledger()) == len(names)
+    assert len(threads) > 1
+
+
+
+# -------------------------
+# hash cache integration tests
+# -------------------------
+def test_hash_file_with_cache_skips_unchanged_file(tmp_path, monkeypatch):
+    from backend.core.hash_cache import HashCache
+    cache = HashCache(str(tmp_path / "c.db"))
+    filep = tmp_path / "a.bin"
+    filep.write_bytes(b"payload")
+
+    first = fh.hash_file(str(filep), cache=cache)
+    assert cache.lookup(filep.stat()) == first
+
+    import builtins
+    real_open = builtins.open
+
+    def no_read(file, *args, **kwargs):
+        if file == str(filep):
+            raise AssertionError("file was read")
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", no_read, raising=True)
+    assert fh.hash_file(str(filep), cache=cache) == first
+    cache.close()
+
+
+
+def _patch_ingest(monkeypatch, tmp_path):
+    monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
+    stored = []
+
+    def fake_anchor_digest(digest):
+        stored.append(digest)
+        return (len(stored), "0x")
+
+    _patch_single_anchor(monkeypatch, fake_anchor_digest)
+    monkeypatch.setattr(fh, "upsert_hashes", lambda data: None, raising=True)
+    return stored
+
+
+
+def test_process_folder_once_skips_renamed_file_without_reading(tmp_path, monkeypatch):
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    d = _setup_input_dir(tmp_path, {"a.txt": b"same bytes"})
+    assert [r[0] for r in fh.process_folder_once()] == ["a.txt"]
+
+    (d / "a.txt").rename(d / "renamed.txt")
+    monkeypatch.setattr(fh, "hash_file", lambda *a, **k: pytest.fail("re-hashed"), raising=True)
+
+    assert fh.process_folder_once() == []
+    assert len(stored) == 1
+
+
+
+def test_process_folder_once_seeds_new_cache_from_ledger(tmp_path, monkeypatch):
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    _setup_input_dir(tmp_path, {"a.txt": b"anchored earlier"})
+    get_ledger().add([("a.txt", "ab" * 32, 0)])
+    monkeypatch.setattr(fh, "hash_file", lambda *a, **k: pytest.fail("re-hashed"), raising=True)
+
+    assert fh.process_folder_once() == []
+    assert stored == []
+
+
+
+def test_process_folder_once_detects_file_replaced_by_rename(tmp_path, monkeypatch):
+    import os
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    d = _setup_input_dir(tmp_path, {"report.txt": b"v1"})
+    fh.process_folder_once()
+
+    (tmp_path / "report.tmp").write_bytes(b"v2 replaced")
+    os.replace(tmp_path / "report.tmp", d / "report.txt")
+
+    assert [r[0] for r in fh.process_folder_once()] == ["report.txt"]
+    assert len(stored) == 2
+
+
+
+def test_process_folder_once_detects_file_modified_in_place(tmp_path, monkeypatch):
+    import os
+    stored = _patch_ingest(monkeypatch, tmp_path)
+    d = _setup_input_dir(tmp_path, {"a.txt": b"v1"})
+    fh.process_folder_once()
+
+    (d / "a.txt").write_bytes(b"v2 changed")
+    st = (d / "a.txt").stat()
+    os.utime(d / "a.txt", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+    new = fh.process_folder_once()
+    assert [r[0] for r in new] == ["a.txt"]
+    assert len(stored) == 2 and stored[0] != stored[1]
+    assert len(get_ledger()) == 1
+    assert get_ledger().get("a.txt") == new[0][1]
+
+
+
+def test_process_folder_once_batch_mode_anchors_one_root(tmp_path, monkeypatch):
+    from backend.core.merkle import verify_proof
+    monkeypatch.setattr(fh, "INPUT_DIR", str(tmp_path / "files"), raising=True)
+    monkeypatch.setattr(fh, "ANCHOR_BATCH_SIZE", 3, raising=True)
+    _setup_input_dir(tmp_path, {f"f{i}.txt": f"data{i}" for i in range(5)})
+
+    from backend.core import batch_anchor
+    roots = []
+
+    def fake_anchor_digest(root):
+        roots.append(root)
+        return (len(roots) - 1, "0x", 1, 0)
+
+    upserts = []
+    monkeypatch.setattr(batch_anchor, "anchor_digest", fake_anchor_digest, raising=True)
+    monkeypatch.setattr(fh, "submit_anchor", lambda d: pytest.fail("single anchor"), raising=True)
+    monkeypatch.setattr(fh, "upsert_hashes", lambda rows: upserts.append(list(rows)), raising=True)
+
+    new = fh.process_folder_once(batch=True)
+
+    assert len(roots) == 2  # 3 + 2
+    assert [r[2] for r in new] == [0, 0, 0, 1, 1]
+    assert all(len(r) == 3 for r in new)
+    assert len(upserts) == 1
+    for fname, digest, rid, extra in upserts[0]:
+        assert extra["merkleRoot"] == roots[rid]
+        assert verify_proof(digest, extra["merkleProof"], extra["merkleRoot"])
@@ -0,0 +1,73 @@
+import os
+import pytest
+
+from backend.core import hash_cache as hc
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return os.stat(path)
+
+
+def test_lookup_miss_then_hit(tmp_path):
+    cache = hc.HashCache(str(tmp_path / "c.db"))
+    st = _write(tmp_path / "a.bin", b"abc")
+
+    assert cache.lookup(st) is None
+
+    cache.put(st, "ab" * 32)
+    assert cache.lookup(st) == "ab" * 32
+    cache.close()
+
+
+def test_changed_stat_misses_and_replaces_row(tmp_path):
+    cache = hc.HashCache(str(tmp_path / "c.db"))
+    p = tmp_path / "a.bin"
+    st = _write(p, b"abc")
+    cache.put(st, "ab" * 32)
+
+    st2 = _write(p, b"abcdef")  # same inode, new size
+    assert cache.lookup(st2) is None
+
+    cache.put(st2, "cd" * 32)
+    assert cache.lookup(st2) == "cd" * 32
+    assert len(cache) == 1
+    cache.close()
+
+
+def test_cache_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "c.db")
+    st = _write(tmp_path / "a.bin", b"abc")
+    cache = hc.HashCache(path)
+    cache.put(st, "ef" * 32)
+    cache.close()
+
+    reopened = hc.HashCache(path)
+    assert reopened.lookup(st) == "ef" * 32
+    reopened.close()
+
+
+def test_seeding_only_until_finished_and_across_reopen(tmp_path):
+    path = str(tmp_path / "c.db")
+    cache = hc.HashCache(path)
+    assert cache.seeding() is True
+    cache.finish_seeding()
+    assert cache.seeding() is False
+    cache.close()
+
+    reopened = hc.HashCache(path)
+    assert reopened.seeding() is False
+    reopened.close()
+
+
+def test_put_rejects_non_hex_digest(tmp_path):
+    cache = hc.HashCache(str(tmp_path / "c.db"))
+    st = _write(tmp_path / "a.bin", b"abc")
+    with pytest.raises(ValueError):
+        cache.put(st, "not-hex")
+    cache.close()
+
+
+def test_get_hash_cache_is_shared(tmp_path):
+    assert hc.get_hash_cache() is hc.get_hash_cache()
+    assert hc.get_hash_cache().path == hc.HASH_CACHE_FILE
@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from blake3 import blake3
+
+from backend.core import hash_filter as hf
+
+
+def _digest(i):
+    return blake3(str(i).encode()).hexdigest()
+
+
+class FakeStore:
+    """Stands in for database.scan_hashes; each write is ten minutes after the last."""
+
+    def __init__(self, count=0):
+        self.start = datetime(2025, 1, 1)
+        self.docs = []
+        self.scans = []
+        for i in range(count):
+            self.insert(_digest(i))
+
+    def insert(self, digest):
+        self.docs.append((self.start + timedelta(minutes=len(self.docs) * 10), digest))
+
+    def rewrite(self, index, digest):
+        """Same document, new hash: as an upsert of a changed file does."""
+        self.docs[index] = (self.start + timedelta(minutes=len(self.docs) * 10), digest)
+        self.docs.append(self.docs.pop(index))
+
+    def scan(self, since=None):
+        self.scans.append(since)
+        return [(ts, d) for ts, d in self.docs if since is None or ts > since]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore(50)
+    monkeypatch.setattr(hf.database, "scan_hashes", store.scan, raising=True)
+    monkeypatch.setattr(hf.database, "storage_ready", lambda: True, raising=True)
+    monkeypatch.setattr(hf.database, "count_hashes", lambda: len(store.docs), raising=True)
+    return store
+
+
+def test_bloom_has_no_false_negatives_and_bounded_false_positives():
+    bloom = hf.BloomFilter(capacity=5000, fp_rate=0.01)
+    for i in range(5000):
+        bloom.add(_digest(i))
+
+    assert all(_digest(i) in bloom for i in range(5000))
+    false_positives = sum(_digest(i) in bloom for i in range(5000, 25000))
+    assert false_positives / 20000 < 0.02
+
+
+def test_save_and_load_round_trip(tmp_path):
+    bloom = hf.BloomFilter(capacity=100, fp_rate=0.001)
+    bloom.add(_digest(1))
+    watermark = datetime(2025, 3, 1, 12, 30)
+    path = str(tmp_path / "f.bin")
+    bloom.save(path, watermark)
+
+    loaded, loaded_mark = hf.BloomFilter.load(path)
+    assert _digest(1) in loaded
+    assert loaded.count == 1 and loaded_mark == watermark
+    assert hf.BloomFilter.load(str(tmp_path / "missing.bin")) == (None, None)
+
+
+def test_might_be_known_without_a_filter_is_true():
+    assert hf.might_be_known(_digest(1)) is True
+
+
+def test_build_then_refresh_catches_up(store):
+    hf.build_hash_filter()
+    assert hf.might_be_known(_digest(3))
+    assert not hf.might_be_known(_digest(999))
+
+    store.insert(_digest(999))
+    hf.refresh_hash_filter()
+
+    assert hf.might_be_known(_digest(999))
+    # The catch-up re-reads a little behind the newest write, not the whole collection.
+    assert store.scans[-1] is not None
+
+
+def test_refresh_sees_a_document_whose_hash_changed(store):
+    hf.build_hash_filter()
+    store.rewrite(0, _digest(4242))
+
+    hf.refresh_hash_filter()
+
+    assert hf.might_be_known(_digest(4242))
+
+
+def test_warm_start_reads_only_newer_writes(store, monkeypatch):
+    hf.build_hash_filter()
+    assert os.path.exists(hf.HASH_FILTER_FILE)
+    monkeypatch.setattr(hf, "_filter", None, raising=True)
+    store.insert(_digest(500))
+
+    hf.build_hash_filter()
+
+    assert hf.might_be_known(_digest(0)) and hf.might_be_known(_digest(500))
+    assert store.scans[-1] is not None
+
+
+def test_digests_written_during_a_build_are_kept(store, monkeypatch):
+    def scan_with_write(since=None):
+        hf.add_known_hashes([_digest(777)])
+        return store.scan(since)
+
+    monkeypatch.setattr(hf.database, "scan_hashes", scan_with_write, raising=True)
+    hf.build_hash_filter()
+
+    assert hf.might_be_known(_digest(777))
+
+
+def test_full_filter_is_rebuilt_larger(store, monkeypatch):
+    monkeypatch.setattr(hf, "HASH_FILTER_CAPACITY", 10, raising=True)
+    hf.build_hash_filter(path="")
+    assert hf._filter.capacity == 100  # twice the 50 documents stored
+    for i in range(60):
+        store.insert(_digest(1000 + i))
+    hf.refresh_hash_filter()
+    assert hf._filter.full()
+
+    hf.refresh_hash_filter()
+
+    assert hf._filter.capacity == 220
+    assert not hf._filter.full()
+
+
+def test_refreshes_do_not_recount_rescanned_digests(store):
+    hf.build_hash_filter(path="")
+    for _ in range(20):
+        store.insert(_digest(len(store.docs)))
+        hf.refresh_hash_filter()
+
+    # Each catch-up re-reads HASH_FILTER_SKEW behind; those digests are already in.
+    assert hf._filter.count == len(store.docs) == 70
@@ -1,8 +1,10 @@
 import types
 import json
 import pytest
+from concurrent.futures import Future
 from backend.core import interact_certifier as ic
 from backend.core import file_hasher as fh_module
+from conftest import FakeUpsertBuffer
 
 
 class _CallObj:
@@ -10,7 +12,7 @@ class _CallObj:
         self._value = value
 
 
-    def call(self):
+    def call(self, block_identifier=None):
         return self._value
 
 
@@ -20,11 +22,12 @@ class _CallObj:
 
 
 class _Functions:
-    """Holds closures for retrieve/store/get_total_records, each returning a *_CallObj."""
+    """Holds closures for retrieve/store/get_total_records/hash_records, each returning a *_CallObj."""
     def __init__(self, retrieve_value=None, total_records=0, store_value="0xTX"):
         self._retrieve_value = retrieve_value
-        self._total_records = total_records
         self._store_value = store_value
+        self.records = [(b"\x00" * 32, 0, 0)] * total_records
+        self.hash_records_calls = 0
 
 
     def retrieve(self, record_id):
@@ -32,7 +35,12 @@ class _Functions:
 
 
     def get_total_records(self):
-        return _CallObj(self._total_records)
+        return _CallObj(len(self.records))
+
+
+    def hash_records(self, record_id):
+        self.hash_records_calls += 1
+        return _CallObj(self.records[record_id])
 
 
     def store(self, hash_bytes32):
@@ -40,6 +48,52 @@ class _Functions:
 
 
 
+class _ChainEth:
+    def __init__(self):
+        self.block_number = 1
+        self.tx_count = 0
+
+
+    def get_transaction_count(self, sender, block_identifier="latest"):
+        return self.tx_count
+
+
+
+class _FakeBatch:
+    def __init__(self, w3):
+        self._w3 = w3
+        self._calls = []
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        return False
+
+
+    def add(self, call_obj):
+        self._calls.append(call_obj)
+
+
+    def execute(self):
+        self._w3.batches.append(len(self._calls))
+        return [c.call() for c in self._calls]
+
+
+
+class _ChainW3:
+    def __init__(self):
+        self.eth = _ChainEth()
+        self.batches = []
+
+
+    def batch_requests(self):
+        return _FakeBatch(self)
+
+
+
 class _Eth:
     def __init__(self, contract_instance):
         self._contract_instance = contract_instance
@@ -53,6 +107,7 @@ class _Eth:
 class FakeContract:
     def __init__(self, functions: _Functions):
         self.functions = functions
+        self.w3 = _ChainW3()
 
 
 
@@ -62,8 +117,35 @@ class FakeWeb3:
 
 
     class HTTPProvider:
-        def __init__(self, url):
+        def __init__(self, url, **kwargs):
             self.url = url
+            self.kwargs = kwargs
+
+
+
+class _DirectSubmitter:
+    """Sends straight through the (fake) contract and mines each send in its own block."""
+    sender = "0xMY"
+
+    def submit(self, hash_bytes):
+        fut = Future()
+        contract = ic.connect_contract()
+        tx_hash = contract.functions.store(hash_bytes).transact()
+        eth = contract.w3.eth
+        nonce = eth.tx_count
+        eth.tx_count += 1
+        eth.block_number += 1
+        contract.functions.records.append((hash_bytes, 1700000000 + nonce, eth.block_number))
+        fut.set_result((tx_hash, {"status": 1, "blockNumber": eth.block_number}, nonce))
+        return fut
+
+
+
+@pytest.fixture(autouse=True)
+def direct_submitter(monkeypatch):
+    submitter = _DirectSubmitter()
+    monkeypatch.setattr(ic, "get_submitter", lambda: submitter, raising=True)
+    monkeypatch.setattr(ic, "_record_offset", None, raising=True)
 
 
 
@@ -93,6 +175,7 @@ def test_bytes32_to_hex_bad_length_raises():
 def test_connect_contract_builds_contract(monkeypatch):
     config = ("http://rpc.test", "0xMY", [{"type": "function"}], "0xCONTRACT")
     monkeypatch.setattr(ic, "get_config", lambda fname: config, raising=True)
+    monkeypatch.setattr(ic, "_contract", None, raising=True)
 
 
     functions = _Functions(total_records=5)
@@ -119,6 +202,118 @@ def test_connect_contract_builds_contract(monkeypatch):
 
 
 
+def _install_counting_web3(monkeypatch):
+    built = {"config": 0, "providers": []}
+
+    def fake_get_config(fname):
+        built["config"] += 1
+        return ("http://rpc.test", "0xMY", [], "0xCONTRACT")
+
+    class _W3Shim:
+        class HTTPProvider(FakeWeb3.HTTPProvider):
+            def __init__(self, url, **kwargs):
+                super().__init__(url, **kwargs)
+                built["providers"].append(self)
+
+        def __new__(cls, provider):
+            return FakeWeb3(FakeContract(_Functions(total_records=len(built["providers"]))))
+
+    monkeypatch.setattr(ic, "get_config", fake_get_config, raising=True)
+    monkeypatch.setattr(ic, "Web3", _W3Shim, raising=True)
+    monkeypatch.setattr(ic, "_contract", None, raising=True)
+    return built
+
+
+
+def test_connect_contract_is_cached_and_pooled(monkeypatch):
+    built = _install_counting_web3(monkeypatch)
+    monkeypatch.setattr(ic, "RPC_POOL_SIZE", 7, raising=True)
+
+    first = ic.connect_contract()
+    assert ic.connect_contract() is first
+    assert built["config"] == 1
+
+    session = built["providers"][0].kwargs["session"]
+    assert session.get_adapter("https://rpc.test")._pool_maxsize == 7
+
+
+
+def test_reload_contract(monkeypatch):
+    built = _install_counting_web3(monkeypatch)
+    mtime = {"value": 1.0}
+    monkeypatch.setattr(ic, "_config_mtime", lambda: mtime["value"], raising=True)
+
+    first = ic.connect_contract()
+    assert ic.reload_contract(only_if_changed=True) is False
+    assert ic.connect_contract() is first
+
+    mtime["value"] = 2.0
+    assert ic.reload_contract(only_if_changed=True) is True
+    assert ic.connect_contract() is not first
+
+    assert ic.reload_contract() is True
+    assert built["config"] == 3
+
+
+
+def test_reload_contract_resets_state_of_the_old_contract(monkeypatch):
+    from backend.core.record_cache import get_chain_cache
+    monkeypatch.setattr(ic, "_build_contract", lambda: object(), raising=True)
+    closed = []
+    monkeypatch.setattr(ic, "_submitter", types.SimpleNamespace(close=lambda: closed.append(True)), raising=True)
+    ic.rebase_record_offset(10, 2)
+    get_chain_cache().put(1, ("ab" * 32, 5, 6))
+    generation = ic.contract_generation()
+
+    assert ic.reload_contract() is True
+
+    assert closed == [True] and ic._submitter is None
+    assert ic.predicted_record_id(3) is None
+    assert len(get_chain_cache()) == 0
+    assert ic.contract_generation() == generation + 1
+
+
+
+def test_reload_contract_fails_anchors_in_flight(monkeypatch, tmp_path):
+    from backend.core.tx_submitter import TxSubmitter
+    eth = types.SimpleNamespace(get_transaction_count=lambda sender, block: 0)
+    store = lambda hash_bytes: types.SimpleNamespace(transact=lambda tx: "0xtx")
+    contract = types.SimpleNamespace(w3=types.SimpleNamespace(eth=eth), functions=types.SimpleNamespace(store=store))
+    submitter = TxSubmitter(contract, "0xME", journal_path=str(tmp_path / "journal.json"), poll_interval=3600)
+    monkeypatch.setattr(ic, "_submitter", submitter, raising=True)
+    monkeypatch.setattr(ic, "_build_contract", lambda: object(), raising=True)
+    pending = submitter.submit(b"\x01" * 32)
+
+    ic.reload_contract()
+
+    with pytest.raises(RuntimeError, match="closed before the transaction was mined"):
+        ic.resolve_anchor("01" * 32, pending)
+
+
+
+def test_connect_contract_routes_several_endpoints(monkeypatch):
+    from backend.core.rpc_router import RoutedHTTPProvider
+    urls = ["http://rpc-a.test", "http://rpc-b.test"]
+    monkeypatch.setattr(ic, "get_config", lambda fname: (urls, "0xMY", [], "0xCONTRACT"), raising=True)
+    monkeypatch.setattr(ic, "_contract", None, raising=True)
+    providers = []
+
+    class _W3Shim:
+        HTTPProvider = FakeWeb3.HTTPProvider
+
+        def __new__(cls, provider):
+            providers.append(provider)
+            return FakeWeb3(FakeContract(_Functions()))
+
+    monkeypatch.setattr(ic, "Web3", _W3Shim, raising=True)
+
+    ic.connect_contract()
+
+    assert isinstance(providers[0], RoutedHTTPProvider)
+    assert [ep.url for ep in providers[0].router.endpoints] == urls
+
+
+
 # -------------------------------- retrieve_record ----------------------------
 def test_retrieve_record_converts_bytes_to_hex(monkeypatch):
     hash_bytes = bytes.fromhex("12" * 32)
@@ -182,18 +377,137 @@ def test_store_record_happy_path(monkeypatch):
     monkeypatch.setattr(ic, "hex_to_bytes32", lambda h: bytes.fromhex(h), raising=True)
 
 
-    new_id, out_digest, tx_hash = ic.store_record("docs/report.txt")
+    new_id, out_digest, tx_hash, block_num, timestamp = ic.store_record("docs/report.txt")
 
 
-    assert new_id == 9
+    assert new_id == 10
     assert out_digest == digest
     assert tx_hash == "0xTXHASH"
+    assert block_num == 2
+    assert timestamp == 1700000000
     assert calls["store_called"] is True
     assert len(calls["stored_bytes"]) == 32
     assert calls["stored_bytes"].hex() == digest
 
 
 
+def test_store_record_writes_mongo_once(monkeypatch):
+    monkeypatch.setattr(fh_module, "hash_file", lambda p: "cd" * 32, raising=True)
+    contract = FakeContract(_Functions(total_records=3))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+    buffer = FakeUpsertBuffer()
+    monkeypatch.setattr(ic, "get_upsert_buffer", lambda: buffer, raising=True)
+
+    ic.store_record("some/dir/file.bin")
+
+    assert buffer.rows == [("file.bin", "cd" * 32, 3, {"blockNumber": 2, "timestamp": 1700000000, "chainHash": "cd" * 32})]
+
+
+
+def test_store_digest_does_not_hash(monkeypatch):
+    monkeypatch.setattr(fh_module, "hash_file", lambda p: pytest.fail("hashed"), raising=True)
+    contract = FakeContract(_Functions(total_records=8, store_value="0xTX"))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+    buffer = FakeUpsertBuffer()
+    monkeypatch.setattr(ic, "get_upsert_buffer", lambda: buffer, raising=True)
+
+    assert ic.store_digest("a.txt", "ef" * 32) == (8, "ef" * 32, "0xTX", 2, 1700000000)
+    assert buffer.rows == [("a.txt", "ef" * 32, 8, {"blockNumber": 2, "timestamp": 1700000000, "chainHash": "ef" * 32})]
+
+
+
+def test_store_digest_returns_existing_record_without_anchoring(monkeypatch):
+    existing = {"filename": "old.txt", "hash": "ef" * 32, "recordId": 4}
+    monkeypatch.setattr(ic, "find_file_by_hash", lambda digest: existing, raising=True)
+    monkeypatch.setattr(ic, "anchor_digest", lambda digest: pytest.fail("anchored"), raising=True)
+
+    with pytest.raises(ic.DigestAlreadyStored) as e:
+        ic.store_digest("new.txt", "ef" * 32)
+    assert e.value.doc == existing
+
+
+
+def test_store_digest_raises_when_row_is_rejected(monkeypatch):
+    contract = FakeContract(_Functions(total_records=1))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+    monkeypatch.setattr(ic, "get_upsert_buffer", lambda: FakeUpsertBuffer(RuntimeError("duplicate key")), raising=True)
+
+    with pytest.raises(RuntimeError, match="duplicate key"):
+        ic.store_digest("a.txt", "ef" * 32)
+
+
+
+def test_anchor_digest_skips_mongo(monkeypatch):
+    contract = FakeContract(_Functions(total_records=1, store_value="0xTX"))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+    monkeypatch.setattr(ic, "get_upsert_buffer", lambda: pytest.fail("wrote"), raising=True)
+
+    assert ic.anchor_digest("01" * 32) == (1, "0xTX", 2, 1700000000)
+
+
+
+def test_anchor_digest_reads_one_record_per_anchor(monkeypatch):
+    fns = _Functions(total_records=4)
+    contract = FakeContract(fns)
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    ids = [ic.anchor_digest(f"{i:02x}" * 32)[0] for i in range(3)]
+
+    assert ids == [4, 5, 6]
+    assert fns.hash_records_calls == 3
+
+
+
+def test_pipelined_anchors_resolve_in_any_order(monkeypatch):
+    contract = FakeContract(_Functions(total_records=2))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    digests = [f"{i:02x}" * 32 for i in range(3)]
+    pending = [ic.submit_anchor(d) for d in digests]
+    resolved = [ic.resolve_anchor(d, p) for d, p in reversed(list(zip(digests, pending)))]
+
+    assert [r[0] for r in resolved] == [4, 3, 2]
+    assert [r[2] for r in resolved] == [4, 3, 2]
+
+
+
+def test_anchor_digest_rebases_after_foreign_write(monkeypatch):
+    fns = _Functions(total_records=1)
+    contract = FakeContract(fns)
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    assert ic.anchor_digest("01" * 32)[0] == 1
+    # Someone else stores a record in between: our IDs shift by one.
+    contract.w3.eth.block_number += 1
+    fns.records.append((b"\xff" * 32, 0, contract.w3.eth.block_number))
+
+    assert ic.anchor_digest("02" * 32)[0] == 3
+    calls = fns.hash_records_calls
+    assert ic.anchor_digest("03" * 32)[0] == 4
+    assert fns.hash_records_calls == calls + 1
+
+
+
+def test_resolve_anchor_raises_when_record_missing(monkeypatch):
+    contract = FakeContract(_Functions(total_records=1))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+    pending = Future()
+    pending.set_result(("0xTX", {"status": 1, "blockNumber": 5}, 0))
+
+    with pytest.raises(LookupError):
+        ic.resolve_anchor("01" * 32, pending)
+
+
+
+def test_resolve_anchor_gives_up_after_timeout(monkeypatch):
+    from concurrent.futures import TimeoutError as FutureTimeout
+    monkeypatch.setattr(ic, "ANCHOR_TIMEOUT", 0.01, raising=True)
+
+    with pytest.raises(FutureTimeout):
+        ic.resolve_anchor("01" * 32, Future())
+
+
+
 def test_store_record_bad_digest_raises(monkeypatch):
     def fake_hash_file(p):
         return "abcd"
@@ -250,3 +564,88 @@ def test_get_total_record_calls_contract(monkeypatch):
 
 
     assert ic.get_total_record() == 42
+
+
+
+# ---------------------------- backfill_chain_metadata ------------------------
+def test_backfill_chain_metadata_reads_each_record_once(monkeypatch):
+    monkeypatch.setattr(ic, "find_missing_chain_metadata", lambda: [("a", 0), ("b", 1), ("c", 2)], raising=True)
+    read = []
+
+    def fake_retrieve(record_id):
+        read.append(record_id)
+        if record_id == 1:
+            raise RuntimeError("rpc down")
+        return f"{record_id:02x}" * 32, 10 + record_id, 1700000000 + record_id
+
+    writes = []
+    monkeypatch.setattr(ic, "retrieve_record", fake_retrieve, raising=True)
+    monkeypatch.setattr(ic, "set_chain_metadata", lambda rows: writes.append(list(rows)), raising=True)
+
+    assert ic.backfill_chain_metadata(batch_size=1) == 2
+    assert read == [0, 1, 2]
+    assert writes == [
+        [("a", 10, 1700000000, "00" * 32)],
+        [("c", 12, 1700000002, "02" * 32)],
+    ]
+
+
+
+# -------------------------------- retrieve_records ---------------------------
+class _RecordFunctions(_Functions):
+    """retrieve(i) returns a distinct record per ID, reverts for IDs in `bad` and has a 31-byte hash for IDs in `short`."""
+    def __init__(self, bad=(), short=()):
+        super().__init__()
+        self.bad = set(bad)
+        self.short = set(short)
+        self.single_calls = 0
+
+
+    def retrieve(self, record_id):
+        functions = self
+
+        class _Call:
+            def call(self, block_identifier=None):
+                functions.single_calls += 1
+                if record_id in functions.bad:
+                    raise RuntimeError("execution reverted")
+                size = 31 if record_id in functions.short else 32
+                return bytes([record_id]) * size, 100 + record_id, 1000 + record_id
+
+        return _Call()
+
+
+
+def test_retrieve_records_batches_in_order(monkeypatch):
+    contract = FakeContract(_RecordFunctions())
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    got = ic.retrieve_records(list(range(7)), batch_size=3)
+
+    assert contract.w3.batches == [3, 3, 1]
+    assert got == [(f"{i:02x}" * 32, 100 + i, 1000 + i) for i in range(7)]
+
+
+
+def test_retrieve_records_isolates_bad_ids(monkeypatch, capsys):
+    contract = FakeContract(_RecordFunctions(bad={4}))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    got = ic.retrieve_records([1, 4, 5, 6], batch_size=2)
+
+    assert got[0] == ("01" * 32, 101, 1001)
+    assert got[1] is None
+    assert got[2] == ("05" * 32, 105, 1005)
+    assert contract.w3.batches == [2, 2]
+    assert "Error reading record 4" in capsys.readouterr().out
+
+
+
+def test_retrieve_records_returns_none_for_undecodable_record(monkeypatch, capsys):
+    contract = FakeContract(_RecordFunctions(short={2}))
+    monkeypatch.setattr(ic, "connect_contract", lambda: contract, raising=True)
+
+    got = ic.retrieve_records([1, 2, 3])
+
+    assert got == [("01" * 32, 101, 1001), None, ("03" * 32, 103, 1003)]
+    assert "Record 2 could not be decoded" in capsys.readouterr().out
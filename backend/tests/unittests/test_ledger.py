@@ -0,0 +1,59 @@
+import csv
+
+from backend.core import ledger as lg
+
+
+def test_add_get_and_replace(tmp_path):
+    ledger = lg.Ledger(str(tmp_path / "l.db"))
+    ledger.add([("a.txt", "aa" * 32, 1), ("b.txt", "bb" * 32, 2)])
+    ledger.add([("a.txt", "cc" * 32, 3)])  # modified in place
+
+    assert ledger.get("a.txt") == "cc" * 32
+    assert ledger.get("missing.txt") is None
+    assert ledger.has_hash("bb" * 32)
+    assert not ledger.has_hash("aa" * 32)
+    assert len(ledger) == 2
+    ledger.close()
+
+
+def test_count_survives_reopen(tmp_path):
+    path = str(tmp_path / "l.db")
+    ledger = lg.Ledger(path)
+    ledger.add([(f"{i}.txt", f"{i:02x}" * 32, i) for i in range(5)])
+    ledger.close()
+
+    reopened = lg.Ledger(path)
+    assert len(reopened) == 5
+    reopened.close()
+
+
+def test_csv_export_import_round_trip(tmp_path):
+    ledger = lg.Ledger(str(tmp_path / "l.db"))
+    ledger.add([("b.txt", "bb" * 32, 2), ("a.txt", "aa" * 32, None)])
+    out = tmp_path / "out.csv"
+
+    assert ledger.export_csv(str(out)) == 2
+    with out.open(encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows == [["Filename", "Hash", "Record ID"], ["a.txt", "aa" * 32, ""], ["b.txt", "bb" * 32, "2"]]
+
+    copy = lg.Ledger(str(tmp_path / "copy.db"))
+    assert copy.import_csv(str(out)) == 2
+    assert copy.get("b.txt") == "bb" * 32
+    ledger.close()
+    copy.close()
+
+
+def test_get_ledger_imports_legacy_csv_once(capsys):
+    with open(lg.LEGACY_CSV_FILE, "w", encoding="utf-8") as f:
+        f.write("Filename,Hash,Record ID\n")
+        f.write(f"a.txt,{'aa' * 32},1\n")
+        f.write("bad.txt,NOTHEX,2\n")
+
+    ledger = lg.get_ledger()
+
+    assert len(ledger) == 1
+    assert lg.get_ledger() is ledger
+    out = capsys.readouterr().out
+    assert "skipping bad.txt" in out
+    assert "imported 1 row(s)" in out
@@ -0,0 +1,49 @@
+import pytest
+
+from backend.core import merkle
+
+
+def _digests(n):
+    return [f"{i:064x}" for i in range(n)]
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 5, 8, 13])
+def test_every_proof_verifies_against_root(n):
+    digests = _digests(n)
+    levels = merkle.build_tree(digests)
+    root = merkle.tree_root(levels)
+    assert root == merkle.merkle_root(digests)
+    for i, d in enumerate(digests):
+        assert merkle.verify_proof(d, merkle.merkle_proof(levels, i), root)
+
+
+def test_proof_rejects_other_digest_and_tampered_step():
+    digests = _digests(6)
+    levels = merkle.build_tree(digests)
+    root = merkle.tree_root(levels)
+    proof = merkle.merkle_proof(levels, 2)
+
+    assert not merkle.verify_proof(digests[3], proof, root)
+    tampered = [dict(proof[0], sibling="00" * 32)] + proof[1:]
+    assert not merkle.verify_proof(digests[2], tampered, root)
+    assert not merkle.verify_proof(digests[2], [{"bad": "step"}], root)
+
+
+def test_single_leaf_root_is_not_the_raw_digest():
+    d = "ab" * 32
+    levels = merkle.build_tree([d])
+    assert merkle.merkle_proof(levels, 0) == []
+    assert merkle.tree_root(levels) != d
+
+
+def test_inner_node_cannot_pose_as_leaf():
+    digests = _digests(4)
+    levels = merkle.build_tree(digests)
+    root = merkle.tree_root(levels)
+    inner = levels[1][0].hex()
+    assert not merkle.verify_proof(inner, [{"sibling": levels[1][1].hex(), "position": "right"}], root)
+
+
+def test_empty_tree_raises():
+    with pytest.raises(ValueError):
+        merkle.build_tree([])
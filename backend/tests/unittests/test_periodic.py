@@ -0,0 +1,46 @@
+import threading
+
+from backend.core import periodic
+
+
+def test_tick_runs_at_once_and_failures_are_logged(capsys):
+    ticked = threading.Event()
+
+    def tick():
+        ticked.set()
+        raise RuntimeError("down")
+
+    task = periodic.PeriodicTask("test-task", "Test tick", tick)
+    assert task.start(60) is task
+    assert task.start(60) is task  # already running
+    assert ticked.wait(5)
+    task.stop()
+    task.stop()
+
+    assert not task.running()
+    assert "Test tick failed: down" in capsys.readouterr().out
+
+
+def test_zero_interval_leaves_the_task_off():
+    task = periodic.PeriodicTask("test-task", "Test tick", lambda: None)
+    assert task.start(0) is None
+    assert not task.running()
+
+
+def test_stop_periodic_tasks_stops_newest_first():
+    stopped = []
+    tasks = [periodic.PeriodicTask(f"task-{i}", "Test tick", lambda: None) for i in range(2)]
+    for task in tasks:
+        task.start(60)
+        original = task.stop
+
+        def stop(task=task, original=original):
+            stopped.append(task.name)
+            original()
+
+        task.stop = stop
+
+    periodic.stop_periodic_tasks()
+
+    assert stopped == ["task-1", "task-0"]
+    assert not any(task.running() for task in tasks)
@@ -0,0 +1,81 @@
+import pytest
+
+from backend.core import record_cache as rc
+from conftest import FakeClock
+
+
+def test_hits_misses_and_ttl():
+    clock = FakeClock()
+    cache = rc.TTLCache(max_entries=10, ttl=10, negative_ttl=2, clock=clock)
+    cache.put("a", {"recordId": 1})
+    cache.put("missing", None)
+
+    assert cache.get("a") == (True, {"recordId": 1})
+    assert cache.get("missing") == (True, None)
+    clock.now = 3
+    assert cache.get("missing") == (False, None)  # negative results expire first
+    assert cache.get("a")[0] is True
+    clock.now = 11
+    assert cache.get("a") == (False, None)
+
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 2
+    assert len(cache) == 0
+
+
+def test_least_recently_used_is_evicted_by_count():
+    cache = rc.TTLCache(max_entries=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") == (False, None)
+    assert cache.get("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_memory():
+    big = "x" * 1000
+    cache = rc.TTLCache(max_entries=100, max_bytes=rc.approx_size(big) * 2, ttl=60)
+    for key in "abc":
+        cache.put(key, big)
+
+    assert len(cache) == 2
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+
+def test_zero_ttl_disables_caching():
+    cache = rc.TTLCache(ttl=0, negative_ttl=0)
+    cache.put("a", 1)
+    cache.put("b", None)
+    assert len(cache) == 0
+
+
+def test_invalidate_hashes_drops_record_lookups():
+    rc.get_record_cache().put("ab" * 32, None)
+    rc.invalidate_hashes(["ab" * 32])
+    assert rc.get_record_cache().get("ab" * 32) == (False, None)
+    assert set(rc.cache_stats()) == {"records"}
+
+
+def test_invalidate_by_secondary_key():
+    cache = rc.TTLCache(max_entries=2, ttl=60, index=lambda doc: doc["filename"])
+    cache.put("old", {"filename": "a.txt"})
+    cache.put("other", {"filename": "b.txt"})
+
+    cache.invalidate_by("a.txt")
+    assert cache.get("old") == (False, None)
+    assert cache.get("other")[0] is True
+
+    cache.put("new", {"filename": "c.txt"})
+    cache.put("newer", {"filename": "c.txt"})  # evicts "other"
+    cache.invalidate_by("b.txt")
+    cache.invalidate_by("c.txt")
+    assert len(cache) == 0
+
+
+def test_invalidate_hashes_drops_filenames_previous_digest():
+    rc.get_record_cache().put("ab" * 32, {"filename": "a.txt", "recordId": 1})
+    rc.invalidate_hashes(["cd" * 32], ["a.txt"])
+    assert rc.get_record_cache().get("ab" * 32) == (False, None)
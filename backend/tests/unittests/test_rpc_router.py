@@ -0,0 +1,236 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import AsyncWeb3, Web3
+
+from backend.core import rpc_router as rr
+
+
+class _RpcHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        calls = body if isinstance(body, list) else [body]
+        server.methods.extend(c["method"] for c in calls)
+        if server.delay:
+            time.sleep(server.delay)
+        if server.fail:
+            self.send_response(500)
+            self.end_headers()
+            return
+        results = [{"jsonrpc": "2.0", "id": c["id"], "result": server.answer(c["method"])} for c in calls]
+        payload = json.dumps(results if isinstance(body, list) else results[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StandInNode(ThreadingHTTPServer):
+    """Local JSON-RPC server answering a few eth_* methods, with knobs for latency and failure."""
+    daemon_threads = True
+
+    def __init__(self, block, delay=0.0):
+        super().__init__(("127.0.0.1", 0), _RpcHandler)
+        self.block = block
+        self.delay = delay
+        self.fail = False
+        self.methods = []
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+
+    def answer(self, method):
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        if method == "eth_chainId":
+            return "0x1"
+        if method == "eth_getTransactionCount":
+            return hex(7)
+        if method == "eth_sendTransaction":
+            return "0x" + f"{self.block:02x}" * 32
+        return None
+
+
+@pytest.fixture
+def nodes():
+    started = []
+
+    def start(*specs):
+        for block, delay in specs:
+            started.append(StandInNode(block, delay))
+        return started
+
+    yield start
+    for node in started:
+        node.shutdown()
+        node.server_close()
+
+
+def _w3(urls, router):
+    return Web3(rr.RoutedHTTPProvider(urls, request_kwargs={"timeout": 5}, router=router))
+
+
+# ------------------------------- RpcRouter ----------------------------------
+def test_router_breaker_opens_and_half_opens(monkeypatch):
+    monkeypatch.setattr(rr, "RPC_BREAKER_FAILURES", 2, raising=True)
+    monkeypatch.setattr(rr, "RPC_BREAKER_COOLDOWN", 10, raising=True)
+    now = {"t": 0.0}
+    router = rr.RpcRouter(["a", "b"], clock=lambda: now["t"])
+    a, b = router.endpoints
+    router.record_success(a, 0.01)
+    router.record_success(b, 0.05)
+    assert router.read_order()[0] is a
+
+    router.record_failure(a)
+    assert router.read_order()[0] is a
+    router.record_failure(a)
+    assert router.read_order() == [b]
+
+    now["t"] = 11
+    assert router.read_order()[0] is a  # one trial request after the cooldown
+    assert router.read_order() == [b]  # ...and only one at a time
+    router.record_success(a, 0.01)
+    assert router.read_order()[0] is a
+
+
+def test_router_latency_is_a_rolling_average(monkeypatch):
+    monkeypatch.setattr(rr, "RPC_LATENCY_ALPHA", 0.5, raising=True)
+    router = rr.RpcRouter(["a"])
+    (a,) = router.endpoints
+    router.record_success(a, 1.0)
+    router.record_success(a, 3.0)
+    assert a.latency == pytest.approx(2.0)
+
+
+def test_get_router_is_shared_per_endpoint_list():
+    assert rr.get_router(["x", "y"]) is rr.get_router(["x", "y"])
+    assert rr.get_router(["x", "y"]) is not rr.get_router(["y", "x"])
+
+
+# ---------------------------- RoutedHTTPProvider ----------------------------
+def test_reads_prefer_the_fastest_node(nodes):
+    slow, fast = nodes((1, 0.05), (2, 0.0))
+    router = rr.RpcRouter([slow.url, fast.url])
+    w3 = _w3([slow.url, fast.url], router)
+
+    blocks = [w3.eth.block_number for _ in range(10)]
+
+    assert blocks[-1] == 2
+    assert len(slow.methods) == 1  # measured once, then avoided
+    assert len(fast.methods) == 9
+
+
+def test_failing_node_is_skipped_and_circuit_opens(nodes, monkeypatch):
+    monkeypatch.setattr(rr, "RPC_BREAKER_FAILURES", 2, raising=True)
+    bad, good = nodes((1, 0.0), (2, 0.0))
+    bad.fail = True
+    router = rr.RpcRouter([bad.url, good.url])
+    w3 = _w3([bad.url, good.url], router)
+
+    assert [w3.eth.block_number for _ in range(5)] == [2] * 5
+    assert len(bad.methods) == 2
+    assert router.stats()[0]["open"] is True
+
+
+def test_batch_requests_go_to_one_node(nodes):
+    a, b = nodes((1, 0.0), (2, 0.0))
+    router = rr.RpcRouter([a.url, b.url])
+    provider = rr.RoutedHTTPProvider([a.url, b.url], router=router)
+
+    responses = provider.make_batch_request([("eth_blockNumber", []), ("eth_chainId", [])])
+
+    assert [r["result"] for r in responses] in (["0x1", "0x1"], ["0x2", "0x1"])
+    assert sorted([len(a.methods), len(b.methods)]) == [0, 2]
+
+
+def test_writes_stay_on_one_node_until_it_fails(nodes, monkeypatch):
+    monkeypatch.setattr(rr, "RPC_BREAKER_FAILURES", 1, raising=True)
+    writer, other = nodes((1, 0.0), (2, 0.0))
+    router = rr.RpcRouter([writer.url, other.url])
+    resyncs = []
+    router.add_writer_listener(lambda: resyncs.append(True))
+    provider = rr.RoutedHTTPProvider([writer.url, other.url], router=router)
+
+    for _ in range(3):
+        provider.make_request("eth_getTransactionCount", ["0x" + "11" * 20, "pending"])
+        provider.make_request("eth_sendTransaction", [{}])
+    assert writer.methods.count("eth_sendTransaction") == 3
+    assert other.methods == []
+
+    writer.fail = True
+    with pytest.raises(Exception):
+        provider.make_request("eth_sendTransaction", [{}])
+    assert resyncs == [True]
+
+    writer.fail = False
+    provider.make_request("eth_sendTransaction", [{}])
+    assert other.methods == ["eth_sendTransaction"]
+
+
+# -------------------------- AsyncRoutedHTTPProvider -------------------------
+def test_async_provider_fails_over_and_shares_stats(nodes, monkeypatch):
+    monkeypatch.setattr(rr, "RPC_BREAKER_FAILURES", 1, raising=True)
+    bad, good = nodes((1, 0.0), (5, 0.0))
+    bad.fail = True
+    router = rr.RpcRouter([bad.url, good.url])
+
+    async def read():
+        provider = rr.AsyncRoutedHTTPProvider([bad.url, good.url], router=router)
+        w3 = AsyncWeb3(provider)
+        try:
+            return [await w3.eth.block_number for _ in range(3)]
+        finally:
+            await provider.disconnect()
+
+    assert asyncio.run(read()) == [5, 5, 5]
+    assert len(bad.methods) == 1
+    assert router.stats()[1]["latency"] is not None
+
+
+def test_async_provider_fails_over_from_a_hung_node_within_one_call(nodes):
+    hung, good = nodes((1, 1.0), (5, 0.0))
+    router = rr.RpcRouter([hung.url, good.url])
+
+    async def read():
+        provider = rr.AsyncRoutedHTTPProvider([hung.url, good.url], router=router, attempt_timeout=0.2)
+        try:
+            return await asyncio.wait_for(AsyncWeb3(provider).eth.block_number, 0.8)
+        finally:
+            await provider.disconnect()
+
+    assert asyncio.run(read()) == 5
+    hung_stats, good_stats = router.stats()
+    assert hung_stats["failures"] == 1
+    assert hung_stats["latency"] >= 0.2  # ranked behind the node that answered
+    assert router.read_order()[0].url == good.url
+
+
+def test_async_provider_counts_a_cancelled_attempt(nodes, monkeypatch):
+    monkeypatch.setattr(rr, "RPC_BREAKER_FAILURES", 1, raising=True)
+    monkeypatch.setattr(rr, "RPC_BREAKER_COOLDOWN", 0, raising=True)
+    (hung,) = nodes((1, 1.0))
+    router = rr.RpcRouter([hung.url])
+    (endpoint,) = router.endpoints
+    router.record_failure(endpoint)
+    assert router.read_order() == [endpoint] and endpoint.trial
+
+    async def read():
+        provider = rr.AsyncRoutedHTTPProvider([hung.url], router=router)
+        try:
+            await asyncio.wait_for(AsyncWeb3(provider).eth.block_number, 0.2)
+        finally:
+            await provider.disconnect()
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(read())
+    assert endpoint.failures == 2
+    assert endpoint.latency is not None
+    assert not endpoint.trial  # the next request may trial it again
@@ -0,0 +1,165 @@
+"""
+Behaviour every storage backend must share, run through the core.database
+API. The MongoDB leg needs a disposable server in TEST_MONGODB_URI and is
+skipped without one; each run uses and then drops its own database.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from backend.core import async_database as adb
+from backend.core import database as db
+
+TEST_MONGODB_URI = os.getenv("TEST_MONGODB_URI", "")
+
+A = "aa" * 32
+B = "bb" * 32
+C = "cc" * 32
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(db, "STORAGE_BACKEND", request.param, raising=True)
+    monkeypatch.setattr(db, "_store", None, raising=True)
+    if request.param == "mongo":
+        if not TEST_MONGODB_URI:
+            pytest.skip("TEST_MONGODB_URI not set")
+        monkeypatch.setattr(db, "MONGODB_URI", TEST_MONGODB_URI, raising=True)
+        monkeypatch.setattr(db, "MONGODB_DB", f"conformance_{uuid.uuid4().hex}", raising=True)
+        monkeypatch.setattr(db, "_client", None, raising=True)
+    assert db.init_database()
+    yield request.param
+    if request.param == "mongo":
+        db.get_mongo_client().drop_database(db.MONGODB_DB)
+    db.close_database()
+
+
+def test_upsert_then_find(backend):
+    assert db.upsert_hashes([("a.txt", A, 1), ("b.txt", B, 2, {"merkleProof": ["x"]})]) == {"upserted": 2, "modified": 0}
+
+    assert db.find_file_by_hash(A) == {"filename": "a.txt", "hash": A, "recordId": 1}
+    assert db.find_file_by_hash(B) == {"filename": "b.txt", "hash": B, "recordId": 2, "merkleProof": ["x"]}
+    assert db.find_file_by_hash(C) is None
+
+
+def test_reupsert_replaces_hash_and_merges_fields(backend):
+    db.upsert_hashes([("a.txt", A, 1, {"merkleProof": ["x"]})])
+    assert db.find_file_by_hash(A) is not None
+
+    assert db.upsert_hashes([("a.txt", C, 3)]) == {"upserted": 0, "modified": 1}
+
+    assert db.find_file_by_hash(A) is None
+    assert db.find_file_by_hash(C) == {"filename": "a.txt", "hash": C, "recordId": 3, "merkleProof": ["x"]}
+
+
+def test_duplicate_hash_rejects_only_that_row(backend, capsys):
+    db.upsert_hashes([("a.txt", A, 1)])
+
+    assert db.upsert_hashes([("copy.txt", A, 2), ("b.txt", B, 3)]) == {"upserted": 1, "modified": 0, "rejected": [0]}
+
+    assert "Error writing to MongoDB" in capsys.readouterr().out
+    assert db.find_file_by_hash(A)["filename"] == "a.txt"
+    assert db.find_file_by_hash(B)["filename"] == "b.txt"
+
+
+def test_upsert_buffer_fails_only_the_rejected_row(backend):
+    db.upsert_hashes([("a.txt", A, 1)])
+    buf = db.UpsertBuffer(max_size=10, max_wait=60)
+    try:
+        dup, ok = buf.submit(("copy.txt", A, 2)), buf.submit(("b.txt", B, 3))
+        buf.flush()
+        assert ok.result(timeout=5) is True
+        with pytest.raises(RuntimeError):
+            dup.result(timeout=5)
+    finally:
+        buf.close()
+
+
+def test_chain_metadata(backend):
+    db.upsert_hashes([("a.txt", A, 1), ("b.txt", B, 2)])
+
+    assert db.set_chain_metadata([("a.txt", 10, 1700000000, A)]) == {"modified": 1}
+
+    assert db.find_missing_chain_metadata() == [("b.txt", 2)]
+    assert db.find_file_by_hash(A) == {
+        "filename": "a.txt", "hash": A, "recordId": 1,
+        "blockNumber": 10, "timestamp": 1700000000, "chainHash": A,
+    }
+
+
+def test_scan_hashes_since(backend):
+    db.upsert_hashes([("a.txt", A, 1), ("b.txt", B, 2)])
+    seen = list(db.scan_hashes())
+    assert sorted(digest for _, digest in seen) == [A, B]
+    assert all(isinstance(updated_at, datetime) for updated_at, _ in seen)
+
+    time.sleep(0.01)
+    db.upsert_hashes([("c.txt", C, 3)])
+
+    assert [digest for _, digest in db.scan_hashes(max(t for t, _ in seen))] == [C]
+
+
+def _export(after=None, until=None):
+    async def collect():
+        return [batch async for batch in adb.iter_record_batches(after, until, batch_size=2)]
+    return asyncio.run(collect())
+
+
+def test_export_batches_in_write_order(backend):
+    db.upsert_hashes([("b.txt", B, 2)])
+    time.sleep(0.01)
+    db.upsert_hashes([("a.txt", A, 1), ("c.txt", C, 3)])
+    db.set_chain_metadata([("a.txt", 10, 1700000000, A)])
+
+    everything = _export()
+    assert [[doc["filename"] for doc in batch] for batch in everything] == [["b.txt", "a.txt"], ["c.txt"]]
+    assert everything[0][1] == {
+        "filename": "a.txt", "hash": A, "recordId": 1,
+        "blockNumber": 10, "timestamp": 1700000000, "chainHash": A,
+    }
+
+
+def test_export_resumed_from_its_cursor_skips_nothing(backend):
+    # Record 2 commits before record 1, as pipelined anchors can.
+    db.upsert_hashes([("b.txt", B, 2)])
+    (cursor,) = [t for t, _ in db.scan_hashes()]
+    time.sleep(0.01)
+    db.upsert_hashes([("a.txt", A, 1)])
+
+    first = [doc["filename"] for batch in _export(until=cursor) for doc in batch]
+    resumed = [doc["filename"] for batch in _export(after=cursor) for doc in batch]
+
+    assert first == ["b.txt"]
+    assert resumed == ["a.txt"]  # a recordId cursor (after=2) would have skipped it
+
+
+def test_async_api(backend):
+    async def run():
+        assert await adb.upsert_hashes([("a.txt", A, 1)]) == {"upserted": 1, "modified": 0}
+        assert await adb.set_chain_metadata([("a.txt", 10, 1700000000, A)]) == {"modified": 1}
+        return await adb.find_file_by_hash(A)
+
+    doc = asyncio.run(run())
+
+    assert doc["filename"] == "a.txt" and doc["blockNumber"] == 10
+
+
+def test_admins(backend):
+    async def run():
+        admins = await adb.get_admin_collection()
+        result = await admins.insert_one({
+            "username": "root", "password": "hashed", "created_at": datetime(2024, 1, 2, 3, 4, 5),
+            "is_active": True,
+        })
+        return result.inserted_id, await admins.find_one({"username": "root"}), await admins.find_one({"username": "x"})
+
+    inserted_id, admin, missing = asyncio.run(run())
+
+    assert admin["_id"] == inserted_id
+    assert admin["password"] == "hashed" and admin["is_active"] is True
+    assert admin["created_at"] == datetime(2024, 1, 2, 3, 4, 5)
+    assert missing is None
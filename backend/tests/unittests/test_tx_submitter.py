@@ -0,0 +1,251 @@
+import json
+import threading
+
+import pytest
+from web3.exceptions import TransactionNotFound
+
+from backend.core import tx_submitter as ts
+
+
+class FakeEth:
+    def __init__(self, pending=5, latest=5):
+        self.pending = pending
+        self.latest = latest
+        self.gas_price = 100
+        self.receipts = {}
+        self.transactions = {}
+        self.count_calls = 0
+
+    def get_transaction_count(self, sender, block):
+        self.count_calls += 1
+        return self.pending if block == "pending" else self.latest
+
+    def get_transaction(self, tx_hash):
+        if tx_hash not in self.transactions:
+            raise TransactionNotFound(tx_hash)
+        return self.transactions[tx_hash]
+
+    def get_transaction_receipt(self, tx_hash):
+        if tx_hash not in self.receipts:
+            raise TransactionNotFound(tx_hash)
+        return self.receipts[tx_hash]
+
+
+class FakeW3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+class FakeContract:
+    def __init__(self, eth, fail_nonces=()):
+        self.w3 = FakeW3(eth)
+        self.sent = []
+        self.fail_nonces = set(fail_nonces)
+        contract = self
+
+        class _Functions:
+            def store(self, hash_bytes):
+                class _Call:
+                    def transact(self, tx):
+                        if tx["nonce"] in contract.fail_nonces:
+                            contract.fail_nonces.discard(tx["nonce"])
+                            raise RuntimeError("rpc hiccup")
+                        contract.sent.append(dict(tx, data=hash_bytes))
+                        return f"0xtx{len(contract.sent)}"
+                return _Call()
+
+        self.functions = _Functions()
+
+
+def _mine(eth, tx_hash, block=10):
+    eth.receipts[tx_hash] = {"status": 1, "transactionHash": tx_hash, "blockNumber": block}
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "journal.json")
+
+
+def test_nonces_are_local_and_sequential():
+    eth = FakeEth(pending=7)
+    nm = ts.NonceManager(FakeW3(eth), "0xME")
+    assert [nm.next() for _ in range(3)] == [7, 8, 9]
+    assert eth.count_calls == 1
+
+
+def test_released_nonce_is_reused_first():
+    nm = ts.NonceManager(FakeW3(FakeEth(pending=0)), "0xME")
+    a, b, c = nm.next(), nm.next(), nm.next()
+    nm.release(b)
+    assert nm.next() == b
+    assert nm.next() == 3
+
+
+def test_many_in_flight_then_receipts_resolve(journal):
+    eth = FakeEth(pending=3)
+    contract = FakeContract(eth)
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+
+    futures = [sub.submit(bytes([i]) * 32) for i in range(4)]
+    assert [tx["nonce"] for tx in contract.sent] == [3, 4, 5, 6]
+    assert sub.in_flight() == 4
+    assert len(json.load(open(journal))) == 4
+
+    for i in range(4):
+        _mine(eth, f"0xtx{i + 1}")
+    sub.poll_once()
+
+    assert [f.result(timeout=1)[0] for f in futures] == ["0xtx1", "0xtx2", "0xtx3", "0xtx4"]
+    assert [f.result(timeout=1)[2] for f in futures] == [3, 4, 5, 6]
+    assert sub.in_flight() == 0
+    assert json.load(open(journal)) == []
+    sub.close()
+
+
+def test_failed_send_hands_nonce_back(journal):
+    eth = FakeEth(pending=0)
+    contract = FakeContract(eth, fail_nonces={0})
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+
+    with pytest.raises(RuntimeError):
+        sub.submit(b"\x01" * 32)
+    sub.submit(b"\x02" * 32)
+
+    assert [tx["nonce"] for tx in contract.sent] == [0]
+    sub.close()
+
+
+def test_reverted_receipt_fails_future(journal):
+    eth = FakeEth()
+    sub = ts.TxSubmitter(FakeContract(eth), "0xME", journal_path=journal, poll_interval=3600)
+    fut = sub.submit(b"\x01" * 32)
+    eth.receipts["0xtx1"] = {"status": 0, "transactionHash": "0xtx1"}
+    sub.poll_once()
+    with pytest.raises(RuntimeError, match="reverted"):
+        fut.result(timeout=1)
+    sub.close()
+
+
+def test_stuck_tx_is_resent_with_same_nonce_and_higher_gas(journal, monkeypatch):
+    eth = FakeEth(pending=2)
+    contract = FakeContract(eth)
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+    fut = sub.submit(b"\x01" * 32)
+
+    monkeypatch.setattr(ts, "TX_STUCK_AFTER", 0, raising=True)
+    sub.poll_once()
+    assert contract.sent[1]["nonce"] == 2
+    assert contract.sent[1]["gasPrice"] > eth.gas_price
+
+    # the original still wins if it is the one that gets mined
+    _mine(eth, "0xtx1")
+    sub.poll_once()
+    assert fut.result(timeout=1)[0] == "0xtx1"
+    sub.close()
+
+
+def test_stuck_eip1559_tx_is_resent_with_bumped_fees(journal, monkeypatch):
+    eth = FakeEth(pending=2)
+    eth.gas_price = 50  # below the original maxFeePerGas
+    eth.transactions["0xtx1"] = {"maxFeePerGas": 1000, "maxPriorityFeePerGas": 100, "gasPrice": 60}
+    contract = FakeContract(eth)
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+    sub.submit(b"\x01" * 32)
+
+    monkeypatch.setattr(ts, "TX_STUCK_AFTER", 0, raising=True)
+    sub.poll_once()
+
+    replacement = contract.sent[1]
+    assert "gasPrice" not in replacement
+    assert replacement["maxFeePerGas"] >= 1100
+    assert replacement["maxPriorityFeePerGas"] >= 110
+    sub.close()
+
+
+def test_rejected_replacement_backs_off_and_bids_higher(journal, monkeypatch):
+    eth = FakeEth(pending=2)
+    contract = FakeContract(eth)
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+    sub.submit(b"\x01" * 32)
+    contract.fail_nonces.add(2)
+
+    monkeypatch.setattr(ts, "TX_STUCK_AFTER", 0, raising=True)
+    sub.poll_once()  # replacement rejected
+    assert len(contract.sent) == 1
+    with open(journal) as f:
+        [entry] = json.load(f)
+    assert entry["attempt"] == 1
+    rejected_price = entry["fees"]["gasPrice"]
+
+    monkeypatch.setattr(ts, "TX_STUCK_AFTER", 3600, raising=True)
+    sub.poll_once()  # backing off
+    assert len(contract.sent) == 1
+
+    monkeypatch.setattr(ts, "TX_STUCK_AFTER", 0, raising=True)
+    sub.poll_once()
+    assert contract.sent[1]["gasPrice"] >= rejected_price * 1.1
+    sub.close()
+
+
+def test_recover_resends_unmined_nonces_after_restart(journal, monkeypatch):
+    entries = [
+        {"nonce": 4, "tx_hashes": ["0xold4"], "hash": "aa" * 32, "sent_at": 1, "attempt": 0},
+        {"nonce": 5, "tx_hashes": ["0xold5"], "hash": "bb" * 32, "sent_at": 1, "attempt": 0},
+    ]
+    with open(journal, "w") as f:
+        json.dump(entries, f)
+
+    eth = FakeEth(pending=5, latest=5)  # nonce 4 mined; 5 dropped by the node
+    contract = FakeContract(eth)
+    sub = ts.TxSubmitter(contract, "0xME", journal_path=journal, poll_interval=3600)
+
+    assert sub.recover() == 1
+    sub.poll_once()
+    assert contract.sent[0]["nonce"] == 5
+    assert contract.sent[0]["data"] == bytes.fromhex("bb" * 32)
+
+    # new work never reuses the recovered nonce
+    sub.submit(b"\x03" * 32)
+    assert contract.sent[1]["nonce"] == 6
+    sub.close()
+
+
+def test_submit_blocks_when_too_many_in_flight(journal):
+    eth = FakeEth()
+    sub = ts.TxSubmitter(FakeContract(eth), "0xME", journal_path=journal, max_in_flight=1, poll_interval=3600)
+    sub.submit(b"\x01" * 32)
+
+    done = threading.Event()
+    threading.Thread(target=lambda: (sub.submit(b"\x02" * 32), done.set()), daemon=True).start()
+    assert not done.wait(0.1)
+
+    _mine(eth, "0xtx1")
+    sub.poll_once()
+    assert done.wait(1)
+    sub.close()
+
+
+def test_close_fails_unmined_futures_and_keeps_journal(journal):
+    eth = FakeEth()
+    sub = ts.TxSubmitter(FakeContract(eth), "0xME", journal_path=journal, poll_interval=3600)
+    fut = sub.submit(b"\x01" * 32)
+
+    sub.close()
+
+    with pytest.raises(RuntimeError, match="closed before the transaction was mined"):
+        fut.result(timeout=1)
+    with open(journal) as f:
+        assert [entry["nonce"] for entry in json.load(f)] == [5]
+
+
+def test_receipt_for_abandoned_future_is_ignored(journal):
+    eth = FakeEth()
+    sub = ts.TxSubmitter(FakeContract(eth), "0xME", journal_path=journal, poll_interval=3600)
+    fut = sub.submit(b"\x01" * 32)
+    assert fut.cancel()
+
+    _mine(eth, "0xtx1")
+    sub.poll_once()
+
+    assert sub.in_flight() == 0
+    sub.close()